@@ -1,6 +1,10 @@
+import json
+import math
 import pytest
+from datetime import date, timedelta
 from fastapi.testclient import TestClient
-from main import app, calculate_bmr, calculate_tdee, calculate_time
+import main
+from main import app, calculate_bmr, calculate_tdee, calculate_time, calculation_cache
 
 test_client = TestClient(app)
 
@@ -48,5 +52,160 @@ def test_api_calculate():
     assert "goal" in data["results"][0]
     assert "time_to_reach_goal" in data["results"][0]
 
+def test_api_calculate_batch():
+    """Test voor het /calculate/batch endpoint: zelfde uitkomst als /calculate per record"""
+    records = [
+        {"gender": "male", "weight": 80, "height": 180, "age": 28, "activity_level": "moderate",
+         "sport": ["Football", "Swimming"], "aantal_minuten_sporten": 60, "gewenst_gewicht": 75, "deficit_surplus": 500},
+        {"gender": "female", "weight": 60, "height": 165, "age": 30, "activity_level": "light",
+         "sport": ["Tennis"], "aantal_minuten_sporten": 0, "gewenst_gewicht": 65, "deficit_surplus": 250},
+        {"gender": "male", "weight": 70, "height": 175, "age": 40, "activity_level": "active",
+         "sport": ["Chess"], "aantal_minuten_sporten": 30, "gewenst_gewicht": 65, "deficit_surplus": 500},
+    ]
+    response = test_client.post("/calculate/batch", json={"records": records})
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 3
+    for record, result in zip(records[:2], data[:2]):
+        single = test_client.post("/calculate", json=record)
+        assert single.status_code == 200
+        assert result == single.json()
+    assert "error" in data[2]
+
+def test_api_calculate_cache():
+    """Test dat herhaalde berekeningen uit de cache komen en dat de cache het antwoord nooit verandert"""
+    calculation_cache.clear()
+    payload = {
+        "gender": "male", "weight": 85.0, "height": 180, "age": 35, "activity_level": "moderate",
+        "sport": ["Swimming", "Football"], "aantal_minuten_sporten": 30, "gewenst_gewicht": 78, "deficit_surplus": 500
+    }
+    first = test_client.post("/calculate", json=payload)
+    assert first.status_code == 200
+    # Hoofdletters maken voor de berekening niet uit
+    assert test_client.post("/calculate", json={**payload, "gender": "Male", "activity_level": "MODERATE"}).json() == first.json()
+    
+    # Een andere volgorde of een iets ander gewicht geeft een eigen antwoord, berekend uit de invoer zoals verstuurd
+    reordered = test_client.post("/calculate", json={**payload, "sport": ["Football", "Swimming"]}).json()
+    assert [r["sport"] for r in reordered["results"][:2]] == ["Football", "Swimming"]
+    heavier = test_client.post("/calculate", json={**payload, "weight": 85.04}).json()
+    assert heavier["weight_difference"] == 7.04
+    assert heavier["BMR"] == round(calculate_bmr(85.04, 180, 35, "male"), 2)
+    
+    stats = test_client.get("/calculate/cache").json()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["size"] == 3
+
+def test_metrics():
+    """Test dat /metrics de latentie per route in Prometheus formaat teruggeeft"""
+    test_client.get("/calculate/cache")
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/calculate/cache",status="200"}' in response.text
+    assert "http_requests_in_progress" in response.text
+
+def test_tracing(tmp_path):
+    """Test dat het trace ID van de aanroeper wordt overgenomen en de spans worden geëxporteerd"""
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    main.span_exporter = main.FileSpanExporter(str(tmp_path / "traces.jsonl"))
+    try:
+        response = test_client.get("/calculate/cache", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+    finally:
+        main.span_exporter = main.SpanExporter()
+    assert response.headers["X-Request-ID"] == trace_id
+    assert response.headers["Server-Timing"].startswith('total;dur=')
+    
+    span = json.loads((tmp_path / "traces.jsonl").read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert span["traceId"] == trace_id
+    assert span["parentSpanId"] == "00f067aa0ba902b7"
+    assert span["name"] == "total GET /calculate/cache"
+
+def test_api_calculate_grid():
+    """Test dat elke cel van het what-if raster gelijk is aan calculate_time"""
+    for weight, goal in [(90, 80), (60, 66), (75, 75.05)]:
+        response = test_client.post("/calculate/grid", json={
+            "gender": "female", "weight": weight, "height": 170, "age": 30, "activity_level": "light",
+            "gewenst_gewicht": goal, "minutes_min": 0, "minutes_max": 60, "minutes_step": 15,
+            "adjustment_min": -250, "adjustment_max": 500, "adjustment_step": 250
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert data["sports"] == list(main.caloric_burn_rates)
+        assert data["minutes"] == [0, 15, 30, 45, 60]
+        assert data["calorie_adjustments"] == [-250, 0, 250, 500]
+        for s, sport in enumerate(data["sports"]):
+            for a, adjustment in enumerate(data["calorie_adjustments"]):
+                for m, minutes in enumerate(data["minutes"]):
+                    expected = calculate_time(sport, weight, goal, minutes, adjustment)
+                    expected = None if expected == float("inf") else round(expected, 2)
+                    assert data["days"][s][a][m] == expected
+    
+    too_big = test_client.post("/calculate/grid", json={
+        "gender": "male", "weight": 80, "height": 180, "age": 30, "activity_level": "light", "gewenst_gewicht": 75,
+        "minutes_max": 10 ** 6, "minutes_step": 1
+    })
+    assert too_big.status_code == 400
+
+def test_api_calculate_projection():
+    """Test de dag-voor-dag projectie tegen een simpele lus, en de streaming variant tegen de gewone"""
+    payload = {
+        "gender": "female", "weight": 92, "height": 168, "age": 40, "activity_level": "light",
+        "sport": ["Tennis", "Chess"], "aantal_minuten_sporten": 20, "gewenst_gewicht": 80,
+        "deficit_surplus": 400, "days": 400, "start_date": "2025-01-01"
+    }
+    response = test_client.post("/calculate/projection", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    
+    # Dagelijks: tekort van 400 + 8 * 20 kcal, dat kleiner wordt naarmate BMR en TDEE dalen
+    weight, weights, reached = 92.0, [92.0], None
+    for day in range(1, 401):
+        weight += (-(400 + 8 * 20) - 10 * 1.375 * (weight - 92)) / 7000
+        weights.append(round(weight, 2))
+        if reached is None and weight <= 80:
+            reached = day
+    assert data["weights"] == weights
+    assert data["goal_reached_day"] == reached
+    assert data["goal_date"] == (date(2025, 1, 1) + timedelta(days=reached)).isoformat()
+    assert data["linear_days_to_goal"] == round(7000 * 12 / 560, 2) < reached
+    
+    stream = test_client.post("/calculate/projection/stream", json={**payload, "chunk_days": 64, "stop_at_goal": False})
+    lines = [json.loads(line) for line in stream.text.splitlines()]
+    assert [w for line in lines[:-1] for w in line["weights"]] == weights
+    assert lines[-1]["goal_reached_day"] == reached
+    
+    unreachable = test_client.post("/calculate/projection", json={**payload, "gewenst_gewicht": 50, "days": 3650}).json()
+    assert unreachable["goal_reached_day"] is None
+    assert unreachable["equilibrium_weight"] > 50
+    assert test_client.post("/calculate/projection", json={**payload, "days": 10 ** 6}).status_code == 400
+
+def test_api_calculate_projection_rejects_tiny_kcal_per_kg():
+    """Test dat een onrealistisch lage kcal_per_kg een 400 geeft in plaats van een projectie die naar inf of NaN loopt"""
+    payload = {
+        "gender": "male", "weight": 120, "height": 180, "age": 30, "activity_level": "very active",
+        "sport": ["Basketball"], "aantal_minuten_sporten": 60, "gewenst_gewicht": 80,
+        "deficit_surplus": 500, "days": 3650, "kcal_per_kg": 0.5
+    }
+    for path in ("/calculate/projection", "/calculate/projection/stream"):
+        response = test_client.post(path, json=payload)
+        assert response.status_code == 400
+        assert "kcal_per_kg" in response.json()["detail"]
+    
+    # Op de ondergrens blijft de projectie eindig
+    data = test_client.post("/calculate/projection", json={**payload, "kcal_per_kg": main.PROJECTION_MIN_KCAL_PER_KG}).json()
+    assert all(math.isfinite(weight) for weight in data["weights"])
+
+def test_benchmark_regression_gate():
+    """Test dat de benchmark-vergelijking vertragingen boven de drempel meldt, geschaald naar de machine"""
+    from benchmark_calculation import compare_to_baseline
+    baseline = {"calibration_ns": 1000, "results": {"calculate_time": 100.0, "calculate_bmr": 50.0}}
+    # Deze machine is twee keer zo traag: 200 ns is dan geen vertraging, 140 ns voor de BMR wel
+    current = {"calibration_ns": 2000, "results": {"calculate_time": 200.0, "calculate_bmr": 140.0, "batch_grid": 10.0}}
+    rows, regressions = compare_to_baseline(current, baseline, 0.25)
+    assert regressions == ["calculate_bmr"]
+    assert rows[0]["change"] == 0.0
+    assert rows[2]["baseline_ns"] is None
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,211 @@
+"""
+Micro-benchmarks for the calculation engine with a stored baseline
+
+Times calculate_time, calculate_bmr, calculate_tdee, the /calculate handler
+(uncached and cached), calculate_batch_grid and a 365-day projection over
+fixed input grids, and
+compares the time per call with benchmark_baseline.json. The run exits with
+status 1 when any benchmark got slower than the baseline by more than
+--threshold (default BENCH_THRESHOLD or 0.25, i.e. 25%):
+
+    python benchmark_calculation.py                      # compare with the baseline
+    python benchmark_calculation.py --update-baseline    # store new baseline numbers
+    python benchmark_calculation.py --only handler       # run a subset
+
+Baselines are recorded on one machine and checked on another, so every run
+also times a fixed pure-Python calibration loop and scales the baseline by
+how much faster or slower this machine is.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import main
+from main import (
+    UserInput, calculate, calculate_batch_grid, calculate_bmr, calculate_tdee, calculate_time,
+    calculation_cache, goal_reached_days, project_weights, projection_parameters
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+BENCH_THRESHOLD = float(os.environ.get("BENCH_THRESHOLD", "0.25"))
+
+# Input grids: every benchmark call walks the whole grid once
+WEIGHTS = [55.0, 85.0, 130.0]
+GOALS = [50.0, 78.0, 140.0]
+SPORT_SETS = [["Swimming"], ["Football", "Tennis"], ["Basketball", "Golf", "Swimming"]]
+MINUTES = [0, 30, 90]
+ADJUSTMENTS = [250, 500, 1000]
+ACTIVITY_LEVELS = list(main.activity_multipliers) + ["unknown"]
+GENDERS = ["male", "female", "other"]
+
+TIME_GRID = list(itertools.product(main.sports + ["Chess"], WEIGHTS, GOALS, MINUTES, ADJUSTMENTS))
+BMR_GRID = list(itertools.product(WEIGHTS, [160, 180, 200], [20, 45, 70], GENDERS))
+TDEE_GRID = list(itertools.product([1400.0, 1800.0, 2300.0], ACTIVITY_LEVELS))
+USER_GRID = [
+    UserInput(gender=gender, weight=weight, height=180, age=35, activity_level=activity_level,
+              sport=sport, aantal_minuten_sporten=minutes, gewenst_gewicht=goal, deficit_surplus=500)
+    for gender, weight, goal, sport, minutes, activity_level in itertools.product(
+        GENDERS[:2], WEIGHTS, GOALS, SPORT_SETS, MINUTES[1:], ["sedentary", "moderate"]
+    )
+]
+PROJECTION = projection_parameters(USER_GRID)
+
+def bench_calculate_time():
+    for args in TIME_GRID:
+        calculate_time(*args)
+
+def bench_calculate_bmr():
+    for args in BMR_GRID:
+        calculate_bmr(*args)
+
+def bench_calculate_tdee():
+    for args in TDEE_GRID:
+        calculate_tdee(*args)
+
+def bench_handler_uncached():
+    # A zero-size cache never stores, so every call runs the full calculation
+    maxsize = calculation_cache.maxsize
+    calculation_cache.maxsize = 0
+    try:
+        for user in USER_GRID:
+            calculate(user)
+    finally:
+        calculation_cache.maxsize = maxsize
+
+def bench_handler_cached():
+    for user in USER_GRID:
+        calculate(user)
+
+def bench_batch_grid():
+    calculate_batch_grid(USER_GRID)
+
+def bench_projection():
+    weight, goal, balance, slope = PROJECTION
+    goal_reached_days(project_weights(weight, balance, slope, 365), weight, goal)
+
+# Name: (function, calls per run)
+BENCHMARKS = {
+    "calculate_time": (bench_calculate_time, len(TIME_GRID)),
+    "calculate_bmr": (bench_calculate_bmr, len(BMR_GRID)),
+    "calculate_tdee": (bench_calculate_tdee, len(TDEE_GRID)),
+    "handler_uncached": (bench_handler_uncached, len(USER_GRID)),
+    "handler_cached": (bench_handler_cached, len(USER_GRID)),
+    "batch_grid": (bench_batch_grid, len(USER_GRID)),
+    "projection_365": (bench_projection, len(USER_GRID))
+}
+
+def calibrate(repeat=5):
+    """Nanoseconds for a fixed pure-Python workload, used to compare machines"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        total = 0.0
+        for i in range(200000):
+            total += (i % 7) * 1.5
+        best = min(best, time.perf_counter_ns() - start)
+    return best
+
+def measure(func, calls, repeat, min_time):
+    """
+    Time a benchmark function
+
+    Every sample runs the function as often as fits in min_time seconds; the
+    fastest of `repeat` samples is the least disturbed by other processes.
+
+    Returns:
+        Nanoseconds per call
+    """
+    func()
+    loops = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9:
+            break
+        loops *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            func()
+        best = min(best, time.perf_counter_ns() - start)
+    return best / loops / calls
+
+def run(names, repeat=7, min_time=0.2):
+    """Run the named benchmarks and return {"calibration_ns": ..., "results": {name: ns per call}}"""
+    calculation_cache.clear()
+    calibration = calibrate()
+    results = {}
+    for name in names:
+        func, calls = BENCHMARKS[name]
+        results[name] = round(measure(func, calls, repeat, min_time), 1)
+    # Calibrate before and after, so a burst of load during the run is less likely to skew both
+    return {"calibration_ns": min(calibration, calibrate()), "results": results}
+
+def compare_to_baseline(current, baseline, threshold):
+    """
+    Compare a run with the baseline
+
+    Args:
+        current: Result of run()
+        baseline: Stored result of an earlier run()
+        threshold: Allowed slowdown as a fraction (0.25 is 25% slower)
+
+    Returns:
+        Tuple of (report rows, list of regressed benchmark names)
+    """
+    # Scale the baseline to the speed of this machine
+    scale = current["calibration_ns"] / baseline["calibration_ns"] if baseline.get("calibration_ns") else 1.0
+    rows = []
+    regressions = []
+    for name, ns in current["results"].items():
+        expected = baseline["results"].get(name)
+        if expected is None:
+            rows.append({"benchmark": name, "ns_per_call": ns, "baseline_ns": None, "change": None})
+            continue
+        expected *= scale
+        change = ns / expected - 1
+        rows.append({"benchmark": name, "ns_per_call": ns, "baseline_ns": round(expected, 1), "change": round(change, 3)})
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="benchmarks to run (default all)")
+    parser.add_argument("--threshold", type=float, default=BENCH_THRESHOLD, help="allowed slowdown as a fraction")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per sample")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    # Keep debug logging out of the timings
+    main.logger.setLevel("WARNING")
+    current = run(args.only or list(BENCHMARKS), args.repeat, args.min_time)
+
+    if args.update_baseline:
+        stored = {"calibration_ns": current["calibration_ns"], "results": {}}
+        if args.only and os.path.exists(args.baseline):
+            # Keep the other benchmarks, rescaled to this run's calibration
+            with open(args.baseline) as f:
+                previous = json.load(f)
+            scale = current["calibration_ns"] / previous["calibration_ns"]
+            stored["results"] = {name: round(ns * scale, 1) for name, ns in previous["results"].items()}
+        stored["results"].update(current["results"])
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2)
+            f.write("\n")
+        print(json.dumps(current, indent=2))
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows, regressions = compare_to_baseline(current, baseline, args.threshold)
+    print(json.dumps({"threshold": args.threshold, "benchmarks": rows, "regressions": regressions}, indent=2))
+    sys.exit(1 if regressions else 0)
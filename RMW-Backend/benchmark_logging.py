@@ -0,0 +1,89 @@
+"""
+Requests-per-second benchmark for the /calculate endpoint
+
+Runs the dashboard's default calculation request through the /calculate
+handler (or through the full HTTP stack with --http) and reports the throughput
+on stderr, so stdout can be redirected like a container log stream:
+
+    LOG_LEVEL=INFO python benchmark_logging.py --requests 20000 > /tmp/app.log
+    LOG_LEVEL=DEBUG python benchmark_logging.py --requests 20000 > /tmp/app.log
+
+Run it against an older checkout of main.py to get the "before" number.
+The calculation cache, where main.py has one, is turned off, otherwise every
+request after the first would be a cache hit and the calculation's log lines
+would never run.
+"""
+import argparse
+import sys
+import time
+
+from fastapi.testclient import TestClient
+import main
+from main import app, calculate, UserInput
+
+PAYLOAD = {
+    "gender": "male",
+    "weight": 85.0,
+    "height": 180,
+    "age": 35,
+    "activity_level": "moderate",
+    "sport": ["Swimming", "Football"],
+    "aantal_minuten_sporten": 30,
+    "gewenst_gewicht": 78.0,
+    "deficit_surplus": 500
+}
+
+def run_handler(requests):
+    """
+    Call the /calculate handler directly a number of times
+
+    Args:
+        requests: Number of requests to run
+
+    Returns:
+        Requests per second
+    """
+    for _ in range(50):
+        calculate(UserInput(**PAYLOAD))
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        calculate(UserInput(**PAYLOAD))
+    elapsed = time.perf_counter() - start
+    return requests / elapsed
+
+def run_http(requests):
+    """
+    Post the payload to /calculate through the ASGI stack a number of times
+
+    Args:
+        requests: Number of requests to send
+
+    Returns:
+        Requests per second
+    """
+    client = TestClient(app)
+    # Warm up routing and validation before timing
+    for _ in range(50):
+        client.post("/calculate", json=PAYLOAD)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.post("/calculate", json=PAYLOAD)
+        assert response.status_code == 200
+    elapsed = time.perf_counter() - start
+    return requests / elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--http", action="store_true", help="go through the ASGI stack with TestClient")
+    args = parser.parse_args()
+
+    # Time the full calculation and its logging, not the cache (older checkouts have none)
+    calculation_cache = getattr(main, "calculation_cache", None)
+    if calculation_cache is not None:
+        calculation_cache.maxsize = 0
+    rps = run_http(args.requests) if args.http else run_handler(args.requests)
+    mode = "http" if args.http else "handler"
+    print(f"/calculate ({mode}): {args.requests} requests, {rps:.1f} requests/s", file=sys.stderr)
@@ -1,12 +1,358 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Optional
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
 import math
+import os
+import queue
+import re
+import secrets
+import sys
+import threading
+import time
+import urllib.request
+import numpy as np
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge, Histogram, generate_latest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 app = FastAPI()
 
+# Log level for the calculation service (DEBUG enables per-calculation tracing)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+logger = logging.getLogger("rmw.backend")
+
+def configure_logging(level=LOG_LEVEL, stream=sys.stdout):
+    """
+    Route the service logger through a queue so request handlers never block on I/O
+    
+    Records are put on an unbounded in-memory queue by a QueueHandler and written
+    to the stream by a QueueListener running in a background thread.
+    
+    Args:
+        level: Log level name or number for the service logger
+        stream: Stream the listener writes formatted records to
+        
+    Returns:
+        The started QueueListener
+    """
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, output)
+    
+    logger.handlers.clear()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+    
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+log_listener = configure_logging()
+
+# Prometheus metrics, scraped from /metrics
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests currently being handled", ["method"])
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request and label it with the route template instead of the raw path"""
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    in_progress = REQUESTS_IN_PROGRESS.labels(request.method)
+    in_progress.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_progress.dec()
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(request.method, route.path if route else "other", str(status)).observe(
+            time.perf_counter() - start
+        )
+
+# Tracing: requests continue the trace of the caller (W3C traceparent or
+# X-Request-ID) and their spans go to a pluggable exporter. This code is the
+# same in RMW-Backend, RMW-Database and RMW-Frontend; change all three together.
+SERVICE_NAME = "rmw-backend"
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "http://otel-collector:4318/v1/traces")
+# Most spans listed in the Server-Timing header
+SERVER_TIMING_MAX_ENTRIES = 32
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+current_span = contextvars.ContextVar("current_span", default=None)
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+class Trace:
+    """Spans of one request in this service"""
+    def __init__(self, trace_id=None, parent_id=None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.parent_id = parent_id
+        self.spans = []
+
+def trace_from_headers(headers):
+    """Continue the trace from a traceparent or X-Request-ID header, or start a new one"""
+    match = TRACEPARENT_PATTERN.match(headers.get("traceparent", ""))
+    if match:
+        return Trace(match.group(1), match.group(2))
+    request_id = headers.get("x-request-id", "").lower()
+    return Trace(request_id if re.fullmatch(r"[0-9a-f]{32}", request_id) else None)
+
+@contextlib.contextmanager
+def span(name, description="", kind="internal", **attributes):
+    """
+    Record the duration of a block as a span of the current request
+    
+    Args:
+        name: Short name, also the metric name in Server-Timing (e.g. "sql")
+        description: Details such as the route or statement
+        kind: OTLP span kind, "internal", "server" or "client"
+        **attributes: Extra attributes for the exporter
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = current_span.get()
+    record = {
+        "name": name,
+        "description": description,
+        "span_id": secrets.token_hex(8),
+        "parent_id": parent["span_id"] if parent else trace.parent_id,
+        "kind": kind,
+        "start_ns": time.time_ns(),
+        "attributes": attributes
+    }
+    token = current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration"] = time.perf_counter() - start
+        current_span.reset(token)
+        trace.spans.append(record)
+
+def server_timing(trace):
+    """Build the Server-Timing header from the spans, the request span is "total" """
+    entries = []
+    for record in trace.spans[-SERVER_TIMING_MAX_ENTRIES:]:
+        entry = f"{record['name']};dur={record['duration'] * 1000:.1f}"
+        if record["description"]:
+            entry += ';desc="' + record["description"].replace('"', "'") + '"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+def otlp_payload(trace):
+    """Convert the spans of a trace to an OTLP/HTTP JSON export request"""
+    spans = []
+    for record in trace.spans:
+        attributes = {"description": record["description"], **record["attributes"]}
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": record["span_id"],
+            "parentSpanId": record["parent_id"] or "",
+            "name": f"{record['name']} {record['description']}".strip(),
+            "kind": SPAN_KINDS[record["kind"]],
+            "startTimeUnixNano": str(record["start_ns"]),
+            "endTimeUnixNano": str(record["start_ns"] + int(record["duration"] * 1e9)),
+            "attributes": [{"key": key, "value": {"stringValue": str(value)}} for key, value in attributes.items()]
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": spans}]
+    }]}
+
+class SpanExporter:
+    """Base exporter that receives the trace of every finished request and drops it"""
+    def export(self, trace):
+        pass
+
+class FileSpanExporter(SpanExporter):
+    """Append every trace as an OTLP JSON line to a file, for local testing"""
+    def __init__(self, path):
+        self.path = path
+    
+    def export(self, trace):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(otlp_payload(trace)) + "\n")
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """Send traces to an OTLP/HTTP endpoint such as an OpenTelemetry Collector"""
+    def __init__(self, endpoint, timeout=5):
+        self.endpoint = endpoint
+        self.timeout = timeout
+    
+    def export(self, trace):
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(otlp_payload(trace)).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        urllib.request.urlopen(request, timeout=self.timeout).close()
+
+class BackgroundSpanExporter(SpanExporter):
+    """Hand traces to another exporter on a background thread so requests never wait on export I/O"""
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self.queue = queue.SimpleQueue()
+        threading.Thread(target=self._run, name="span-exporter", daemon=True).start()
+    
+    def export(self, trace):
+        self.queue.put(trace)
+    
+    def _run(self):
+        while True:
+            trace = self.queue.get()
+            try:
+                self.exporter.export(trace)
+            except Exception as e:
+                logger.warning("Error exporting spans: %s", e)
+
+def create_span_exporter(kind=TRACE_EXPORTER):
+    """Create the exporter selected by TRACE_EXPORTER: "none", "file" or "otlp" """
+    if kind == "file":
+        return BackgroundSpanExporter(FileSpanExporter(TRACE_FILE))
+    if kind == "otlp":
+        return BackgroundSpanExporter(OTLPHttpSpanExporter(TRACE_OTLP_ENDPOINT))
+    return SpanExporter()
+
+span_exporter = create_span_exporter()
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Continue the caller's trace and report this service's timing breakdown in Server-Timing"""
+    trace = trace_from_headers(request.headers)
+    token = current_trace.set(trace)
+    try:
+        with span("total", f"{request.method} {request.url.path}", kind="server"):
+            response = await call_next(request)
+    finally:
+        current_trace.reset(token)
+    response.headers["X-Request-ID"] = trace.trace_id
+    response.headers["Server-Timing"] = server_timing(trace)
+    span_exporter.export(trace)
+    return response
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Expose the metrics in the Prometheus text format"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# JSON rendering: orjson when it is installed and JSON_ENCODER=orjson, otherwise the standard library
+JSON_ENCODER = os.environ.get("JSON_ENCODER", "orjson").lower()
+
+def dumps_json(content):
+    """Render plain JSON types (dict, list, str, int, float, bool, None) to bytes"""
+    if orjson is not None and JSON_ENCODER == "orjson":
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps_json; the content must already be plain JSON types"""
+    def render(self, content):
+        return dumps_json(content)
+
+# Calculation cache settings (entries are rendered JSON bodies)
+CALC_CACHE_SIZE = int(os.environ.get("CALC_CACHE_SIZE", "1024"))
+CALC_CACHE_TTL = float(os.environ.get("CALC_CACHE_TTL", "300"))
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after a fixed time-to-live
+    
+    Safe to share between the worker threads that run sync endpoints.
+    """
+    def __init__(self, maxsize, ttl, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key):
+        """Return the cached value for key, or None when missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= self.timer():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entries when full"""
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, self.timer() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+    
+    def stats(self):
+        """Return size and hit/miss/eviction counters"""
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+calculation_cache = TTLCache(CALC_CACHE_SIZE, CALC_CACHE_TTL)
+
 sports = ["Football", "Basketball", "Tennis", "Swimming", "Golf"]
 caloric_burn_rates = {"Football": 5, "Basketball": 12, "Tennis": 8, "Swimming": 1, "Golf": 5}
 cals = [250, 500, 1000]
+activity_multipliers = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very active": 1.9
+}
 
 class UserInput(BaseModel):
     gender: str
@@ -19,6 +365,43 @@ class UserInput(BaseModel):
     gewenst_gewicht: float
     deficit_surplus: int
 
+class BatchInput(BaseModel):
+    records: list[UserInput]
+
+# What-if grid: minutes of sport x calorie adjustments for every sport (inclusive ranges)
+class GridInput(BaseModel):
+    gender: str
+    weight: float
+    height: float
+    age: int
+    activity_level: str
+    gewenst_gewicht: float
+    sport: Optional[list[str]] = None
+    minutes_min: int = 0
+    minutes_max: int = 120
+    minutes_step: int = 5
+    adjustment_min: int = 100
+    adjustment_max: int = 1500
+    adjustment_step: int = 50
+
+# Largest what-if grid (sports x adjustments x minutes) computed per request
+GRID_MAX_CELLS = int(os.environ.get("GRID_MAX_CELLS", "100000"))
+
+# Day-by-day projection: the same inputs plus a horizon
+class ProjectionInput(UserInput):
+    days: int = 365
+    start_date: Optional[date] = None
+    kcal_per_kg: float = 7000
+    chunk_days: int = 365
+    stop_at_goal: bool = True
+
+# Longest horizon for /calculate/projection and for the streaming variant
+PROJECTION_MAX_DAYS = int(os.environ.get("PROJECTION_MAX_DAYS", "3650"))
+PROJECTION_STREAM_MAX_DAYS = int(os.environ.get("PROJECTION_STREAM_MAX_DAYS", "36500"))
+# Lowest kcal_per_kg accepted, below lean tissue (~1800). Far smaller values make
+# 1 - slope / kcal_per_kg negative and the projection oscillates until it overflows.
+PROJECTION_MIN_KCAL_PER_KG = 1000
+
 def calculate_time(sport, weight, gewenst_gewicht, time, deficit_surplus):
     """
     Calculate time to reach goal weight
@@ -33,56 +416,56 @@ def calculate_time(sport, weight, gewenst_gewicht, time, deficit_surplus):
     Returns:
         Estimated days to reach goal
     """
-    # Debug input values
-    print(f"calculate_time called with: sport={sport}, weight={weight}, goal={gewenst_gewicht}, time={time}, deficit={deficit_surplus}")
+    logger.debug("calculate_time called with: sport=%s, weight=%s, goal=%s, time=%s, deficit=%s",
+                 sport, weight, gewenst_gewicht, time, deficit_surplus)
     
     # If weights are very close, return a small value
     if abs(weight - gewenst_gewicht) < 0.1:
-        print(f"Weight and goal weight are very close ({weight} vs {gewenst_gewicht}), returning minimal time")
+        logger.debug("Weight and goal weight are very close (%s vs %s), returning minimal time", weight, gewenst_gewicht)
         return 0.1
     
     # Avoid division by zero
     if deficit_surplus == 0 and (sport not in caloric_burn_rates or time == 0):
-        print("No caloric changes detected, returning infinite time")
+        logger.debug("No caloric changes detected, returning infinite time")
         return float('inf')  # Infinite time if no caloric changes
     
     if gewenst_gewicht > weight:
         # Weight gain scenario
         total = deficit_surplus
         if total <= 0:
-            print("Can't gain weight with caloric deficit, returning infinite time")
+            logger.debug("Can't gain weight with caloric deficit, returning infinite time")
             return float('inf')  # Can't gain weight with deficit
             
         # Calculate days needed
         days = (7000 * abs(weight - gewenst_gewicht)) / abs(total)
-        print(f"Weight gain calculation: {days} days")
+        logger.debug("Weight gain calculation: %s days", days)
         return days
     else:
         # Weight loss scenario
         total = 0
         if sport in caloric_burn_rates:
             sport_burn = caloric_burn_rates[sport] * time
-            print(f"Sport caloric burn: {sport} burns {sport_burn} calories in {time} minutes")
+            logger.debug("Sport caloric burn: %s burns %s calories in %s minutes", sport, sport_burn, time)
             total = sport_burn
         else:
-            print(f"Sport {sport} not found in caloric burn rates")
+            logger.debug("Sport %s not found in caloric burn rates", sport)
         
         # Add deficit for weight loss
         if weight > gewenst_gewicht:
             total += deficit_surplus
-            print(f"Adding deficit {deficit_surplus} for weight loss, total: {total}")
+            logger.debug("Adding deficit %s for weight loss, total: %s", deficit_surplus, total)
         else:
             total -= deficit_surplus
-            print(f"Subtracting deficit {deficit_surplus}, total: {total}")
+            logger.debug("Subtracting deficit %s, total: %s", deficit_surplus, total)
             
         # Can't lose weight without caloric deficit
         if total <= 0:
-            print("No caloric deficit for weight loss, returning infinite time")
+            logger.debug("No caloric deficit for weight loss, returning infinite time")
             return float('inf')
             
         # Calculate days needed
         days = (7000 * abs(weight - gewenst_gewicht)) / abs(total)
-        print(f"Weight loss calculation: {days} days")
+        logger.debug("Weight loss calculation: %s days", days)
         return days
 
 def calculate_bmr(weight, height, age, gender):
@@ -117,20 +500,54 @@ def calculate_tdee(bmr, activity_level):
     Returns:
         TDEE in calories per day
     """
-    activity_multipliers = {
-        "sedentary": 1.2,
-        "light": 1.375,
-        "moderate": 1.55,
-        "active": 1.725,
-        "very active": 1.9
-    }
-    
     # Convert to lowercase and get multiplier (default to sedentary if not found)
     activity_level = activity_level.lower()
     multiplier = activity_multipliers.get(activity_level, 1.2)
     
     return bmr * multiplier
 
+def validate_sports(input_data: UserInput):
+    """
+    Check that the input contains at least one known sport
+    
+    Raises:
+        HTTPException: 400 if no (valid) sport was selected
+    """
+    if not input_data.sport:
+        raise HTTPException(status_code=400, detail="At least one sport must be selected")
+    if not any(s in caloric_burn_rates for s in input_data.sport):
+        raise HTTPException(status_code=400, detail=f"No valid sports selected. Valid options are: {list(caloric_burn_rates.keys())}")
+
+def calculation_cache_key(input_data: UserInput):
+    """
+    Build the cache key for a UserInput
+    
+    Only differences the calculation ignores are normalized (the case of gender
+    and activity level, minutes below 1), so a cached body is always exactly
+    the response the request would get. Sport order and weights stay as sent.
+    """
+    return (
+        input_data.gender.lower(),
+        input_data.weight,
+        input_data.height,
+        input_data.age,
+        input_data.activity_level.lower(),
+        tuple(input_data.sport),
+        max(input_data.aantal_minuten_sporten, 1),
+        input_data.gewenst_gewicht,
+        input_data.deficit_surplus
+    )
+
+@app.get("/calculate/cache")
+def calculate_cache_stats():
+    """
+    Report the state of the calculation cache
+    
+    Returns:
+        Dictionary with size, hit, miss and eviction counters
+    """
+    return calculation_cache.stats()
+
 @app.post("/calculate")
 def calculate(input_data: UserInput):
     """
@@ -140,28 +557,26 @@ def calculate(input_data: UserInput):
         input_data: User input data including current stats and goals
         
     Returns:
-        Dictionary with calculation results
+        JSON response with calculation results
     """
     try:
-        # Debug input data
-        print(f"Received calculation request with data: {input_data}")
-        print(f"Sports selected: {input_data.sport}")
-        print(f"Current weight: {input_data.weight}, Goal weight: {input_data.gewenst_gewicht}")
-        print(f"Minutes of sport: {input_data.aantal_minuten_sporten}")
+        logger.debug("Received calculation request with data: %s", input_data)
         
-        # Validate input
-        if not input_data.sport:
-            raise HTTPException(status_code=400, detail="At least one sport must be selected")
+        # Identical requests are served from the cache as rendered JSON
+        cache_key = calculation_cache_key(input_data)
+        cached_body = calculation_cache.get(cache_key)
+        request_span = current_span.get()
+        if request_span is not None:
+            request_span["attributes"]["cache"] = "hit" if cached_body is not None else "miss"
+        if cached_body is not None:
+            return Response(content=cached_body, media_type="application/json")
         
-        # Make sure sports are valid
-        valid_sports = [s for s in input_data.sport if s in caloric_burn_rates]
-        if not valid_sports:
-            print(f"No valid sports found in {input_data.sport}. Valid sports are: {list(caloric_burn_rates.keys())}")
-            raise HTTPException(status_code=400, detail=f"No valid sports selected. Valid options are: {list(caloric_burn_rates.keys())}")
+        # Validate input and make sure sports are valid
+        validate_sports(input_data)
             
         # Ensure we have a non-zero exercise time if needed for calculations
         if input_data.aantal_minuten_sporten <= 0:
-            print(f"Minutes of sport is too low: {input_data.aantal_minuten_sporten}")
+            logger.debug("Minutes of sport is too low: %s", input_data.aantal_minuten_sporten)
             # Set a minimum value to prevent calculation issues
             input_data.aantal_minuten_sporten = 1
             
@@ -180,7 +595,7 @@ def calculate(input_data: UserInput):
                 try:
                     # Skip invalid sports
                     if v not in caloric_burn_rates:
-                        print(f"Skipping invalid sport: {v}")
+                        logger.debug("Skipping invalid sport: %s", v)
                         continue
                         
                     tijd = calculate_time(v, input_data.weight, input_data.gewenst_gewicht, input_data.aantal_minuten_sporten, i)
@@ -190,7 +605,7 @@ def calculate(input_data: UserInput):
                         days_total += tijd
                         valid_calculations += 1
                     else:
-                        print(f"Calculation resulted in infinite time for sport {v} with deficit {i}")
+                        logger.debug("Calculation resulted in infinite time for sport %s with deficit %s", v, i)
                     
                     count += 1
                     
@@ -213,24 +628,24 @@ def calculate(input_data: UserInput):
                             "time_to_reach_goal": round(tijd, 2),
                         })
                 except Exception as e:
-                    print(f"Error calculating for sport {v} with deficit {i}: {str(e)}")
+                    logger.warning("Error calculating for sport %s with deficit %s: %s", v, i, e)
         
         # Calculate average days to goal (only from valid calculations)
         if valid_calculations > 0:
             days_to_goal = days_total / valid_calculations
-            print(f"Average days to goal: {days_to_goal} (from {valid_calculations} valid calculations)")
+            logger.debug("Average days to goal: %s (from %s valid calculations)", days_to_goal, valid_calculations)
         else:
             days_to_goal = float('inf')
-            print("No valid calculations found, setting days_to_goal to infinity")
+            logger.debug("No valid calculations found, setting days_to_goal to infinity")
             
         # If days to goal is infinite, set a very high number
         if math.isinf(days_to_goal):
             days_to_goal = 9999
-            print("Infinite days to goal converted to 9999")
+            logger.debug("Infinite days to goal converted to 9999")
         elif days_to_goal < 0.1:
             # If days to goal is very small (nearly instant), set it to 0.1 to avoid showing 0
             days_to_goal = 0.1
-            print("Very small days to goal value, setting to 0.1 minimum")
+            logger.debug("Very small days to goal value, setting to 0.1 minimum")
         
         # Make sure all required fields are present and have valid values
         response_data = {
@@ -241,16 +656,389 @@ def calculate(input_data: UserInput):
             "weight_difference": round(abs(input_data.weight - input_data.gewenst_gewicht), 2)
         }
         
-        print(f"Calculation complete. Response: {response_data}")
-        print(f"Response contains required fields: days_to_goal={response_data.get('days_to_goal')}, BMR={response_data.get('BMR')}, TDEE={response_data.get('TDEE')}")
+        logger.debug("Calculation complete. Response: %s", response_data)
         
-        # Ensure we return the complete dictionary
-        return response_data
+        # Render once and keep the body for the next identical request
+        response = FastJSONResponse(content=response_data)
+        calculation_cache.set(cache_key, response.body)
+        return response
     except HTTPException as he:
-        print(f"HTTP Exception in calculation: {he.detail}")
+        logger.info("HTTP Exception in calculation: %s", he.detail)
         raise he
     except Exception as e:
-        print(f"Unhandled error in calculation: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Unhandled error in calculation: %s", e)
         raise HTTPException(status_code=500, detail=f"Error in calculation: {str(e)}")
+
+def calculate_batch_grid(records):
+    """
+    Calculate BMR, TDEE and the sport x calorie adjustment grid for many users at once
+    
+    Produces the same numbers as calling calculate_time, calculate_bmr and
+    calculate_tdee per record, but evaluates every record in a handful of
+    NumPy array operations.
+    
+    Args:
+        records: List of validated UserInput records, each with at least one valid sport
+        
+    Returns:
+        Tuple of (BMR array, TDEE array, days grid, pair record index, pair sports) where
+        the days grid has shape (len(cals), number of record/sport pairs)
+    """
+    weight = np.array([r.weight for r in records], dtype=float)
+    goal = np.array([r.gewenst_gewicht for r in records], dtype=float)
+    height = np.array([r.height for r in records], dtype=float)
+    age = np.array([r.age for r in records], dtype=float)
+    minutes = np.array([max(r.aantal_minuten_sporten, 1) for r in records], dtype=float)
+    female = np.array([r.gender.lower() == "female" for r in records])
+    multiplier = np.array([activity_multipliers.get(r.activity_level.lower(), 1.2) for r in records])
+    
+    # Mifflin-St Jeor, with the same operation order as calculate_bmr
+    bmr = np.where(
+        female,
+        (10 * weight) + (6.25 * height) - (5 * age) - 161,
+        (20 * weight) + (6.25 * height) - (5 * age) + 5
+    )
+    tdee = bmr * multiplier
+    
+    # Flatten the ragged sport lists into (record, sport) pairs
+    pair_record = []
+    pair_sport = []
+    for index, record in enumerate(records):
+        for sport in record.sport:
+            if sport in caloric_burn_rates:
+                pair_record.append(index)
+                pair_sport.append(sport)
+    pair_record = np.array(pair_record, dtype=np.intp)
+    rates = np.array([caloric_burn_rates[sport] for sport in pair_sport], dtype=float)
+    
+    w = weight[pair_record]
+    g = goal[pair_record]
+    difference = np.abs(w - g)
+    adjustment = np.array(cals, dtype=float)[:, np.newaxis]
+    
+    # Weight gain uses only the surplus, weight loss adds sport burn to the deficit
+    gain = g > w
+    total = np.where(gain, adjustment, rates * minutes[pair_record] + np.where(w > g, adjustment, -adjustment))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days = np.where(total > 0, (7000 * difference) / np.abs(total), np.inf)
+    days = np.where(difference < 0.1, 0.1, days)
+    
+    return bmr, tdee, days, pair_record, pair_sport
+
+def calculate_days_grid(weight, gewenst_gewicht, rates, minutes, adjustments):
+    """
+    Days to reach the goal for every sport, calorie adjustment and minutes of sport
+    
+    Gives the same numbers as calculate_time for each combination, evaluated
+    as one NumPy broadcast.
+    
+    Args:
+        weight: Current weight in kg
+        gewenst_gewicht: Goal weight in kg
+        rates: Caloric burn rate per minute for each sport
+        minutes: Minutes of sport per day
+        adjustments: Caloric deficit or surplus per day
+    
+    Returns:
+        Array of shape (len(rates), len(adjustments), len(minutes)), inf where
+        the goal can't be reached
+    """
+    difference = abs(weight - gewenst_gewicht)
+    rates = np.asarray(rates, dtype=float)[:, np.newaxis, np.newaxis]
+    adjustments = np.asarray(adjustments, dtype=float)[np.newaxis, :, np.newaxis]
+    minutes = np.asarray(minutes, dtype=float)[np.newaxis, np.newaxis, :]
+    shape = (rates.shape[0], adjustments.shape[1], minutes.shape[2])
+    if difference < 0.1:
+        return np.full(shape, 0.1)
+    
+    # Weight gain only counts the surplus, weight loss adds the sport burn to the deficit
+    if gewenst_gewicht > weight:
+        total = np.broadcast_to(adjustments, shape)
+    else:
+        total = rates * minutes + adjustments
+    with np.errstate(divide="ignore"):
+        return np.where(total > 0, (7000 * difference) / np.abs(total), np.inf)
+
+@app.post("/calculate/grid")
+def calculate_grid(grid: GridInput):
+    """
+    Evaluate days to goal over a grid of minutes of sport and calorie adjustments
+    
+    Args:
+        grid: User stats plus inclusive minutes and adjustment ranges; all
+            known sports are used when no sports are given
+    
+    Returns:
+        Axes, BMR/TDEE, the daily calorie goal per adjustment and a
+        days[sport][adjustment][minutes] matrix with null where the goal
+        can't be reached
+    """
+    grid_sports = [s for s in (grid.sport or caloric_burn_rates) if s in caloric_burn_rates]
+    if not grid_sports:
+        raise HTTPException(status_code=400, detail=f"No valid sports selected. Valid options are: {list(caloric_burn_rates.keys())}")
+    for name in ("minutes", "adjustment"):
+        low, high, step = getattr(grid, f"{name}_min"), getattr(grid, f"{name}_max"), getattr(grid, f"{name}_step")
+        if step <= 0 or high < low:
+            raise HTTPException(status_code=400, detail=f"Invalid {name} range: {low}..{high} step {step}")
+    if grid.minutes_min < 0:
+        raise HTTPException(status_code=400, detail="Minutes of sport can't be negative")
+    
+    minutes = list(range(grid.minutes_min, grid.minutes_max + 1, grid.minutes_step))
+    adjustments = list(range(grid.adjustment_min, grid.adjustment_max + 1, grid.adjustment_step))
+    cells = len(grid_sports) * len(adjustments) * len(minutes)
+    if cells > GRID_MAX_CELLS:
+        raise HTTPException(status_code=400, detail=f"Grid has {cells} cells, the maximum is {GRID_MAX_CELLS}")
+    
+    weight, gewenst_gewicht = grid.weight, grid.gewenst_gewicht
+    BMR = calculate_bmr(weight, grid.height, grid.age, grid.gender)
+    TDEE = calculate_tdee(BMR, grid.activity_level)
+    sign = 1 if gewenst_gewicht > weight else -1
+    
+    with span("grid", f"{cells} cells"):
+        days = calculate_days_grid(weight, gewenst_gewicht, [caloric_burn_rates[s] for s in grid_sports], minutes, adjustments)
+        days = np.round(days, 2).tolist()
+    
+    return FastJSONResponse({
+        "sports": grid_sports,
+        "minutes": minutes,
+        "calorie_adjustments": adjustments,
+        "BMR": round(BMR, 2),
+        "TDEE": round(TDEE, 2),
+        "goals": [round(TDEE + sign * adjustment, 2) for adjustment in adjustments],
+        "weight_difference": round(abs(weight - gewenst_gewicht), 2),
+        "days": [[[None if math.isinf(v) else v for v in row] for row in sport_days] for sport_days in days]
+    })
+
+def bmr_weight_coefficient(gender):
+    """kcal per day that calculate_bmr changes per kg of body weight"""
+    return calculate_bmr(1, 0, 0, gender) - calculate_bmr(0, 0, 0, gender)
+
+def projection_parameters(records):
+    """
+    Turn UserInput records into the arrays project_weights works on
+    
+    The person keeps eating what they ate on day 0: TDEE minus the deficit (or
+    plus the surplus) and, when losing weight, does the average burn of their
+    valid sports for their daily minutes, like calculate_time. As the weight
+    changes the TDEE follows, so the daily balance shrinks by the activity
+    multiplier times the BMR weight coefficient per kg lost or gained.
+    
+    Returns:
+        Tuple of (weight, goal, balance on day 0 in kcal, kcal per kg of balance change) arrays
+    """
+    weight = np.array([r.weight for r in records], dtype=float)
+    goal = np.array([r.gewenst_gewicht for r in records], dtype=float)
+    adjustment = np.array([r.deficit_surplus for r in records], dtype=float)
+    burn = np.array([
+        np.mean([caloric_burn_rates[s] for s in r.sport if s in caloric_burn_rates] or [0]) * max(r.aantal_minuten_sporten, 1)
+        for r in records
+    ])
+    multiplier = np.array([activity_multipliers.get(r.activity_level.lower(), 1.2) for r in records])
+    coefficient = np.array([bmr_weight_coefficient(r.gender) for r in records], dtype=float)
+    
+    balance = np.where(goal > weight, adjustment, -(adjustment + burn))
+    return weight, goal, balance, multiplier * coefficient
+
+def project_weights(weight, balance, slope, days, kcal_per_kg=7000, previous=None):
+    """
+    Daily weights for many people at once
+    
+    Each day the weight changes by balance_t / kcal_per_kg, with
+    balance_t = balance - slope * (weight_t - weight_0). That linear recurrence
+    has the closed form weight_t = eq + (weight_0 - eq) * (1 - slope / kcal_per_kg) ** t
+    around the equilibrium eq = weight_0 + balance / slope, so the whole
+    trajectory is one broadcast power instead of a loop over days.
+    
+    Args:
+        weight: Weight on day 0 per person
+        balance: Energy balance on day 0 in kcal per day (negative loses weight)
+        slope: kcal per day the balance moves per kg of weight change
+        days: Number of days to project
+        kcal_per_kg: Energy per kg of body weight
+        previous: Weights on the last projected day, to continue a projection
+            in chunks; defaults to the day 0 weights
+    
+    Returns:
+        Array of shape (len(weight), days) with the weights of the next `days` days
+    """
+    equilibrium = weight + balance / slope
+    ratio = 1 - slope / kcal_per_kg
+    if previous is None:
+        previous = weight
+    steps = np.arange(1, days + 1, dtype=float)
+    return equilibrium[:, np.newaxis] + (previous - equilibrium)[:, np.newaxis] * ratio[:, np.newaxis] ** steps
+
+def goal_reached_days(curve, weight, goal, first_day=1):
+    """
+    First day each trajectory reaches the goal weight
+    
+    Returns:
+        Array with the day number per person, -1 when the goal isn't reached
+    """
+    losing = (goal < weight)[:, np.newaxis]
+    reached = np.where(losing, curve <= goal[:, np.newaxis], curve >= goal[:, np.newaxis])
+    found = reached.any(axis=1)
+    days = np.where(found, reached.argmax(axis=1) + first_day, -1)
+    # Already (nearly) at the goal, like calculate_time
+    return np.where(np.abs(weight - goal) < 0.1, 0, days)
+
+def validate_projection(projection: ProjectionInput, max_days):
+    """Reject projections with invalid sports, days, kcal_per_kg or chunk_days with a 400"""
+    validate_sports(projection)
+    if not 1 <= projection.days <= max_days:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {max_days}")
+    if projection.kcal_per_kg < PROJECTION_MIN_KCAL_PER_KG:
+        raise HTTPException(status_code=400, detail=f"kcal_per_kg must be at least {PROJECTION_MIN_KCAL_PER_KG}")
+    if projection.chunk_days <= 0:
+        raise HTTPException(status_code=400, detail="chunk_days must be positive")
+
+def projection_summary(projection: ProjectionInput, reached_day):
+    """Turn the day the goal is reached (-1 for never) into the goal day and date fields of the response"""
+    start_date = projection.start_date or date.today()
+    return {
+        "goal_reached_day": reached_day if reached_day >= 0 else None,
+        "goal_date": (start_date + timedelta(days=reached_day)).isoformat() if reached_day >= 0 else None,
+        "start_date": start_date.isoformat()
+    }
+
+@app.post("/calculate/projection")
+def calculate_projection(projection: ProjectionInput):
+    """
+    Simulate the weight day by day, with BMR and TDEE following the weight
+    
+    Args:
+        projection: User input plus the horizon in days and an optional start date
+    
+    Returns:
+        The daily weights (day 0 first), the day and date the goal is reached
+        (null when it isn't within the horizon), the linear estimate of
+        calculate_time for comparison and the equilibrium weight
+    """
+    validate_projection(projection, PROJECTION_MAX_DAYS)
+    weight, goal, balance, slope = projection_parameters([projection])
+    
+    with span("projection", f"{projection.days} days"):
+        curve = project_weights(weight, balance, slope, projection.days, projection.kcal_per_kg)
+        reached_day = int(goal_reached_days(curve, weight, goal)[0])
+    
+    # What a constant TDEE would predict, None when the balance points away from the goal
+    linear = None
+    if balance[0] * (goal[0] - weight[0]) > 0:
+        linear = round(projection.kcal_per_kg * abs(projection.weight - projection.gewenst_gewicht) / abs(float(balance[0])), 2)
+    BMR = calculate_bmr(projection.weight, projection.height, projection.age, projection.gender)
+    return FastJSONResponse({
+        **projection_summary(projection, reached_day),
+        "linear_days_to_goal": linear,
+        "equilibrium_weight": round(float(weight[0] + balance[0] / slope[0]), 2),
+        "BMR": round(BMR, 2),
+        "TDEE": round(calculate_tdee(BMR, projection.activity_level), 2),
+        "weights": [projection.weight] + np.round(curve[0], 2).tolist()
+    })
+
+@app.post("/calculate/projection/stream")
+def calculate_projection_stream(projection: ProjectionInput):
+    """
+    Stream a long projection as NDJSON, chunk_days at a time
+    
+    Every line is {"start_day": n, "weights": [...]} for days n.. of the
+    chunk; the last line holds goal_reached_day and goal_date. With
+    stop_at_goal the stream ends after the chunk in which the goal is reached.
+    Only one chunk is in memory at a time, so the horizon can run up to
+    PROJECTION_STREAM_MAX_DAYS.
+    """
+    validate_projection(projection, PROJECTION_STREAM_MAX_DAYS)
+    weight, goal, balance, slope = projection_parameters([projection])
+    
+    def lines():
+        yield dumps_json({"start_day": 0, "weights": [projection.weight]}) + b"\n"
+        reached_day = 0 if abs(weight[0] - goal[0]) < 0.1 else -1
+        first_day = 1
+        previous = weight
+        while first_day <= projection.days and not (projection.stop_at_goal and reached_day >= 0):
+            days = min(projection.chunk_days, projection.days - first_day + 1)
+            curve = project_weights(weight, balance, slope, days, projection.kcal_per_kg, previous)
+            if reached_day < 0:
+                reached_day = int(goal_reached_days(curve, weight, goal, first_day)[0])
+            yield dumps_json({"start_day": first_day, "weights": np.round(curve[0], 2).tolist()}) + b"\n"
+            previous = curve[:, -1]
+            first_day += days
+        yield dumps_json(projection_summary(projection, reached_day)) + b"\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/calculate/batch")
+def calculate_batch(batch: BatchInput):
+    """
+    Calculate time to reach goal weight for many users in one request
+    
+    Args:
+        batch: List of user input records
+        
+    Returns:
+        List with one entry per record, in input order. Valid records get the
+        same dictionary as /calculate, invalid records get {"error": detail}.
+    """
+    responses = [None] * len(batch.records)
+    valid_records = []
+    valid_positions = []
+    for position, record in enumerate(batch.records):
+        try:
+            validate_sports(record)
+        except HTTPException as he:
+            responses[position] = {"error": he.detail}
+            continue
+        valid_records.append(record)
+        valid_positions.append(position)
+    
+    if not valid_records:
+        return FastJSONResponse(responses)
+    
+    with span("grid", f"{len(valid_records)} records"):
+        bmr, tdee, days, pair_record, pair_sport = calculate_batch_grid(valid_records)
+    bmr = bmr.tolist()
+    tdee = tdee.tolist()
+    days = days.tolist()
+    
+    # Pairs are grouped per record, so each record owns a contiguous column range
+    bounds = np.searchsorted(pair_record, np.arange(len(valid_records) + 1)).tolist()
+    
+    for index, record in enumerate(valid_records):
+        record_tdee = round(tdee[index], 2)
+        sign = 1 if record.gewenst_gewicht > record.weight else -1
+        start, stop = bounds[index], bounds[index + 1]
+        
+        results = []
+        days_total = 0
+        valid_calculations = 0
+        for row, adjustment in enumerate(cals):
+            goal = round(tdee[index] + sign * adjustment, 2)
+            row_days = days[row]
+            for column in range(start, stop):
+                tijd = row_days[column]
+                if not math.isinf(tijd):
+                    days_total += tijd
+                    valid_calculations += 1
+                results.append({
+                    "sport": pair_sport[column],
+                    "calorie_adjustment": adjustment,
+                    "TDEE": record_tdee,
+                    "goal": goal,
+                    "time_to_reach_goal": round(tijd, 2),
+                })
+        
+        days_to_goal = days_total / valid_calculations if valid_calculations > 0 else float('inf')
+        if math.isinf(days_to_goal):
+            days_to_goal = 9999
+        elif days_to_goal < 0.1:
+            days_to_goal = 0.1
+        
+        responses[valid_positions[index]] = {
+            "results": results,
+            "days_to_goal": round(days_to_goal, 2),
+            "BMR": round(bmr[index], 2),
+            "TDEE": record_tdee,
+            "weight_difference": round(abs(record.weight - record.gewenst_gewicht), 2)
+        }
+    
+    # Everything is already a plain dict, list or float: skip FastAPI's jsonable_encoder pass
+    return FastJSONResponse(responses)
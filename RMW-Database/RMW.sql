@@ -28,6 +28,15 @@
         FOREIGN KEY (user_id) REFERENCES users (id)
     );
 
+    -- Weight history per user, newest first; covers the history queries
+    CREATE INDEX IF NOT EXISTS idx_weights_user_date_id ON weights (user_id, date DESC, id DESC, weight, goal_weight);
+
+    -- Per-user version, bumped with every weight or profile write; used for ETags
+    CREATE TABLE IF NOT EXISTS user_versions (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+
     -- Create a test user if none exist
     INSERT OR IGNORE INTO users (username, password) 
     VALUES ('test', 'password');
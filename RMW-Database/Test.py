@@ -1,8 +1,13 @@
 import pytest
+import asyncio
+import contextlib
 import sqlite3
+import threading
 import time
 from fastapi.testclient import TestClient
-from main import app, get_db
+from main import app, get_db, ConnectionPool, run_db, migrate_db, check_query_plans, MIGRATIONS, lttb_indices, statement_label
+import main
+import numpy as np
 
 # Test database setup
 @pytest.fixture(scope="session")
@@ -29,6 +34,8 @@ def override_get_db(test_db):
 def test_client(override_get_db):
     """Fixture om een test client te maken met de database override."""
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[main.get_db_connector] = lambda: contextlib.contextmanager(override_get_db)
+    main.user_cache.clear()
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -83,6 +90,71 @@ def test_invalid_login(test_client):
     response = test_client.post("/login", json={"username": "test", "password": "wrongpass"})
     assert response.status_code == 401
 
+def test_passwords_are_hashed(test_client, test_db, test_user):
+    """Test dat wachtwoorden gezouten met scrypt worden opgeslagen en nooit als platte tekst."""
+    stored = test_db.execute("SELECT password FROM users WHERE id = ?", (test_user["id"],)).fetchone()[0]
+    assert stored.startswith(f"scrypt${main.PASSWORD_SCRYPT_N}$") and "test123" not in stored
+    
+    params = main.password_params()
+    other = main.hash_password("test123", *params)
+    assert other != stored
+    assert main.verify_password("test123", other, *params) == (True, False)
+    assert main.verify_password("test124", other, *params) == (False, False)
+    
+    # Een onbekende gebruiker geeft dezelfde fout als een fout wachtwoord
+    response = test_client.post("/login", json={"username": "bestaat_niet", "password": "test123"})
+    assert response.status_code == 401
+    assert response.json() == test_client.post("/login", json={"username": test_user["username"], "password": "x"}).json()
+
+def test_login_rehashes_lazily(test_client, test_db, monkeypatch):
+    """Test dat oude platte tekst wachtwoorden en hashes met een oude kost bij het inloggen worden vervangen."""
+    username = f"legacy_{int(time.time() * 1000)}"
+    test_db.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, "oud_wachtwoord"))
+    test_db.commit()
+    stored = lambda: test_db.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()[0]
+    
+    assert test_client.post("/login", json={"username": username, "password": "fout"}).status_code == 401
+    assert stored() == "oud_wachtwoord"
+    
+    response = test_client.post("/login", json={"username": username, "password": "oud_wachtwoord"})
+    assert response.status_code == 200 and response.json()["username"] == username
+    first_hash = stored()
+    assert first_hash.startswith(f"scrypt${main.PASSWORD_SCRYPT_N}$")
+    
+    # Zonder nieuwe kost blijft de hash staan
+    assert test_client.post("/login", json={"username": username, "password": "oud_wachtwoord"}).status_code == 200
+    assert stored() == first_hash
+    
+    # Een hogere kost geeft bij de volgende login een nieuwe hash, die ook zonder worker pool werkt
+    monkeypatch.setattr(main, "PASSWORD_SCRYPT_N", main.PASSWORD_SCRYPT_N * 2)
+    monkeypatch.setattr(main, "PASSWORD_WORKERS", 0)
+    assert test_client.post("/login", json={"username": username, "password": "oud_wachtwoord"}).status_code == 200
+    assert stored().startswith(f"scrypt${main.PASSWORD_SCRYPT_N}$")
+    assert test_client.post("/login", json={"username": username, "password": "oud_wachtwoord"}).status_code == 200
+
+def test_login_with_malformed_hash(test_client, test_db):
+    """Test dat een kapotte opgeslagen hash een mislukte login geeft in plaats van een 500."""
+    for number, stored in enumerate(("scrypt$", "scrypt$a$b$c$d$e", "scrypt$16384$8$1$!!$AA", "scrypt$16384$8$-1$AAAA$AAAA")):
+        username = f"kapot_{number}_{int(time.time() * 1000)}"
+        test_db.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, stored))
+        test_db.commit()
+        response = test_client.post("/login", json={"username": username, "password": "test123"})
+        assert response.status_code == 401, stored
+    assert main.verify_password("test123", "scrypt$", *main.password_params()) == (False, False)
+
+def test_users_and_login_with_api_prefix(test_client):
+    """Test dat registreren en inloggen via de /api routes van de frontend werken."""
+    unique_username = f"api_{int(time.time() * 1000)}"
+    response = test_client.post("/api/users", json={"username": unique_username, "password": "test123"})
+    assert response.status_code == 200, response.text
+    user_id = response.json()["id"]
+    assert test_client.post("/api/users", json={"username": unique_username, "password": "test123"}).status_code == 400
+    
+    response = test_client.post("/api/login", json={"username": unique_username, "password": "test123"})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"id": user_id, "username": unique_username}
+    assert test_client.post("/api/login", json={"username": unique_username, "password": "fout"}).status_code == 401
+
 def test_get_user(test_client, test_user):
     """Test om een gebruiker op te halen."""
     response = test_client.get(f"/users/{test_user['id']}")
@@ -104,6 +176,92 @@ def test_create_weight(test_client, test_user):
     assert data["user_id"] == test_user["id"]
     assert data["weight"] == 80.5
 
+def test_create_weights_bulk(test_client, test_user):
+    """Test voor het bulk importeren van gewichten als JSON array met fouten per rij."""
+    rows = [
+        {"user_id": test_user["id"], "weight": 81.0, "goal_weight": 75, "date": "2023-05-01 08:00:00"},
+        {"user_id": test_user["id"], "weight": "zwaar", "goal_weight": 75},
+        {"user_id": 999999, "weight": 70.0, "goal_weight": 65},
+        {"user_id": test_user["id"], "weight": 80.0, "goal_weight": 75},
+    ]
+    response = test_client.post("/api/weights/bulk", json=rows)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["inserted"] == 2
+    assert data["failed"] == 2
+    assert [error["index"] for error in data["errors"]] == [1, 2]
+    assert "not found" in data["errors"][1]["detail"]
+    
+    weights = test_client.get(f"/weights/{test_user['id']}").json()
+    assert {w["weight"] for w in weights} >= {80.0, 81.0}
+
+def test_create_weights_bulk_ndjson(test_client, test_user):
+    """Test voor het bulk importeren van gewichten als NDJSON stream."""
+    body = "\n".join([
+        f'{{"user_id": {test_user["id"]}, "weight": 79.5, "goal_weight": 75}}',
+        "geen json",
+        f'{{"user_id": {test_user["id"]}, "weight": 79.0, "goal_weight": 75}}',
+    ])
+    response = test_client.post("/weights/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["inserted"] == 2
+    assert data["errors"][0]["index"] == 1
+
+def test_create_weights_bulk_ndjson_rejects_joined_lines(test_client, test_user):
+    """Test dat een NDJSON regel met twee objecten mislukt en de rijen erna niet verschuiven."""
+    row = lambda weight: f'{{"user_id": {test_user["id"]}, "weight": {weight}, "goal_weight": 75, "date": "2023-06-01 08:00:00"}}'
+    body = "\n".join([row(70.1), f"{row(70.2)}, {row(70.3)}", row(70.4)])
+    response = test_client.post("/weights/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert (data["inserted"], data["failed"]) == (2, 1)
+    assert data["errors"][0]["index"] == 1
+    
+    weights = {w["weight"] for w in test_client.get(f"/weights/{test_user['id']}").json()}
+    assert {70.1, 70.4} <= weights
+    assert not {70.2, 70.3} & weights
+    
+    # Regels die samen wel geldige JSON vormen mogen ook geen rijen naar elkaar verschuiven
+    body = "\n".join([f"{row(70.5)}, {row(70.6)}", "[1", "2]", row(70.7)])
+    response = test_client.post("/weights/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    data = response.json()
+    assert (data["inserted"], data["failed"]) == (1, 3)
+    assert [error["index"] for error in data["errors"]] == [0, 1, 2]
+    weights = {w["weight"] for w in test_client.get(f"/weights/{test_user['id']}").json()}
+    assert 70.7 in weights
+    assert not {70.5, 70.6} & weights
+
+def test_create_weights_bulk_waits_for_insert_on_failure(test_client, test_db, test_user, monkeypatch):
+    """Test dat de verbinding pas terug gaat als de lopende insert klaar is, ook als de stream faalt."""
+    events = []
+    insert_weights = main.db_insert_weights
+    
+    def slow_insert(db, rows):
+        time.sleep(0.2)
+        result = insert_weights(db, rows)
+        events.append("inserted")
+        return result
+    
+    async def failing_rows(request):
+        for index in range(2):
+            yield index, {"user_id": test_user["id"], "weight": 71.0 + index, "goal_weight": 75}
+        raise RuntimeError("stream afgebroken")
+    
+    def tracked_db():
+        try:
+            yield test_db
+        finally:
+            events.append("released")
+    
+    monkeypatch.setattr(main, "BULK_CHUNK_SIZE", 2)
+    monkeypatch.setattr(main, "db_insert_weights", slow_insert)
+    monkeypatch.setattr(main, "iter_bulk_rows", failing_rows)
+    app.dependency_overrides[get_db] = tracked_db
+    with pytest.raises(RuntimeError):
+        test_client.post("/weights/bulk", json=[])
+    assert events == ["inserted", "released"]
+
 def test_get_weights(test_client, test_weight):
     """Test om gewichtsgegevens op te halen."""
     user_id = test_weight["user_id"]
@@ -121,5 +279,371 @@ def test_get_latest_weight(test_client, test_weight):
     assert data["user_id"] == user_id
     assert data["weight"] == 80.5
 
+def test_get_weights_paginated(test_client, test_user):
+    """Test voor keyset paginering, datumfilter en veldselectie van de gewichtsgeschiedenis."""
+    for day in range(1, 6):
+        response = test_client.post("/weights", json={
+            "user_id": test_user["id"],
+            "weight": 80 - day,
+            "goal_weight": 70,
+            "date": f"2024-01-0{day} 08:00:00"
+        })
+        assert response.status_code == 200
+    
+    first = test_client.get(f"/api/weights/{test_user['id']}", params={"limit": 2, "fields": "date,weight"})
+    assert first.status_code == 200
+    assert first.json() == [
+        {"date": "2024-01-05 08:00:00", "weight": 75.0},
+        {"date": "2024-01-04 08:00:00", "weight": 76.0}
+    ]
+    cursor = first.headers["X-Next-Before"]
+    
+    second = test_client.get(f"/weights/{test_user['id']}", params={"limit": 2, "before": cursor, "fields": "weight"})
+    assert second.json() == [{"weight": 77.0}, {"weight": 78.0}]
+    
+    third = test_client.get(f"/weights/{test_user['id']}", params={"limit": 2, "before": second.headers["X-Next-Before"]})
+    assert [row["weight"] for row in third.json()] == [79.0]
+    assert "X-Next-Before" not in third.headers
+    
+    ranged = test_client.get(f"/weights/{test_user['id']}", params={"since": "2024-01-02", "until": "2024-01-04"})
+    assert [row["date"][:10] for row in ranged.json()] == ["2024-01-03", "2024-01-02"]
+    
+    assert test_client.get(f"/weights/{test_user['id']}", params={"fields": "password"}).status_code == 400
+    assert test_client.get(f"/weights/{test_user['id']}", params={"before": "nonsense"}).status_code == 400
+
+def test_get_weight_series(test_client, test_user):
+    """Test voor de geaggregeerde en gedownsamplede gewichtsreeks."""
+    for day, weight in [(1, 80.0), (1, 82.0), (2, 79.0), (9, 78.0), (20, 77.0)]:
+        response = test_client.post("/weights", json={
+            "user_id": test_user["id"],
+            "weight": weight,
+            "goal_weight": 70,
+            "date": f"2024-02-{day:02d} 0{int(weight) % 10}:00:00"
+        })
+        assert response.status_code == 200
+    
+    daily = test_client.get(f"/api/weights/{test_user['id']}/series", params={"bucket": "day"}).json()
+    assert daily["bucket"] == "day"
+    assert [p["count"] for p in daily["points"]] == [2, 1, 1, 1]
+    first = daily["points"][0]
+    assert (first["weight"], first["min"], first["max"]) == (81.0, 80.0, 82.0)
+    
+    reduced = test_client.get(f"/weights/{test_user['id']}/series", params={"points": 3}).json()["points"]
+    assert len(reduced) == 3
+    assert reduced[0]["date"].startswith("2024-02-01")
+    assert reduced[-1]["date"].startswith("2024-02-20")
+    
+    assert test_client.get(f"/weights/{test_user['id']}/series", params={"bucket": "year"}).status_code == 422
+
+def test_get_user_bundle(test_client, test_user):
+    """Test voor de bundel met gebruiker, profiel en laatste gewichten uit één query."""
+    user_id = test_user["id"]
+    empty = test_client.get(f"/api/users/{user_id}/bundle").json()
+    assert empty == {"user": test_user, "profile": None, "latest_weight": None, "weights": []}
+    
+    test_client.post("/profiles", json={
+        "user_id": user_id, "gender": "female", "height": 168, "age": 41, "activity_level": "light"
+    })
+    for day in range(1, 5):
+        test_client.post("/weights", json={
+            "user_id": user_id, "weight": 70 - day, "goal_weight": 60, "date": f"2024-03-0{day} 08:00:00"
+        })
+    
+    bundle = test_client.get(f"/users/{user_id}/bundle", params={"limit": 3, "fields": "date,weight", "points": 10}).json()
+    assert bundle["profile"]["gender"] == "female"
+    assert bundle["latest_weight"]["weight"] == 66.0
+    assert bundle["latest_weight"]["user_id"] == user_id
+    assert bundle["weights"] == [
+        {"date": "2024-03-04 08:00:00", "weight": 66.0},
+        {"date": "2024-03-03 08:00:00", "weight": 67.0},
+        {"date": "2024-03-02 08:00:00", "weight": 68.0}
+    ]
+    assert len(bundle["series"]["points"]) == 4
+    
+    assert test_client.get("/api/users/999999/bundle").status_code == 404
+
+def test_trusted_rows_match_response_model(test_client, test_user, monkeypatch):
+    """Test dat rijen zonder hervalidatie dezelfde JSON opleveren als via het response_model."""
+    user_id = test_user["id"]
+    test_client.post("/profiles", json={
+        "user_id": user_id, "gender": "male", "height": 181, "age": 33, "activity_level": "active"
+    })
+    for day in range(1, 4):
+        test_client.post("/weights", json={
+            "user_id": user_id, "weight": 90 - day, "goal_weight": 80, "date": f"2024-04-0{day} 08:00:00"
+        })
+    urls = [
+        (f"/users/{user_id}", None),
+        (f"/api/profiles/{user_id}", None),
+        (f"/weights/{user_id}", {"limit": 2, "fields": "id,weight"}),
+        (f"/api/weights/{user_id}/latest", None),
+        (f"/weights/{user_id}/series", {"bucket": "day"}),
+        (f"/api/users/{user_id}/bundle", {"points": 5})
+    ]
+    
+    def responses():
+        return [test_client.get(url, params=params) for url, params in urls]
+    
+    monkeypatch.setattr(main, "TRUSTED_ROWS", False)
+    validated = responses()
+    monkeypatch.setattr(main, "TRUSTED_ROWS", True)
+    trusted = responses()
+    monkeypatch.setattr(main, "JSON_ENCODER", "json")
+    trusted_stdlib = responses()
+    
+    for before, after, stdlib in zip(validated, trusted, trusted_stdlib):
+        assert after.status_code == 200
+        assert after.json() == before.json()
+        assert stdlib.content == after.content
+    assert trusted[2].headers["X-Next-Before"] == validated[2].headers["X-Next-Before"]
+
+def test_user_read_cache(test_client, test_user):
+    """Test dat leesacties uit de cache komen en alleen de schrijfacties van dezelfde gebruiker ze ongeldig maken."""
+    user_id = test_user["id"]
+    test_client.post("/profiles", json={
+        "user_id": user_id, "gender": "male", "height": 175, "age": 50, "activity_level": "light"
+    })
+    test_client.post("/weights", json={"user_id": user_id, "weight": 82, "goal_weight": 78, "date": "2024-05-01 08:00:00"})
+    main.user_cache.clear()
+    
+    assert test_client.get(f"/weights/{user_id}").json()[0]["weight"] == 82.0
+    assert test_client.get(f"/api/weights/{user_id}").json()[0]["weight"] == 82.0
+    test_client.get(f"/profiles/{user_id}")
+    stats = test_client.get("/cache/stats").json()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 2)
+    
+    # Een nieuwe meting maakt de gewichten ongeldig, het profiel blijft in de cache
+    test_client.post("/weights", json={"user_id": user_id, "weight": 81, "goal_weight": 78, "date": "2024-05-02 08:00:00"})
+    assert test_client.get(f"/weights/{user_id}").json()[0]["weight"] == 81.0
+    assert test_client.get(f"/weights/{user_id}/latest").json()["weight"] == 81.0
+    test_client.get(f"/profiles/{user_id}")
+    stats = test_client.get("/api/cache/stats").json()
+    assert stats["invalidations"] == 1
+    assert stats["hits"] == 2
+    
+    test_client.post("/profiles", json={
+        "user_id": user_id, "gender": "male", "height": 175, "age": 51, "activity_level": "light"
+    })
+    assert test_client.get(f"/profiles/{user_id}").json()["age"] == 51
+    
+    test_client.post("/weights/bulk", json=[{"user_id": user_id, "weight": 80, "goal_weight": 78, "date": "2024-05-03 08:00:00"}])
+    assert test_client.get(f"/weights/{user_id}/latest").json()["weight"] == 80.0
+
+def test_user_etags(test_client, test_user):
+    """Test dat per-gebruiker resources een ETag hebben en If-None-Match een 304 geeft tot de gebruiker iets schrijft."""
+    user_id = test_user["id"]
+    created = test_client.post("/weights", json={"user_id": user_id, "weight": 82, "goal_weight": 78, "date": "2024-05-01 08:00:00"})
+    etag = created.headers["ETag"]
+    assert etag.startswith(f'"{user_id}.')
+    
+    response = test_client.get(f"/weights/{user_id}")
+    assert response.headers["ETag"] == etag
+    for path in (f"/weights/{user_id}", f"/api/weights/{user_id}", f"/weights/{user_id}/latest",
+                 f"/weights/{user_id}/series", f"/users/{user_id}", f"/users/{user_id}/bundle"):
+        not_modified = test_client.get(path, headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304, path
+        assert not_modified.content == b""
+        assert not_modified.headers["ETag"] == etag
+    
+    # Zwakke vergelijking, lijsten en * tellen ook
+    assert test_client.get(f"/weights/{user_id}", headers={"If-None-Match": f'"x", W/{etag}'}).status_code == 304
+    assert test_client.get(f"/weights/{user_id}", headers={"If-None-Match": "*"}).status_code == 304
+    assert test_client.get(f"/weights/{user_id}", headers={"If-None-Match": '"x"'}).status_code == 200
+    
+    # Elke schrijfactie geeft een nieuwe versie
+    seen = {etag}
+    profile = test_client.post("/profiles", json={
+        "user_id": user_id, "gender": "male", "height": 175, "age": 50, "activity_level": "light"
+    })
+    assert profile.headers["ETag"] not in seen
+    seen.add(profile.headers["ETag"])
+    test_client.post("/weights/bulk", json=[{"user_id": user_id, "weight": 80, "goal_weight": 78, "date": "2024-05-03 08:00:00"}])
+    response = test_client.get(f"/weights/{user_id}", headers={"If-None-Match": profile.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.headers["ETag"] not in seen
+    assert len(response.json()) == 2
+    
+    # De ETag van een andere gebruiker matcht nooit
+    assert test_client.get("/weights/99999", headers={"If-None-Match": etag}).status_code == 404
+
+def test_user_etags_unknown_user(test_client):
+    """Test dat een onbekende gebruiker een 404 geeft, ook met een If-None-Match die op versie 0 lijkt."""
+    for path in ("/weights/99999", "/weights/99999/latest", "/profiles/99999", "/users/99999", "/users/99999/bundle"):
+        for headers in ({}, {"If-None-Match": '"99999.0"'}, {"If-None-Match": "*"}):
+            response = test_client.get(path, headers=headers)
+            assert response.status_code == 404, (path, headers)
+            assert "ETag" not in response.headers
+
+def test_user_read_cache_bounds_and_races():
+    """Test dat de cache begrensd is en alleen waarden geeft die bij de gelezen versie nog kloppen."""
+    cache = main.UserReadCache(maxsize=2)
+    for user_id in (1, 2, 3):
+        cache.set((user_id, "weights", ()), [user_id], 0)
+    assert cache.get((1, "weights", ()), 0) == (False, None)
+    assert cache.get((3, "weights", ()), 0) == (True, [3])
+    assert cache.stats()["evictions"] == 1
+    
+    # Een schrijfactie op versie 1: de gewichten van versie 0 kloppen niet meer, het profiel wel
+    cache.set((3, "profile", ()), {"age": 50}, 0)
+    cache.invalidate(3, "weights", 1)
+    assert cache.get((3, "weights", ()), 1) == (False, None)
+    assert cache.get((3, "profile", ()), 1) == (True, {"age": 50})
+    
+    # Een trage lezing van voor de schrijfactie slaat niets op
+    cache.set((3, "latest", ()), {"weight": 1}, 0)
+    assert cache.get((3, "latest", ()), 1) == (False, None)
+    cache.set((3, "latest", ()), {"weight": 2}, 1)
+    assert cache.get((3, "latest", ()), 1) == (True, {"weight": 2})
+    # En een nieuwere waarde wordt niet door een oudere vervangen
+    cache.set((3, "latest", ()), {"weight": 1}, 0)
+    assert cache.get((3, "latest", ()), 2) == (True, {"weight": 2})
+    assert cache.stats()["size"] == 2
+
+def test_user_read_cache_never_serves_old_data_under_new_etag(test_client, test_db, test_user, monkeypatch):
+    """Test dat een lezing die met een schrijfactie samenvalt geen oude data onder de nieuwe ETag in de cache zet."""
+    user_id = test_user["id"]
+    test_client.post("/weights", json={"user_id": user_id, "weight": 82, "goal_weight": 78, "date": "2024-05-01 08:00:00"})
+    
+    # De schrijfactie wordt gecommit nadat de lezing zijn versie en data heeft, maar voordat die in de cache komt
+    read_weights = main.db_get_weights
+    def read_then_write(db, *args):
+        result = read_weights(db, *args)
+        main.db_create_weight(test_db, main.Weight(user_id=user_id, weight=81, goal_weight=78, date="2024-05-02 08:00:00"))
+        return result
+    monkeypatch.setattr(main, "db_get_weights", read_then_write)
+    old = test_client.get(f"/weights/{user_id}")
+    assert old.json()[0]["weight"] == 82.0
+    monkeypatch.setattr(main, "db_get_weights", read_weights)
+    
+    new = test_client.get(f"/weights/{user_id}")
+    assert new.headers["ETag"] != old.headers["ETag"]
+    assert new.json()[0]["weight"] == 81.0
+    assert test_client.get(f"/weights/{user_id}", headers={"If-None-Match": new.headers["ETag"]}).status_code == 304
+    assert test_client.get(f"/weights/{user_id}").json() == new.json()
+
+def test_lttb_keeps_extremes():
+    """Test dat LTTB de eerste, laatste en uitschietende punten behoudt."""
+    x = np.arange(100, dtype=float)
+    y = np.zeros(100)
+    y[37] = 10.0
+    selected = lttb_indices(x, y, 10)
+    assert len(selected) == 10
+    assert selected[0] == 0 and selected[-1] == 99
+    assert 37 in selected
+    assert list(selected) == sorted(selected)
+
+# Connection pool tests
+def test_connection_pool_reuses_wal_connections(tmp_path):
+    """Test dat de pool verbindingen hergebruikt en in WAL modus opent."""
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=2, timeout=0.1)
+    conn = pool.acquire()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    pool.release(conn)
+    
+    assert pool.acquire() is conn
+    other = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    pool.release(conn)
+    pool.release(other)
+    
+    stats = pool.stats()
+    assert stats["open"] == 2
+    assert stats["in_use"] == 0
+    assert stats["waits"] == 1
+    pool.close()
+
+def test_run_db_uses_executor_thread():
+    """Test dat database functies niet op de event loop thread draaien."""
+    async def current_thread_name():
+        return await run_db(lambda: threading.current_thread().name)
+    
+    assert asyncio.run(current_thread_name()).startswith("rmw-db")
+
+# Schema tests
+def test_weight_queries_use_index(test_db):
+    """Test dat de gewichtsgeschiedenis via de index wordt opgehaald."""
+    assert check_query_plans(test_db) == []
+
+def test_migrations_add_weight_index():
+    """Test dat migraties de index toevoegen aan een bestaande database zonder index."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE weights (id INTEGER PRIMARY KEY, user_id INTEGER, weight REAL, goal_weight REAL, date TEXT)")
+    assert check_query_plans(conn) != []
+    
+    assert migrate_db(conn) == len(MIGRATIONS)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert check_query_plans(conn) == []
+    # Tweede keer is een no-op
+    assert migrate_db(conn) == len(MIGRATIONS)
+    conn.close()
+
+def test_metrics(test_client, test_weight, tmp_path):
+    """Test dat /metrics route latentie, SQL duur en poolgegevens exporteert."""
+    pool = ConnectionPool(str(tmp_path / "metrics.db"), size=1)
+    conn = pool.acquire()
+    conn.execute("CREATE TABLE weights (id INTEGER PRIMARY KEY, weight REAL)")
+    conn.execute("SELECT id FROM weights WHERE id = ?", (1,)).fetchall()
+    pool.release(conn)
+    pool.close()
+    
+    test_client.get(f"/api/weights/{test_weight['user_id']}")
+    body = test_client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/weights/{user_id}",status="200"}' in body
+    assert 'sql_statement_duration_seconds_count{statement="SELECT weights"}' in body
+    assert 'db_operation_duration_seconds_count{operation="db_get_weights"}' in body
+    assert "db_pool_in_use" in body
+
+def test_statement_label():
+    """Test de korte labels voor SQL statements in de metrics."""
+    assert statement_label("SELECT id FROM users WHERE id = ?") == "SELECT users"
+    assert statement_label("INSERT INTO weights (user_id) VALUES (?)") == "INSERT weights"
+    assert statement_label("UPDATE profiles SET age = ? WHERE user_id = ?") == "UPDATE profiles"
+    assert statement_label("WITH recent AS (SELECT id FROM weights) SELECT * FROM recent") == "SELECT weights"
+    assert statement_label("PRAGMA journal_mode=WAL") == "PRAGMA"
+
+def test_tracing_server_timing(test_client, test_weight):
+    """Test dat het trace ID wordt overgenomen en Server-Timing de database operatie toont."""
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    response = test_client.get(f"/api/weights/{test_weight['user_id']}", headers={"X-Request-ID": trace_id})
+    assert response.headers["X-Request-ID"] == trace_id
+    timing = response.headers["Server-Timing"]
+    assert 'db;dur=' in timing and 'desc="db_get_weights"' in timing
+    assert timing.split(", ")[-1].startswith("total;dur=")
+
+def test_tracing_sql_spans_join_request(tmp_path):
+    """Test dat SQL spans uit de executor thread onder de database operatie van het verzoek vallen."""
+    pool = ConnectionPool(str(tmp_path / "trace.db"), size=1)
+    conn = pool.acquire()
+    trace = main.Trace()
+    token = main.current_trace.set(trace)
+    try:
+        asyncio.run(run_db(lambda: conn.execute("SELECT 1").fetchone()))
+    finally:
+        main.current_trace.reset(token)
+        pool.release(conn)
+        pool.close()
+    
+    sql, operation = trace.spans
+    assert (sql["name"], sql["description"]) == ("sql", "SELECT")
+    assert (operation["name"], operation["description"]) == ("db", "<lambda>")
+    assert sql["parent_id"] == operation["span_id"]
+
+def test_span_export_errors_are_logged(caplog):
+    """Test dat een mislukte export via de logger gemeld wordt en de export thread blijft draaien."""
+    class FailingExporter(main.SpanExporter):
+        def export(self, trace):
+            raise OSError("collector niet bereikbaar")
+    
+    exporter = main.BackgroundSpanExporter(FailingExporter())
+    with caplog.at_level("WARNING", logger="rmw.database"):
+        exporter.export(main.Trace())
+        exporter.export(main.Trace())
+        deadline = time.time() + 5
+        while len(caplog.records) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+    assert [record.getMessage() for record in caplog.records] == ["Error exporting spans: collector niet bereikbaar"] * 2
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: rows per second for POST /api/weights/bulk
+
+Runs the app in-process against a temporary database and imports --rows
+generated weights, once as a JSON array and once as an NDJSON stream, and
+compares that with the single-row POST /api/weights endpoint. Results are
+printed as JSON.
+
+    python benchmark_bulk_import.py --rows 200000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import httpx
+
+import main
+
+def generate_rows(count, users):
+    rng = random.Random(1)
+    return [
+        {"user_id": rng.randint(1, users), "weight": round(rng.uniform(50, 120), 1), "goal_weight": 75.0,
+         "date": f"2020-01-01 00:{n % 60:02d}:00"}
+        for n in range(count)
+    ]
+
+async def import_rows(client, rows, ndjson):
+    """Send all rows in one bulk request and return (rows per second, response)"""
+    if ndjson:
+        body = "\n".join(json.dumps(row) for row in rows).encode()
+        headers = {"Content-Type": "application/x-ndjson"}
+    else:
+        body = json.dumps(rows).encode()
+        headers = {"Content-Type": "application/json"}
+    start = time.perf_counter()
+    response = await client.post("/api/weights/bulk", content=body, headers=headers)
+    elapsed = time.perf_counter() - start
+    return len(rows) / elapsed, response.json()
+
+async def insert_single(client, rows):
+    """Send the rows one by one to POST /api/weights and return rows per second"""
+    start = time.perf_counter()
+    for row in rows:
+        await client.post("/api/weights", json=row)
+    return len(rows) / (time.perf_counter() - start)
+
+async def run(rows, single_rows):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://rmw", timeout=None) as client:
+        json_rps, json_result = await import_rows(client, rows, ndjson=False)
+        ndjson_rps, ndjson_result = await import_rows(client, rows, ndjson=True)
+        single_rps = await insert_single(client, rows[:single_rows])
+    return {
+        "rows": len(rows),
+        "json_array_rows_per_second": round(json_rps),
+        "ndjson_rows_per_second": round(ndjson_rps),
+        "single_insert_rows_per_second": round(single_rps),
+        "failed": json_result["failed"] + ndjson_result["failed"]
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--single-rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "RMW.db")
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "RMW.sql")) as f:
+            conn.executescript(f.read())
+        conn.close()
+        main.db_pool = main.ConnectionPool(path)
+
+        result = asyncio.run(run(generate_rows(args.rows, args.users), args.single_rows))
+        main.db_pool.close()
+
+    print(json.dumps(result, indent=2))
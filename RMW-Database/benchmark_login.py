@@ -0,0 +1,123 @@
+"""
+Benchmark: login latency under concurrent load, with and without the password pool
+
+Runs the app in-process against a temporary database and sends --logins
+logins from --concurrency clients while --readers clients each read a
+weight history every --read-interval seconds. Each mode is timed separately:
+
+  inline  PASSWORD_WORKERS=0, scrypt runs on the event loop
+  pool    PASSWORD_WORKERS=--workers, scrypt runs in the worker processes
+
+With inline hashing every login blocks the loop for the whole hash, so the
+reads wait behind it; the pool keeps the loop free. Results are printed as JSON.
+
+    python benchmark_login.py --logins 200 --concurrency 16 --readers 4 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import httpx
+
+import main
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"count": 0}
+    return {
+        "count": len(latencies),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000, 1)
+    }
+
+async def run_mode(workers, users, logins, concurrency, readers, read_interval):
+    main.PASSWORD_WORKERS = workers
+    transport = httpx.ASGITransport(app=main.app)
+    login_latencies, read_latencies = [], []
+    remaining = iter(range(logins))
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://rmw", timeout=None) as client:
+        # Start the worker processes before timing
+        await client.post("/login", json={"username": users[0], "password": "benchmark"})
+
+        async def login_client():
+            for n in remaining:
+                start = time.perf_counter()
+                response = await client.post("/login", json={"username": users[n % len(users)], "password": "benchmark"})
+                login_latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        async def read_client():
+            while not done.is_set():
+                start = time.perf_counter()
+                response = await client.get("/weights/1", params={"limit": 30})
+                read_latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+                await asyncio.sleep(read_interval)
+
+        start = time.perf_counter()
+        reading = [asyncio.create_task(read_client()) for _ in range(readers)]
+        await asyncio.gather(*(login_client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*reading)
+
+    if main.password_executor is not None:
+        main.password_executor.shutdown()
+        main.password_executor = None
+    return {
+        "logins_per_second": round(logins / elapsed, 1),
+        "login": percentiles(login_latencies),
+        "read_during_logins": percentiles(read_latencies)
+    }
+
+def seed(path, users):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "RMW.sql")) as f:
+        conn.executescript(f.read())
+    # One hash for every user keeps seeding fast; each login still verifies it in full
+    password_hash = main.hash_password("benchmark", *main.password_params())
+    conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)", ((user, password_hash) for user in users))
+    conn.executemany(
+        "INSERT INTO weights (user_id, weight, goal_weight, date) VALUES (1, ?, 75.0, ?)",
+        ((80 + day / 10, f"2024-{1 + day // 28:02d}-{1 + day % 28:02d} 08:00:00") for day in range(300))
+    )
+    conn.commit()
+    conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent login clients")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent clients reading weights meanwhile")
+    parser.add_argument("--read-interval", type=float, default=0.05, help="seconds between the reads of one reader")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="password worker processes for the pool mode")
+    args = parser.parse_args()
+
+    users = [f"bench_{n}" for n in range(args.users)]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "RMW.db")
+        seed(path, users)
+        main.db_pool = main.ConnectionPool(path)
+        for mode, workers in (("inline", 0), ("pool", args.workers)):
+            results[mode] = asyncio.run(run_mode(
+                workers, users, args.logins, args.concurrency, args.readers, args.read_interval
+            ))
+        main.db_pool.close()
+
+    print(json.dumps({
+        "scrypt": {"n": main.PASSWORD_SCRYPT_N, "r": main.PASSWORD_SCRYPT_R, "p": main.PASSWORD_SCRYPT_P},
+        "workers": args.workers,
+        "cpus": os.cpu_count(),
+        **results
+    }, indent=2))
@@ -0,0 +1,113 @@
+"""
+Benchmark: serializing large weight histories
+
+Measures how long GET /api/weights/{user_id} takes for a user with --rows
+weights, and how long rendering those rows to JSON takes on its own, for:
+
+  validated  rows go through the response_model and the standard JSONResponse
+  stdlib     trusted rows rendered by FastJSONResponse with the json module
+  orjson     trusted rows rendered by FastJSONResponse with orjson
+
+Runs the app in-process against a temporary database. Results are printed as JSON.
+
+    python benchmark_serialization.py --rows 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from typing import List
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+import main
+
+MODES = {
+    "validated": {"TRUSTED_ROWS": False, "JSON_ENCODER": "json"},
+    "stdlib": {"TRUSTED_ROWS": True, "JSON_ENCODER": "json"},
+    "orjson": {"TRUSTED_ROWS": True, "JSON_ENCODER": "orjson"}
+}
+
+def render_validated(rows, adapter):
+    """What FastAPI does with a response_model: validate, dump, encode, render"""
+    models = adapter.validate_python(rows)
+    return JSONResponse(jsonable_encoder(adapter.dump_python(models, exclude_unset=True))).body
+
+def best_of(func, repeat):
+    """Fastest of `repeat` runs in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 2)
+
+def serialize_only(rows, repeat):
+    adapter = TypeAdapter(List[main.WeightFieldsResponse])
+    results = {"validated": best_of(lambda: render_validated(rows, adapter), repeat)}
+    for mode in ("stdlib", "orjson"):
+        main.JSON_ENCODER = MODES[mode]["JSON_ENCODER"]
+        results[mode] = best_of(lambda: main.FastJSONResponse(rows).body, repeat)
+    return results
+
+async def request_times(user_id, repeat):
+    transport = httpx.ASGITransport(app=main.app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://rmw", timeout=None) as client:
+        for mode, settings in MODES.items():
+            for name, value in settings.items():
+                setattr(main, name, value)
+            await client.get(f"/api/weights/{user_id}")
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                response = await client.get(f"/api/weights/{user_id}")
+                best = min(best, time.perf_counter() - start)
+                assert response.status_code == 200
+            results[mode] = round(best * 1000, 2)
+    return results
+
+def seed(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "RMW.sql")) as f:
+        conn.executescript(f.read())
+    conn.executemany(
+        "INSERT INTO weights (user_id, weight, goal_weight, date) VALUES (1, ?, 75.0, ?)",
+        ((80 + (n % 100) / 10, f"20{10 + n // 100000:02d}-01-01 {n % 100000:06d}") for n in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "RMW.db")
+        seed(path, args.rows)
+        main.db_pool = main.ConnectionPool(path)
+
+        conn = main.db_pool.acquire()
+        rows, _ = main.db_get_weights(conn, 1)
+        main.db_pool.release(conn)
+        serialize = serialize_only(rows, args.repeat)
+        request = asyncio.run(request_times(1, args.repeat))
+        main.db_pool.close()
+
+    print(json.dumps({
+        "rows": args.rows,
+        "orjson_installed": main.orjson is not None,
+        "serialize_ms": serialize,
+        "request_ms": request,
+        "serialize_speedup": {mode: round(serialize["validated"] / serialize[mode], 1) for mode in ("stdlib", "orjson")},
+        "request_speedup": {mode: round(request["validated"] / request[mode], 1) for mode in ("stdlib", "orjson")}
+    }, indent=2))
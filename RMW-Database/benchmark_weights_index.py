@@ -0,0 +1,82 @@
+"""
+Benchmark: weight history queries on a large weights table, with and without the index
+
+Fills a temporary database with --rows weight rows spread over --users users,
+then times the history and latest-weight queries for random users before and
+after applying the schema migrations. Results are printed as JSON.
+
+    python benchmark_weights_index.py --rows 2000000 --users 20000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from main import LATEST_WEIGHT_SQL, WEIGHT_HISTORY_SQL, check_query_plans, migrate_db
+
+def fill_database(conn, rows, users):
+    """Insert rows weight measurements with increasing dates for random users"""
+    conn.execute(
+        "CREATE TABLE weights (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, "
+        "weight REAL NOT NULL, goal_weight REAL NOT NULL, date TEXT DEFAULT CURRENT_TIMESTAMP)"
+    )
+    rng = random.Random(42)
+    batch = 100000
+    for start in range(0, rows, batch):
+        conn.executemany(
+            "INSERT INTO weights (user_id, weight, goal_weight, date) VALUES (?, ?, ?, datetime('2015-01-01', ? || ' minutes'))",
+            [(rng.randint(1, users), rng.uniform(50, 120), 75.0, n) for n in range(start, min(start + batch, rows))]
+        )
+    conn.commit()
+
+def time_query(conn, sql, users, samples):
+    """Run sql for random users and return latency percentiles in milliseconds"""
+    rng = random.Random(7)
+    latencies = []
+    for _ in range(samples):
+        user_id = rng.randint(1, users)
+        start = time.perf_counter()
+        conn.execute(sql, (user_id,)).fetchall()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3)
+    }
+
+def measure(conn, users, samples):
+    return {
+        "plan_problems": [detail for _, detail in check_query_plans(conn)],
+        "history": time_query(conn, WEIGHT_HISTORY_SQL, users, samples),
+        "latest": time_query(conn, LATEST_WEIGHT_SQL, users, samples)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        fill_database(conn, args.rows, args.users)
+
+        before = measure(conn, args.users, args.samples)
+        start = time.perf_counter()
+        migrate_db(conn)
+        migration_seconds = time.perf_counter() - start
+        after = measure(conn, args.users, args.samples * 20)
+        conn.close()
+
+    print(json.dumps({
+        "rows": args.rows,
+        "users": args.users,
+        "migration_seconds": round(migration_seconds, 2),
+        "without_index": before,
+        "with_index": after
+    }, indent=2))
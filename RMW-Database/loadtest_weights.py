@@ -0,0 +1,108 @@
+"""
+Load test: concurrent /api/weights reads while writers wait on the database lock
+
+Runs the app in-process against a temporary database. A separate connection
+holds the SQLite write lock for --lock-seconds, so every POST /api/weights has
+to wait for it. Meanwhile readers keep calling GET /api/weights/{user_id}.
+When blocking SQLite calls run on the event loop the readers queue behind the
+waiting writers; with the database executor they are answered right away.
+
+    python loadtest_weights.py --readers 50 --writers 4 --lock-seconds 1
+
+Results are printed as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+import httpx
+
+import main
+
+def setup_database(path):
+    """Create the schema and seed users in a fresh database file"""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "RMW.sql")) as f:
+        conn.executescript(f.read())
+    conn.close()
+
+def hold_write_lock(path, seconds, locked):
+    """Take the write lock from another connection and keep it for a while"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    locked.set()
+    time.sleep(seconds)
+    conn.execute("COMMIT")
+    conn.close()
+
+async def timed(client, method, url, delay=0.0, **kwargs):
+    """
+    Send one request after `delay` seconds and time it from its scheduled start
+
+    Measuring from the scheduled start (not from when the event loop got
+    around to sending it) counts the time a request spent stuck behind a
+    blocked event loop.
+    """
+    scheduled = time.perf_counter() + delay
+    if delay:
+        await asyncio.sleep(delay)
+    response = await client.request(method, url, **kwargs)
+    return time.perf_counter() - scheduled, response.status_code
+
+async def run(readers, writers):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://rmw") as client:
+        write_tasks = [
+            asyncio.create_task(timed(client, "POST", "/api/weights",
+                                      json={"user_id": 2, "weight": 84.0, "goal_weight": 78}))
+            for _ in range(writers)
+        ]
+        # Readers are scheduled just after the writers reached the locked database
+        reads = await asyncio.gather(*(timed(client, "GET", "/api/weights/2", delay=0.05) for _ in range(readers)))
+        writes = await asyncio.gather(*write_tasks)
+    return reads, writes
+
+def summarize(samples):
+    latencies = sorted(latency for latency, _ in samples)
+    return {
+        "count": len(latencies),
+        "errors": sum(1 for _, status in samples if status >= 400),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, default=50)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--lock-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "RMW.db")
+        setup_database(path)
+        main.db_pool = main.ConnectionPool(path)
+
+        locked = threading.Event()
+        locker = threading.Thread(target=hold_write_lock, args=(path, args.lock_seconds, locked))
+        locker.start()
+        locked.wait()
+
+        reads, writes = asyncio.run(run(args.readers, args.writers))
+        locker.join()
+        main.db_pool.close()
+
+    print(json.dumps({
+        "lock_seconds": args.lock_seconds,
+        "db_workers": main.DB_WORKERS,
+        "reads": summarize(reads),
+        "writes": summarize(writes)
+    }, indent=2))
@@ -1,22 +1,602 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Callable, List, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
+import asyncio
+import base64
+import contextlib
+import contextvars
 import sqlite3
+import hashlib
+import hmac
+import secrets
+import threading
+import queue
+import json
+import logging
+import multiprocessing
 import os
+import re
+import time
+import urllib.request
+from functools import lru_cache
+import numpy as np
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 app = FastAPI()
 
+logger = logging.getLogger("rmw.database")
+
 # Ensure the database directory exists
 os.makedirs("db", exist_ok=True)
 
-# Initialize the database
-def get_db():
-    conn = sqlite3.connect("db/RMW.db", check_same_thread=False)
+# Prometheus metrics, scraped from /metrics
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests currently being handled", ["method"])
+SQL_LATENCY = Histogram(
+    "sql_statement_duration_seconds", "Time spent executing SQL statements", ["statement"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+DB_OPERATION_LATENCY = Histogram(
+    "db_operation_duration_seconds", "Time a data access function spends on the database executor", ["operation"]
+)
+PASSWORD_LATENCY = Histogram(
+    "password_hash_duration_seconds", "Time to hash or verify a password, including the wait for a worker", ["operation"]
+)
+
+@lru_cache(maxsize=256)
+def statement_label(sql):
+    """Short label for a SQL statement: its verb and first table, e.g. 'SELECT weights'"""
+    words = sql.split()
+    verb = words[0].upper() if words else ""
+    if verb == "WITH":
+        verb = "SELECT"
+    match = re.search(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", sql, re.IGNORECASE)
+    return f"{verb} {match.group(1)}" if match else verb
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection that records how long each statement takes to execute"""
+    def execute(self, sql, parameters=()):
+        label = statement_label(sql)
+        start = time.perf_counter()
+        try:
+            with span("sql", label):
+                return super().execute(sql, parameters)
+        finally:
+            SQL_LATENCY.labels(label).observe(time.perf_counter() - start)
+    
+    def executemany(self, sql, parameters):
+        label = statement_label(sql)
+        start = time.perf_counter()
+        try:
+            with span("sql", label):
+                return super().executemany(sql, parameters)
+        finally:
+            SQL_LATENCY.labels(label).observe(time.perf_counter() - start)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request and label it with the route template instead of the raw path"""
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    in_progress = REQUESTS_IN_PROGRESS.labels(request.method)
+    in_progress.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_progress.dec()
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(request.method, route.path if route else "other", str(status)).observe(
+            time.perf_counter() - start
+        )
+
+# Tracing: requests continue the trace of the caller (W3C traceparent or
+# X-Request-ID) and their spans go to a pluggable exporter. This code is the
+# same in RMW-Backend, RMW-Database and RMW-Frontend; change all three together.
+SERVICE_NAME = "rmw-database"
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "http://otel-collector:4318/v1/traces")
+# Most spans listed in the Server-Timing header
+SERVER_TIMING_MAX_ENTRIES = 32
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+current_span = contextvars.ContextVar("current_span", default=None)
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+class Trace:
+    """Spans of one request in this service"""
+    def __init__(self, trace_id=None, parent_id=None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.parent_id = parent_id
+        self.spans = []
+
+def trace_from_headers(headers):
+    """Continue the trace from a traceparent or X-Request-ID header, or start a new one"""
+    match = TRACEPARENT_PATTERN.match(headers.get("traceparent", ""))
+    if match:
+        return Trace(match.group(1), match.group(2))
+    request_id = headers.get("x-request-id", "").lower()
+    return Trace(request_id if re.fullmatch(r"[0-9a-f]{32}", request_id) else None)
+
+@contextlib.contextmanager
+def span(name, description="", kind="internal", **attributes):
+    """
+    Record the duration of a block as a span of the current request
+    
+    Args:
+        name: Short name, also the metric name in Server-Timing (e.g. "sql")
+        description: Details such as the route or statement
+        kind: OTLP span kind, "internal", "server" or "client"
+        **attributes: Extra attributes for the exporter
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = current_span.get()
+    record = {
+        "name": name,
+        "description": description,
+        "span_id": secrets.token_hex(8),
+        "parent_id": parent["span_id"] if parent else trace.parent_id,
+        "kind": kind,
+        "start_ns": time.time_ns(),
+        "attributes": attributes
+    }
+    token = current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration"] = time.perf_counter() - start
+        current_span.reset(token)
+        trace.spans.append(record)
+
+def server_timing(trace):
+    """Build the Server-Timing header from the spans, the request span is "total" """
+    entries = []
+    for record in trace.spans[-SERVER_TIMING_MAX_ENTRIES:]:
+        entry = f"{record['name']};dur={record['duration'] * 1000:.1f}"
+        if record["description"]:
+            entry += ';desc="' + record["description"].replace('"', "'") + '"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+def otlp_payload(trace):
+    """Convert the spans of a trace to an OTLP/HTTP JSON export request"""
+    spans = []
+    for record in trace.spans:
+        attributes = {"description": record["description"], **record["attributes"]}
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": record["span_id"],
+            "parentSpanId": record["parent_id"] or "",
+            "name": f"{record['name']} {record['description']}".strip(),
+            "kind": SPAN_KINDS[record["kind"]],
+            "startTimeUnixNano": str(record["start_ns"]),
+            "endTimeUnixNano": str(record["start_ns"] + int(record["duration"] * 1e9)),
+            "attributes": [{"key": key, "value": {"stringValue": str(value)}} for key, value in attributes.items()]
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": spans}]
+    }]}
+
+class SpanExporter:
+    """Base exporter that receives the trace of every finished request and drops it"""
+    def export(self, trace):
+        pass
+
+class FileSpanExporter(SpanExporter):
+    """Append every trace as an OTLP JSON line to a file, for local testing"""
+    def __init__(self, path):
+        self.path = path
+    
+    def export(self, trace):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(otlp_payload(trace)) + "\n")
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """Send traces to an OTLP/HTTP endpoint such as an OpenTelemetry Collector"""
+    def __init__(self, endpoint, timeout=5):
+        self.endpoint = endpoint
+        self.timeout = timeout
+    
+    def export(self, trace):
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(otlp_payload(trace)).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        urllib.request.urlopen(request, timeout=self.timeout).close()
+
+class BackgroundSpanExporter(SpanExporter):
+    """Hand traces to another exporter on a background thread so requests never wait on export I/O"""
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self.queue = queue.SimpleQueue()
+        threading.Thread(target=self._run, name="span-exporter", daemon=True).start()
+    
+    def export(self, trace):
+        self.queue.put(trace)
+    
+    def _run(self):
+        while True:
+            trace = self.queue.get()
+            try:
+                self.exporter.export(trace)
+            except Exception as e:
+                logger.warning("Error exporting spans: %s", e)
+
+def create_span_exporter(kind=TRACE_EXPORTER):
+    """Create the exporter selected by TRACE_EXPORTER: "none", "file" or "otlp" """
+    if kind == "file":
+        return BackgroundSpanExporter(FileSpanExporter(TRACE_FILE))
+    if kind == "otlp":
+        return BackgroundSpanExporter(OTLPHttpSpanExporter(TRACE_OTLP_ENDPOINT))
+    return SpanExporter()
+
+span_exporter = create_span_exporter()
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Continue the caller's trace and report this service's timing breakdown in Server-Timing"""
+    trace = trace_from_headers(request.headers)
+    token = current_trace.set(trace)
+    try:
+        with span("total", f"{request.method} {request.url.path}", kind="server"):
+            response = await call_next(request)
+    finally:
+        current_trace.reset(token)
+    response.headers["X-Request-ID"] = trace.trace_id
+    response.headers["Server-Timing"] = server_timing(trace)
+    span_exporter.export(trace)
+    return response
+
+# Database file and connection pool settings
+DB_PATH = os.environ.get("DB_PATH", "db/RMW.db")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", str(128 * 1024 * 1024)))
+# Number of threads that run blocking SQLite calls off the event loop
+DB_WORKERS = int(os.environ.get("DB_WORKERS", str(DB_POOL_SIZE)))
+
+def open_connection(path=DB_PATH):
+    """
+    Open a SQLite connection tuned for concurrent access
+    
+    WAL lets readers run next to a writer, synchronous=NORMAL is safe in WAL
+    mode, and the busy timeout makes writers wait for the lock instead of failing.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=DB_BUSY_TIMEOUT_MS / 1000, factory=TimedConnection)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    return conn
+
+class ConnectionPool:
+    """
+    Bounded pool of reusable SQLite connections
+    
+    Connections are opened lazily up to `size` and used by one thread at a
+    time. When all of them are checked out, acquire() waits up to `timeout`
+    seconds and then raises TimeoutError.
+    """
+    def __init__(self, path=DB_PATH, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+    
+    def acquire(self):
+        """Check out a connection, opening a new one if none is idle"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                raise TimeoutError("Timed out waiting for a database connection")
+        
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = open_connection(self.path)
+            except Exception:
+                self._slots.release()
+                raise
+            with self._lock:
+                self._created += 1
+        
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+        return conn
+    
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any unfinished transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+        self._slots.release()
+    
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+    
+    def stats(self):
+        """Return pool size and usage counters"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": self._created - self._in_use,
+                "acquired": self._acquired,
+                "waits": self._waits
+            }
+
+db_pool = ConnectionPool()
+
+class PoolCollector:
+    """Export the connection pool counters of the current db_pool on every scrape"""
+    def collect(self):
+        stats = db_pool.stats()
+        for key in ("size", "open", "in_use", "idle", "acquired", "waits"):
+            yield GaugeMetricFamily(f"db_pool_{key}", f"Connection pool {key.replace('_', ' ')}", value=stats[key])
+
+REGISTRY.register(PoolCollector())
+
+# Hand out a pooled connection per request
+def get_db():
+    try:
+        conn = db_pool.acquire()
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     try:
         yield conn
     finally:
-        conn.close()
+        db_pool.release(conn)
+
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="rmw-db")
+
+async def run_db(func, *args):
+    """
+    Run a blocking data access function on the database executor
+    
+    Keeps sqlite3 calls off the event loop so one slow query or a writer
+    waiting on the database lock does not stall every other request.
+    """
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        with span("db", func.__name__):
+            # Run in a copy of the request context so SQL spans join the request's trace
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(db_executor, context.run, func, *args)
+    finally:
+        DB_OPERATION_LATENCY.labels(func.__name__).observe(time.perf_counter() - start)
+
+# Hand out a way to check connections out per query instead of one per request
+def get_db_connector():
+    return contextlib.contextmanager(get_db)
+
+async def run_db_pooled(connect, func, *args):
+    """
+    Like run_db, but checks a connection out for this call only
+    
+    For handlers that wait on something else between queries, such as password
+    hashing, so they do not keep a pooled connection from other requests.
+    
+    Args:
+        connect: Context manager factory from the get_db_connector dependency
+    """
+    def call():
+        with connect() as db:
+            return func(db, *args)
+    call.__name__ = func.__name__
+    return await run_db(call)
+
+# Per-user read cache settings; 0 entries disables the cache
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "4096"))
+
+# Cached read kinds each write makes stale
+CACHE_INVALIDATIONS = {
+    "weights": ("weights", "latest", "series", "bundle"),
+    "profile": ("profile", "bundle")
+}
+
+class UserReadCache:
+    """
+    Bounded LRU cache of per-user read results, invalidated by that user's writes
+    
+    Entries are keyed by (user_id, kind, arguments) and indexed per
+    (user_id, kind), so a write drops exactly the reads it makes stale. Every
+    entry holds the user_versions value that was read before its data, and
+    every write records the version that last changed each kind. An entry is
+    only served to a request at the same or a later version with no change to
+    its kind since the entry's version, so a read that raced a write can never
+    serve old data under the new ETag. Writes invalidate inside their
+    transaction, before the new version is visible. The service runs as a
+    single process, so the cache sees every write.
+    """
+    def __init__(self, maxsize=USER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.index = {}
+        self.changed = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, key, version):
+        """Return (True, value) for a key that is still current at this user version, (False, None) otherwise"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.changed.get(key[:2], 0) <= entry[0] <= version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            self.misses += 1
+            return False, None
+    
+    def set(self, key, value, version):
+        """Store value read at `version`, unless a write changed it since or a newer version is cached"""
+        if self.maxsize <= 0:
+            return
+        user_id, kind = key[0], key[1]
+        with self.lock:
+            entry = self.entries.get(key)
+            if self.changed.get((user_id, kind), 0) > version or (entry is not None and entry[0] > version):
+                return
+            self.entries[key] = (version, value)
+            self.entries.move_to_end(key)
+            self.index.setdefault((user_id, kind), set()).add(key)
+            while len(self.entries) > self.maxsize:
+                old_key, _ = self.entries.popitem(last=False)
+                self._unindex(old_key)
+                self.evictions += 1
+    
+    def invalidate(self, user_id, write, version):
+        """Drop the user's cached reads that a write of kind `write` ("weights" or "profile") at `version` changes"""
+        with self.lock:
+            for kind in CACHE_INVALIDATIONS[write]:
+                self.changed[(user_id, kind)] = max(self.changed.get((user_id, kind), 0), version)
+                for key in self.index.pop((user_id, kind), ()):
+                    del self.entries[key]
+                    self.invalidations += 1
+    
+    def _unindex(self, key):
+        keys = self.index.get((key[0], key[1]))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.index[(key[0], key[1])]
+    
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        with self.lock:
+            self.entries.clear()
+            self.index.clear()
+            self.changed.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+    
+    def stats(self):
+        """Return size and hit/miss/eviction/invalidation counters"""
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "users": len({user_id for user_id, _ in self.index}),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+user_cache = UserReadCache()
+
+async def run_cached(kind, version, func, db, user_id, *args):
+    """
+    Serve a per-user read from user_cache, running func(db, user_id, *args) on a miss
+    
+    `version` is the user's version from check_user_etag, read before the data.
+    Errors such as a 404 are not cached.
+    """
+    key = (user_id, kind, tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args))
+    found, value = user_cache.get(key, version)
+    if found:
+        return value
+    value = await run_db(func, db, user_id, *args)
+    user_cache.set(key, value, version)
+    return value
+
+def db_get_user_version(db: sqlite3.Connection, user_id: int):
+    """Version of the user's weights and profile, 0 before the first write"""
+    result = db.execute(USER_VERSION_SQL, (user_id,)).fetchone()
+    if result is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return result[0]
+
+def user_etag(user_id: int, version: int):
+    """Strong ETag for every per-user resource at this version"""
+    return f'"{user_id}.{version}"'
+
+def etag_listed(request: Request, etag):
+    """True when If-None-Match lists etag or *; weak tags compare equal to strong ones"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+async def check_user_etag(request: Request, db: sqlite3.Connection, user_id: int):
+    """
+    Look up the user's ETag before reading a per-user resource
+    
+    The version is read first, so a write that lands during the read can only
+    make the body newer than its ETag, never older. Pass the version on to
+    run_cached, which only serves entries read at that version.
+    
+    Returns:
+        Tuple of (version, ETag, 304 response when If-None-Match already has it, else None)
+    
+    Raises:
+        HTTPException: 404 when the user does not exist, whatever If-None-Match says
+    """
+    version = await run_db(db_get_user_version, db, user_id)
+    etag = user_etag(user_id, version)
+    if etag_listed(request, etag):
+        return version, etag, Response(status_code=304, headers={"ETag": etag})
+    return version, etag, None
+
+class UserCacheCollector:
+    """Export the read cache counters on every scrape"""
+    def collect(self):
+        stats = user_cache.stats()
+        for key in ("size", "users"):
+            yield GaugeMetricFamily(f"user_cache_{key}", f"Read cache {key}", value=stats[key])
+        for key in ("hits", "misses", "evictions", "invalidations"):
+            yield CounterMetricFamily(f"user_cache_{key}", f"Read cache {key}", value=stats[key])
+
+REGISTRY.register(UserCacheCollector())
 
 # Create SQL schema file
 def create_sql_schema():
@@ -53,6 +633,15 @@ def create_sql_schema():
         FOREIGN KEY (user_id) REFERENCES users (id)
     );
 
+    -- Weight history per user, newest first; covers the history queries
+    CREATE INDEX IF NOT EXISTS idx_weights_user_date_id ON weights (user_id, date DESC, id DESC, weight, goal_weight);
+
+    -- Per-user version, bumped with every weight or profile write; used for ETags
+    CREATE TABLE IF NOT EXISTS user_versions (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    
     -- Create a test user if none exist
     INSERT OR IGNORE INTO users (username, password) 
     VALUES ('test', 'password');
@@ -82,12 +671,70 @@ def create_sql_schema():
     with open("RMW.sql", "w") as f:
         f.write(sql_content)
 
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    # 1: composite covering index for the per-user weight history, newest first
+    ["CREATE INDEX IF NOT EXISTS idx_weights_user_date ON weights (user_id, date DESC, weight, goal_weight)"],
+    # 2: add id to the index so (date, id) keyset pagination needs no extra sort
+    ["CREATE INDEX IF NOT EXISTS idx_weights_user_date_id ON weights (user_id, date DESC, id DESC, weight, goal_weight)",
+     "DROP INDEX IF EXISTS idx_weights_user_date"],
+    # 3: per-user version counter for ETags
+    ["CREATE TABLE IF NOT EXISTS user_versions (user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)"],
+]
+
+def migrate_db(conn):
+    """
+    Apply the migrations the database has not seen yet
+    
+    Returns:
+        The schema version after migrating
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        for statement in statements:
+            conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+        print(f"Applied database migration {number}")
+    return max(version, len(MIGRATIONS))
+
+# Hot queries that must be answered from an index, without a table scan or sort
+WEIGHT_HISTORY_SQL = "SELECT id, user_id, weight, goal_weight, date FROM weights WHERE user_id = ? ORDER BY date DESC, id DESC"
+LATEST_WEIGHT_SQL = WEIGHT_HISTORY_SQL + " LIMIT 1"
+WEIGHT_PAGE_SQL = (
+    "SELECT id, user_id, weight, goal_weight, date FROM weights WHERE user_id = ? "
+    "AND date >= ? AND date < ? AND (date, id) < (?, ?) ORDER BY date DESC, id DESC LIMIT ?"
+)
+INDEXED_QUERIES = [WEIGHT_HISTORY_SQL, LATEST_WEIGHT_SQL, WEIGHT_PAGE_SQL]
+
+def check_query_plans(conn):
+    """
+    Check that the hot queries use an index
+    
+    Returns:
+        List of (query, plan detail) tuples for plans that scan the table or
+        need a temporary sort; empty when all queries are indexed
+    """
+    problems = []
+    for sql in INDEXED_QUERIES:
+        params = (0,) * sql.count("?")
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall():
+            detail = row[3]
+            if detail.startswith("SCAN") or "TEMP B-TREE" in detail:
+                problems.append((sql, detail))
+    return problems
+
 # Initialize database with schema if it doesn't exist
 def init_db():
-    conn = sqlite3.connect("db/RMW.db", check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     try:
+        # WAL is persistent, set it before any pooled connection holds a lock
+        conn.execute("PRAGMA journal_mode=WAL")
         with open("RMW.sql") as f:
             conn.executescript(f.read())
+        migrate_db(conn)
+        for sql, detail in check_query_plans(conn):
+            print(f"Warning: query is not using an index ({detail}): {sql}")
     except Exception as e:
         print(f"Error initializing database: {str(e)}")
     finally:
@@ -100,7 +747,7 @@ async def startup_event():
     init_db()
     
     # Create a test user if none exist
-    conn = sqlite3.connect("db/RMW.db", check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     cursor = conn.cursor()
     
     try:
@@ -127,6 +774,123 @@ async def startup_event():
     finally:
         conn.close()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    global password_executor
+    db_pool.close()
+    if password_executor is not None:
+        password_executor.shutdown()
+        password_executor = None
+
+# JSON rendering: orjson when it is installed and JSON_ENCODER=orjson, otherwise the standard library
+JSON_ENCODER = os.environ.get("JSON_ENCODER", "orjson").lower()
+# Rows read straight from SQLite already have the response types, so they can skip response_model validation
+TRUSTED_ROWS = os.environ.get("TRUSTED_ROWS", "true").lower() in ("1", "true", "yes")
+
+def dumps_json(content):
+    """Render plain JSON types (dict, list, str, int, float, bool, None) to bytes"""
+    if orjson is not None and JSON_ENCODER == "orjson":
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps_json instead of the standard encoder"""
+    def render(self, content):
+        return dumps_json(content)
+
+def trusted_response(content, headers=None):
+    """
+    Send data read from SQLite without validating it against the response_model again
+    
+    The SELECTs name exactly the columns of the response models and the
+    column types match the model fields, so validation would only copy the
+    rows. With TRUSTED_ROWS off the data goes through the response_model as usual.
+    """
+    if TRUSTED_ROWS:
+        return FastJSONResponse(content, headers=headers)
+    return content
+
+# Password hashing: salted scrypt, which is memory-hard, in the format
+# scrypt$<n>$<r>$<p>$<salt>$<hash>. Raising the cost parameters rehashes each
+# password at its next login; so does a plaintext password from before hashing.
+PASSWORD_SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", str(2 ** 14)))
+PASSWORD_SCRYPT_R = int(os.environ.get("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.environ.get("PASSWORD_SCRYPT_P", "1"))
+# Worker processes for hashing, so a login does not block the event loop; 0 hashes on the event loop
+PASSWORD_WORKERS = int(os.environ.get("PASSWORD_WORKERS", str(os.cpu_count() or 1)))
+
+def b64encode(data: bytes):
+    return base64.b64encode(data).decode().rstrip("=")
+
+def b64decode(text: str):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+def scrypt(password: str, salt: bytes, n: int, r: int, p: int):
+    # scrypt needs about 128 * r * (n + p) bytes; leave room above OpenSSL's 32 MiB default
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=129 * r * (n + p) + (1 << 20), dklen=32)
+
+def hash_password(password: str, n: int, r: int, p: int):
+    """Salted scrypt hash of a password, runs in a password worker process"""
+    salt = secrets.token_bytes(16)
+    return f"scrypt${n}${r}${p}${b64encode(salt)}${b64encode(scrypt(password, salt, n, r, p))}"
+
+def verify_password(password: str, stored: str, n: int, r: int, p: int):
+    """
+    Check a password against a stored hash, runs in a password worker process
+    
+    Args:
+        password: Password from the login request
+        stored: The users.password column, a scrypt hash or a legacy plaintext password
+        n, r, p: The current cost parameters
+    
+    Returns:
+        Tuple of (password matches, stored value should be replaced by a new hash);
+        a scrypt hash that can't be parsed matches nothing
+    """
+    if not stored.startswith("scrypt$"):
+        matches = hmac.compare_digest(stored.encode(), password.encode())
+        return matches, matches
+    try:
+        _, stored_n, stored_r, stored_p, salt, digest = stored.split("$")
+        params = (int(stored_n), int(stored_r), int(stored_p))
+        expected = b64decode(digest)
+        actual = scrypt(password, b64decode(salt), *params)
+    except (ValueError, TypeError):
+        return False, False
+    matches = hmac.compare_digest(actual, expected)
+    return matches, matches and params != (n, r, p)
+
+def password_params():
+    return PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P
+
+def unknown_user_hash():
+    """A hash at the current cost that matches nothing, so unknown usernames take as long as wrong passwords"""
+    return f"scrypt${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}${'A' * 22}${'A' * 43}"
+
+password_executor = None
+
+def get_password_executor():
+    """The password worker pool, started on first use"""
+    global password_executor
+    if password_executor is None:
+        # Forking this process would copy the locks held by the database threads; forkserver
+        # workers start from a clean single-threaded server process instead
+        password_executor = ProcessPoolExecutor(
+            max_workers=PASSWORD_WORKERS, mp_context=multiprocessing.get_context("forkserver")
+        )
+    return password_executor
+
+async def run_password(func, *args):
+    """Run hash_password or verify_password in the worker pool, or inline when PASSWORD_WORKERS is 0"""
+    start = time.perf_counter()
+    try:
+        with span("password", func.__name__):
+            if PASSWORD_WORKERS <= 0:
+                return func(*args)
+            return await asyncio.get_running_loop().run_in_executor(get_password_executor(), func, *args)
+    finally:
+        PASSWORD_LATENCY.labels(func.__name__).observe(time.perf_counter() - start)
+
 # Models
 class User(BaseModel):
     username: str
@@ -164,13 +928,154 @@ class WeightResponse(BaseModel):
     goal_weight: float
     date: str
 
-# User endpoints with original paths
-@app.post("/users", response_model=UserResponse)
-async def create_user(user: User, db: sqlite3.Connection = Depends(get_db)):
+class BulkWeightError(BaseModel):
+    index: int
+    detail: str
+
+class BulkWeightResponse(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkWeightError]
+
+# Weight inserts, a missing date falls back to the current timestamp
+WEIGHT_INSERT_SQL = "INSERT INTO weights (user_id, weight, goal_weight, date) VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))"
+# Per-user version counter, bumped in the same transaction as every weight or profile write
+USER_VERSION_SQL = (
+    "SELECT COALESCE(v.version, 0) FROM users u LEFT JOIN user_versions v ON v.user_id = u.id WHERE u.id = ?"
+)
+BUMP_USER_VERSION_SQL = (
+    "INSERT INTO user_versions (user_id, version) VALUES (?, 1) "
+    "ON CONFLICT (user_id) DO UPDATE SET version = version + 1"
+)
+# Rows per transaction for bulk imports
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", "10000"))
+
+# Weight row with only the fields requested through ?fields=
+class WeightFieldsResponse(BaseModel):
+    id: Optional[int] = None
+    user_id: Optional[int] = None
+    weight: Optional[float] = None
+    goal_weight: Optional[float] = None
+    date: Optional[str] = None
+
+# Weight history pagination
+WEIGHT_FIELDS = ["id", "user_id", "weight", "goal_weight", "date"]
+WEIGHTS_MAX_LIMIT = int(os.environ.get("WEIGHTS_MAX_LIMIT", "1000"))
+# Sorts after every date string, used when no upper bound or cursor is given
+MAX_DATE = "\uffff"
+
+# Downsampled weight series for charts
+SERIES_BUCKETS = {"day": "%Y-%m-%d", "week": "%Y-%W", "month": "%Y-%m"}
+SERIES_MAX_POINTS = int(os.environ.get("SERIES_MAX_POINTS", "2000"))
+WEIGHT_SERIES_SQL = (
+    "SELECT date, weight, weight AS min, weight AS max, 1 AS count, goal_weight, julianday(date) AS x "
+    "FROM weights WHERE user_id = ? AND date >= ? AND date < ? ORDER BY date, id"
+)
+WEIGHT_SERIES_BUCKET_SQL = (
+    "SELECT MIN(date) AS date, AVG(weight) AS weight, MIN(weight) AS min, MAX(weight) AS max, "
+    "COUNT(*) AS count, AVG(goal_weight) AS goal_weight, AVG(julianday(date)) AS x "
+    "FROM weights WHERE user_id = ? AND date >= ? AND date < ? GROUP BY strftime(?, date) ORDER BY MIN(date)"
+)
+
+class WeightSeriesPoint(BaseModel):
+    date: str
+    weight: float
+    min: float
+    max: float
+    count: int
+    goal_weight: float
+
+class WeightSeriesResponse(BaseModel):
+    user_id: int
+    bucket: Optional[str]
+    points: List[WeightSeriesPoint]
+
+# Everything the dashboard needs in one query: the user, the profile and the
+# last N weights. The outer sort only covers the N materialized weight rows.
+USER_BUNDLE_SQL = (
+    "WITH recent AS ("
+    "SELECT id, user_id, weight, goal_weight, date FROM weights WHERE user_id = ?1 "
+    "ORDER BY date DESC, id DESC LIMIT ?2) "
+    "SELECT u.id AS user_id, u.username, p.id AS profile_id, p.gender, p.height, p.age, p.activity_level, "
+    "w.id AS weight_id, w.weight, w.goal_weight, w.date "
+    "FROM users u LEFT JOIN profiles p ON p.user_id = u.id LEFT JOIN recent w "
+    "WHERE u.id = ?1 ORDER BY w.date DESC, w.id DESC"
+)
+BUNDLE_DEFAULT_LIMIT = int(os.environ.get("BUNDLE_DEFAULT_LIMIT", "90"))
+
+class UserBundleResponse(BaseModel):
+    user: UserResponse
+    profile: Optional[ProfileResponse]
+    latest_weight: Optional[WeightResponse]
+    weights: List[WeightFieldsResponse]
+    series: Optional[WeightSeriesResponse] = None
+
+def lttb_indices(x, y, threshold):
+    """
+    Pick `threshold` points that keep the visual shape of a series (Largest-Triangle-Three-Buckets)
+    
+    Args:
+        x: Sorted x values as a NumPy array
+        y: y values as a NumPy array
+        threshold: Number of points to keep
+    
+    Returns:
+        NumPy array with the indices of the selected points, in order
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold <= 2:
+        return np.array([0, n - 1][:max(threshold, 0)], dtype=int)
+    
+    # First and last point are always kept, the rest is split into buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_stop = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_stop = n - 1, n
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+        # Keep the point that forms the largest triangle with the previous pick and the next bucket
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+def parse_cursor(before: Optional[str]):
+    """Split a "<date>,<id>" keyset cursor into a (date, id) tuple"""
+    if before is None:
+        return None
+    date, _, weight_id = before.rpartition(",")
+    if not date or not weight_id.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor, expected '<date>,<id>'")
+    return date, int(weight_id)
+
+def parse_fields(fields: Optional[str]):
+    """Validate a comma separated ?fields= projection"""
+    if fields is None:
+        return None
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in WEIGHT_FIELDS]
+    if not selected or unknown:
+        raise HTTPException(status_code=400, detail=f"Invalid fields, choose from: {', '.join(WEIGHT_FIELDS)}")
+    return selected
+
+# Data access functions, these run on the database executor
+def db_create_user(db: sqlite3.Connection, user: User, password_hash: str):
     try:
         cursor = db.execute(
             "INSERT INTO users (username, password) VALUES (?, ?)",
-            (user.username, user.password)
+            (user.username, password_hash)
         )
         db.commit()
         user_id = cursor.lastrowid
@@ -179,8 +1084,7 @@ async def create_user(user: User, db: sqlite3.Connection = Depends(get_db)):
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="Username already exists")
 
-@app.get("/users/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: sqlite3.Connection = Depends(get_db)):
+def db_get_user(db: sqlite3.Connection, user_id: int):
     result = db.execute("SELECT id, username FROM users WHERE id = ?", (user_id,)).fetchone()
     
     if result is None:
@@ -188,21 +1092,22 @@ async def get_user(user_id: int, db: sqlite3.Connection = Depends(get_db)):
     
     return dict(result)
 
-@app.post("/login")
-async def login(user: User, db: sqlite3.Connection = Depends(get_db)):
-    result = db.execute(
-        "SELECT id, username FROM users WHERE username = ? AND password = ?",
-        (user.username, user.password)
-    ).fetchone()
-    
-    if result is None:
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-    
-    return dict(result)
+def db_get_credentials(db: sqlite3.Connection, username: str):
+    """id, username and stored password of a user, or None"""
+    result = db.execute("SELECT id, username, password FROM users WHERE username = ?", (username,)).fetchone()
+    return dict(result) if result else None
 
-# Profile endpoints
-@app.post("/profiles", response_model=ProfileResponse)
-async def create_profile(profile: Profile, db: sqlite3.Connection = Depends(get_db)):
+def db_update_password(db: sqlite3.Connection, user_id: int, old: str, new: str):
+    """Replace a stored password unless it changed since it was read"""
+    db.execute("UPDATE users SET password = ? WHERE id = ? AND password = ?", (new, user_id, old))
+    db.commit()
+
+def bump_user_version(db: sqlite3.Connection, user_id: int):
+    """Bump the user's version in the current transaction and return the new value"""
+    return db.execute(BUMP_USER_VERSION_SQL + " RETURNING version", (user_id,)).fetchone()[0]
+
+def db_create_profile(db: sqlite3.Connection, profile: Profile):
+    """Create or update a profile; returns (profile, new user version)"""
     # Verify user exists
     user = db.execute("SELECT id FROM users WHERE id = ?", (profile.user_id,)).fetchone()
     if user is None:
@@ -218,61 +1123,53 @@ async def create_profile(profile: Profile, db: sqlite3.Connection = Depends(get_
                 "UPDATE profiles SET gender = ?, height = ?, age = ?, activity_level = ? WHERE user_id = ?",
                 (profile.gender, profile.height, profile.age, profile.activity_level, profile.user_id)
             )
+            version = bump_user_version(db, profile.user_id)
+            user_cache.invalidate(profile.user_id, "profile", version)
             db.commit()
             result = db.execute("SELECT * FROM profiles WHERE user_id = ?", (profile.user_id,)).fetchone()
-            return dict(result)
+            return dict(result), version
         else:
             # Create new profile
             cursor = db.execute(
                 "INSERT INTO profiles (user_id, gender, height, age, activity_level) VALUES (?, ?, ?, ?, ?)",
                 (profile.user_id, profile.gender, profile.height, profile.age, profile.activity_level)
             )
+            version = bump_user_version(db, profile.user_id)
+            user_cache.invalidate(profile.user_id, "profile", version)
             db.commit()
             profile_id = cursor.lastrowid
             
             result = db.execute("SELECT * FROM profiles WHERE id = ?", (profile_id,)).fetchone()
-            return dict(result)
+            return dict(result), version
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="Profile already exists for this user")
 
-@app.get("/profiles/{user_id}", response_model=ProfileResponse)
-async def get_profile(user_id: int, db: sqlite3.Connection = Depends(get_db)):
-    result = db.execute("SELECT * FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+def db_get_profile(db: sqlite3.Connection, user_id: int):
+    result = db.execute(
+        "SELECT id, user_id, gender, height, age, activity_level FROM profiles WHERE user_id = ?", (user_id,)
+    ).fetchone()
     
     if result is None:
         raise HTTPException(status_code=404, detail="Profile not found")
     
     return dict(result)
 
-# Weight endpoints with original paths
-@app.post("/weights", response_model=WeightResponse)
-async def create_weight(weight: Weight, db: sqlite3.Connection = Depends(get_db)):
+def db_create_weight(db: sqlite3.Connection, weight: Weight):
+    """Insert a weight; returns (weight record, new user version)"""
     # Verify user exists
     user = db.execute("SELECT id FROM users WHERE id = ?", (weight.user_id,)).fetchone()
     if user is None:
         raise HTTPException(status_code=404, detail=f"User with ID {weight.user_id} not found")
     
-    # Insert weight
+    # Insert weight and get the inserted record back in the same statement
     try:
-        if weight.date:
-            cursor = db.execute(
-                "INSERT INTO weights (user_id, weight, goal_weight, date) VALUES (?, ?, ?, ?)",
-                (weight.user_id, weight.weight, weight.goal_weight, weight.date)
-            )
-        else:
-            cursor = db.execute(
-                "INSERT INTO weights (user_id, weight, goal_weight) VALUES (?, ?, ?)",
-                (weight.user_id, weight.weight, weight.goal_weight)
-            )
-        
-        db.commit()
-        weight_id = cursor.lastrowid
-        
-        # Get the inserted record
         result = db.execute(
-            "SELECT id, user_id, weight, goal_weight, date FROM weights WHERE id = ?", 
-            (weight_id,)
+            WEIGHT_INSERT_SQL + " RETURNING id, user_id, weight, goal_weight, date",
+            (weight.user_id, weight.weight, weight.goal_weight, weight.date or None)
         ).fetchone()
+        version = bump_user_version(db, weight.user_id)
+        user_cache.invalidate(weight.user_id, "weights", version)
+        db.commit()
         
         if result is None:
             raise HTTPException(
@@ -280,7 +1177,7 @@ async def create_weight(weight: Weight, db: sqlite3.Connection = Depends(get_db)
                 detail="Weight record was created but could not be retrieved"
             )
         
-        return dict(result)
+        return dict(result), version
     except sqlite3.Error as e:
         db.rollback()
         raise HTTPException(
@@ -294,70 +1191,517 @@ async def create_weight(weight: Weight, db: sqlite3.Connection = Depends(get_db)
             detail=f"Error creating weight record: {str(e)}"
         )
 
-@app.get("/weights/{user_id}", response_model=List[WeightResponse])
-async def get_weights(user_id: int, db: sqlite3.Connection = Depends(get_db)):
+def db_insert_weights(db: sqlite3.Connection, rows):
+    """
+    Insert a chunk of validated weights in one transaction
+    
+    Args:
+        rows: List of (index in the import, parse_bulk_weight() parameters) tuples
+    
+    Returns:
+        Tuple of (number of inserted rows, list of per-row errors)
+    """
+    user_ids = list({weight[0] for _, weight in rows})
+    existing = set()
+    # Stay well below SQLite's limit on bound parameters
+    for start in range(0, len(user_ids), 500):
+        batch = user_ids[start:start + 500]
+        placeholders = ",".join("?" * len(batch))
+        existing.update(row[0] for row in db.execute(f"SELECT id FROM users WHERE id IN ({placeholders})", batch))
+    
+    errors = []
+    params = []
+    for index, weight in rows:
+        if weight[0] not in existing:
+            errors.append({"index": index, "detail": f"User with ID {weight[0]} not found"})
+            continue
+        params.append(weight)
+    
+    updated_users = {weight[0] for weight in params}
+    try:
+        with db:
+            db.executemany(WEIGHT_INSERT_SQL, params)
+            for user_id in updated_users:
+                user_cache.invalidate(user_id, "weights", bump_user_version(db, user_id))
+    except sqlite3.Error as e:
+        failed = {error["index"] for error in errors}
+        errors.extend(
+            {"index": index, "detail": f"Database error: {str(e)}"}
+            for index, _ in rows if index not in failed
+        )
+        return 0, errors
+    return len(params), errors
+
+def db_get_weights(db: sqlite3.Connection, user_id: int, limit: Optional[int] = None, before=None,
+                   since: Optional[str] = None, until: Optional[str] = None, fields: Optional[List[str]] = None):
+    """
+    Get a user's weights, newest first
+    
+    Without paging arguments the full history is returned. Otherwise one page
+    of at most `limit` rows is read with a (date, id) keyset cursor and an
+    optional [since, until) date range.
+    
+    Returns:
+        Tuple of (rows, cursor for the next page or None)
+    """
     # Verify user exists
     user = db.execute("SELECT id FROM users WHERE id = ?", (user_id,)).fetchone()
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Get weights
-    results = db.execute(
-        "SELECT id, user_id, weight, goal_weight, date FROM weights WHERE user_id = ? ORDER BY date DESC",
-        (user_id,)
-    ).fetchall()
+    next_cursor = None
+    if limit is None and before is None and since is None and until is None:
+        results = db.execute(WEIGHT_HISTORY_SQL, (user_id,)).fetchall()
+    else:
+        page_size = limit or WEIGHTS_MAX_LIMIT
+        before_date, before_id = before or (MAX_DATE, 0)
+        # Read one extra row to find out whether there is a next page
+        results = db.execute(
+            WEIGHT_PAGE_SQL,
+            (user_id, since or "", until or MAX_DATE, before_date, before_id, page_size + 1)
+        ).fetchall()
+        if len(results) > page_size:
+            results = results[:page_size]
+            next_cursor = f"{results[-1]['date']},{results[-1]['id']}"
     
-    return [dict(result) for result in results]
+    if fields:
+        return [{field: result[field] for field in fields} for result in results], next_cursor
+    return [dict(result) for result in results], next_cursor
 
-@app.get("/weights/{user_id}/latest", response_model=WeightResponse)
-async def get_latest_weight(user_id: int, db: sqlite3.Connection = Depends(get_db)):
+def db_get_weight_series(db: sqlite3.Connection, user_id: int, points: int, bucket: Optional[str] = None,
+                         since: Optional[str] = None, until: Optional[str] = None):
+    """
+    Get a user's weight series, oldest first, reduced to at most `points` points
+    
+    Measurements are first aggregated per day, week or month in SQL (avg, min
+    and max), then LTTB picks the points that best keep the shape of the trend.
+    """
+    # Verify user exists
+    user = db.execute("SELECT id FROM users WHERE id = ?", (user_id,)).fetchone()
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    return query_weight_series(db, user_id, points, bucket, since, until)
+
+def query_weight_series(db: sqlite3.Connection, user_id: int, points: int, bucket: Optional[str] = None,
+                        since: Optional[str] = None, until: Optional[str] = None):
+    """Build the weight series of db_get_weight_series() for a user known to exist"""
+    bounds = (since or "", until or MAX_DATE)
+    if bucket:
+        results = db.execute(WEIGHT_SERIES_BUCKET_SQL, (user_id, *bounds, SERIES_BUCKETS[bucket])).fetchall()
+    else:
+        results = db.execute(WEIGHT_SERIES_SQL, (user_id, *bounds)).fetchall()
+    
+    if len(results) > points:
+        x = np.array([result["x"] for result in results], dtype=float)
+        y = np.array([result["weight"] for result in results], dtype=float)
+        results = [results[index] for index in lttb_indices(x, y, points).tolist()]
+    
+    return {
+        "user_id": user_id,
+        "bucket": bucket,
+        "points": [
+            {
+                "date": result["date"],
+                "weight": round(result["weight"], 2),
+                "min": result["min"],
+                "max": result["max"],
+                "count": result["count"],
+                "goal_weight": round(result["goal_weight"], 2)
+            }
+            for result in results
+        ]
+    }
+
+def db_get_latest_weight(db: sqlite3.Connection, user_id: int):
     # Verify user exists
     user = db.execute("SELECT id FROM users WHERE id = ?", (user_id,)).fetchone()
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get latest weight
-    result = db.execute(
-        "SELECT id, user_id, weight, goal_weight, date FROM weights WHERE user_id = ? ORDER BY date DESC LIMIT 1",
-        (user_id,)
-    ).fetchone()
+    result = db.execute(LATEST_WEIGHT_SQL, (user_id,)).fetchone()
     
     if result is None:
         raise HTTPException(status_code=404, detail="No weight records found for this user")
     
     return dict(result)
 
+def db_get_user_bundle(db: sqlite3.Connection, user_id: int, limit: int = BUNDLE_DEFAULT_LIMIT,
+                       fields: Optional[List[str]] = None, points: Optional[int] = None, bucket: Optional[str] = None):
+    """
+    Get the user, profile, latest weight and last `limit` weights from one query
+    
+    The query returns one row per weight (or a single row without weights),
+    each carrying the user and profile columns. With `points` the downsampled
+    weight series is added from the same connection.
+    """
+    results = db.execute(USER_BUNDLE_SQL, (user_id, limit)).fetchall()
+    if not results:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    first = results[0]
+    profile = None
+    if first["profile_id"] is not None:
+        profile = {
+            "id": first["profile_id"],
+            "user_id": first["user_id"],
+            "gender": first["gender"],
+            "height": first["height"],
+            "age": first["age"],
+            "activity_level": first["activity_level"]
+        }
+    weights = [
+        {
+            "id": result["weight_id"],
+            "user_id": result["user_id"],
+            "weight": result["weight"],
+            "goal_weight": result["goal_weight"],
+            "date": result["date"]
+        }
+        for result in results if result["weight_id"] is not None
+    ]
+    
+    bundle = {
+        "user": {"id": first["user_id"], "username": first["username"]},
+        "profile": profile,
+        "latest_weight": weights[0] if weights else None,
+        "weights": [{field: weight[field] for field in fields} for weight in weights] if fields else weights
+    }
+    if points:
+        bundle["series"] = query_weight_series(db, user_id, points, bucket)
+    return bundle
+
+# User endpoints with original paths
+@app.post("/users", response_model=UserResponse)
+async def create_user(user: User, connect: Callable = Depends(get_db_connector)):
+    password_hash = await run_password(hash_password, user.password, *password_params())
+    return await run_db_pooled(connect, db_create_user, user, password_hash)
+
+@app.get("/users/{user_id}", response_model=UserResponse)
+async def get_user(user_id: int, request: Request, response: Response, db: sqlite3.Connection = Depends(get_db)):
+    version, etag, not_modified = await check_user_etag(request, db, user_id)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    return trusted_response(await run_cached("user", version, db_get_user, db, user_id), {"ETag": etag})
+
+@app.post("/login")
+async def login(user: User, connect: Callable = Depends(get_db_connector)):
+    # No connection is held while the password is verified
+    credentials = await run_db_pooled(connect, db_get_credentials, user.username)
+    stored = credentials["password"] if credentials else unknown_user_hash()
+    matches, rehash = await run_password(verify_password, user.password, stored, *password_params())
+    if credentials is None or not matches:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    # Lazy migration: plaintext passwords and hashes at an old cost are replaced on login
+    if rehash:
+        new_hash = await run_password(hash_password, user.password, *password_params())
+        await run_db_pooled(connect, db_update_password, credentials["id"], stored, new_hash)
+    return {"id": credentials["id"], "username": credentials["username"]}
+
+@app.get("/users/{user_id}/bundle", response_model=UserBundleResponse, response_model_exclude_unset=True)
+async def get_user_bundle(
+    user_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(BUNDLE_DEFAULT_LIMIT, ge=1, le=WEIGHTS_MAX_LIMIT, description="Number of most recent weights"),
+    fields: Optional[str] = Query(None, description="Comma separated weight fields to return"),
+    points: Optional[int] = Query(None, ge=2, le=SERIES_MAX_POINTS, description="Include a weight series of at most this many points"),
+    bucket: Optional[str] = Query(None, pattern="^(day|week|month)$", description="Aggregate the series per day, week or month"),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    version, etag, not_modified = await check_user_etag(request, db, user_id)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    bundle = await run_cached("bundle", version, db_get_user_bundle, db, user_id, limit, parse_fields(fields), points, bucket)
+    return trusted_response(bundle, {"ETag": etag})
+
+# Profile endpoints
+@app.post("/profiles", response_model=ProfileResponse)
+async def create_profile(profile: Profile, response: Response, db: sqlite3.Connection = Depends(get_db)):
+    result, version = await run_db(db_create_profile, db, profile)
+    # The user's new ETag, so clients can revalidate their copies against it
+    response.headers["ETag"] = user_etag(profile.user_id, version)
+    return result
+
+@app.get("/profiles/{user_id}", response_model=ProfileResponse)
+async def get_profile(user_id: int, request: Request, response: Response, db: sqlite3.Connection = Depends(get_db)):
+    version, etag, not_modified = await check_user_etag(request, db, user_id)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    return trusted_response(await run_cached("profile", version, db_get_profile, db, user_id), {"ETag": etag})
+
+# Weight endpoints with original paths
+@app.post("/weights", response_model=WeightResponse)
+async def create_weight(weight: Weight, response: Response, db: sqlite3.Connection = Depends(get_db)):
+    result, version = await run_db(db_create_weight, db, weight)
+    response.headers["ETag"] = user_etag(weight.user_id, version)
+    return result
+
+async def iter_bulk_rows(request: Request):
+    """
+    Yield (index, parsed row or error message) from a bulk import body
+    
+    NDJSON bodies (application/x-ndjson) are parsed line by line while they
+    stream in, anything else is read as one JSON array.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        index = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            lines = buffer.split(b"\n")
+            buffer = lines.pop()
+            # Every line is parsed on its own, so a line with a stray comma or bracket
+            # cannot move rows into its neighbours
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    yield index, json.loads(line)
+                except ValueError as e:
+                    yield index, f"Invalid JSON: {str(e)}"
+                index += 1
+        if buffer.strip():
+            try:
+                yield index, json.loads(buffer)
+            except ValueError as e:
+                yield index, f"Invalid JSON: {str(e)}"
+    else:
+        try:
+            rows = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of weights")
+        for index, row in enumerate(rows):
+            yield index, row
+
+def parse_bulk_weight(row):
+    """
+    Turn one imported row into (user_id, weight, goal_weight, date) insert parameters
+    
+    Rows that already have the right JSON types skip model validation; anything
+    else goes through the Weight model so coercion and error messages match
+    POST /weights.
+    
+    Raises:
+        ValueError: with a readable message when the row is invalid
+    """
+    if type(row) is dict:
+        user_id = row.get("user_id")
+        weight = row.get("weight")
+        goal_weight = row.get("goal_weight")
+        date = row.get("date")
+        if (type(user_id) is int and type(weight) in (float, int) and type(goal_weight) in (float, int)
+                and (date is None or type(date) is str) and len(row) == 3 + ("date" in row)):
+            return (user_id, float(weight), float(goal_weight), date or None)
+    try:
+        weight = Weight.model_validate(row)
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in e.errors()
+        ))
+    return (weight.user_id, weight.weight, weight.goal_weight, weight.date or None)
+
+@app.post("/weights/bulk", response_model=BulkWeightResponse)
+async def create_weights_bulk(request: Request, db: sqlite3.Connection = Depends(get_db)):
+    """
+    Import many weights from a JSON array or an NDJSON stream
+    
+    Valid rows are inserted in transactions of BULK_CHUNK_SIZE rows. Rows that
+    fail validation or reference an unknown user are reported by their index
+    and do not stop the import. The next chunk is parsed while the previous
+    one is written on the database executor.
+    """
+    inserted = 0
+    errors = []
+    chunk = []
+    pending = None
+    
+    async def finish(task):
+        nonlocal inserted
+        count, chunk_errors = await task
+        inserted += count
+        errors.extend(chunk_errors)
+    
+    try:
+        async for index, row in iter_bulk_rows(request):
+            if isinstance(row, str):
+                errors.append({"index": index, "detail": row})
+                continue
+            try:
+                chunk.append((index, parse_bulk_weight(row)))
+            except ValueError as e:
+                errors.append({"index": index, "detail": str(e)})
+                continue
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                # The connection is only used for one chunk at a time
+                if pending is not None:
+                    await finish(pending)
+                pending = asyncio.ensure_future(run_db(db_insert_weights, db, chunk))
+                chunk = []
+    finally:
+        # When the stream or parser fails, the insert still running on the executor must
+        # finish before get_db releases the connection to the next request
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+    if pending is not None:
+        await finish(pending)
+    if chunk:
+        await finish(run_db(db_insert_weights, db, chunk))
+    
+    errors.sort(key=lambda error: error["index"])
+    return {"inserted": inserted, "failed": len(errors), "errors": errors}
+
+@app.get("/weights/{user_id}", response_model=List[WeightFieldsResponse], response_model_exclude_unset=True)
+async def get_weights(
+    user_id: int,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=WEIGHTS_MAX_LIMIT),
+    before: Optional[str] = Query(None, description="Keyset cursor '<date>,<id>' from X-Next-Before"),
+    since: Optional[str] = Query(None, description="Only weights on or after this date"),
+    until: Optional[str] = Query(None, description="Only weights before this date"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    cursor, selected = parse_cursor(before), parse_fields(fields)
+    version, etag, not_modified = await check_user_etag(request, db, user_id)
+    if not_modified:
+        return not_modified
+    weights, next_cursor = await run_cached("weights", version, db_get_weights, db, user_id, limit, cursor, since, until, selected)
+    headers = {"ETag": etag}
+    if next_cursor:
+        headers["X-Next-Before"] = next_cursor
+    response.headers.update(headers)
+    return trusted_response(weights, headers)
+
+@app.get("/weights/{user_id}/series", response_model=WeightSeriesResponse)
+async def get_weight_series(
+    user_id: int,
+    request: Request,
+    response: Response,
+    points: int = Query(200, ge=2, le=SERIES_MAX_POINTS, description="Maximum number of points"),
+    bucket: Optional[str] = Query(None, pattern="^(day|week|month)$", description="Aggregate per day, week or month"),
+    since: Optional[str] = Query(None, description="Only weights on or after this date"),
+    until: Optional[str] = Query(None, description="Only weights before this date"),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    version, etag, not_modified = await check_user_etag(request, db, user_id)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    series = await run_cached("series", version, db_get_weight_series, db, user_id, points, bucket, since, until)
+    return trusted_response(series, {"ETag": etag})
+
+@app.get("/weights/{user_id}/latest", response_model=WeightResponse)
+async def get_latest_weight(user_id: int, request: Request, response: Response, db: sqlite3.Connection = Depends(get_db)):
+    version, etag, not_modified = await check_user_etag(request, db, user_id)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
+    return trusted_response(await run_cached("latest", version, db_get_latest_weight, db, user_id), {"ETag": etag})
+
 # User endpoints with /api/ prefix to match the frontend
 @app.post("/api/users", response_model=UserResponse)
-async def create_user_api(user: User, db: sqlite3.Connection = Depends(get_db)):
-    return await create_user(user, db)
+async def create_user_api(user: User, connect: Callable = Depends(get_db_connector)):
+    return await create_user(user, connect)
 
 @app.get("/api/users/{user_id}", response_model=UserResponse)
-async def get_user_api(user_id: int, db: sqlite3.Connection = Depends(get_db)):
-    return await get_user(user_id, db)
+async def get_user_api(user_id: int, request: Request, response: Response, db: sqlite3.Connection = Depends(get_db)):
+    return await get_user(user_id, request, response, db)
+
+@app.get("/api/users/{user_id}/bundle", response_model=UserBundleResponse, response_model_exclude_unset=True)
+async def get_user_bundle_api(
+    user_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(BUNDLE_DEFAULT_LIMIT, ge=1, le=WEIGHTS_MAX_LIMIT, description="Number of most recent weights"),
+    fields: Optional[str] = Query(None, description="Comma separated weight fields to return"),
+    points: Optional[int] = Query(None, ge=2, le=SERIES_MAX_POINTS, description="Include a weight series of at most this many points"),
+    bucket: Optional[str] = Query(None, pattern="^(day|week|month)$", description="Aggregate the series per day, week or month"),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    return await get_user_bundle(user_id, request, response, limit, fields, points, bucket, db)
 
 @app.post("/api/login")
-async def login_api(user: User, db: sqlite3.Connection = Depends(get_db)):
-    return await login(user, db)
+async def login_api(user: User, connect: Callable = Depends(get_db_connector)):
+    return await login(user, connect)
 
 # Profile endpoints with /api/ prefix
 @app.post("/api/profiles", response_model=ProfileResponse)
-async def create_profile_api(profile: Profile, db: sqlite3.Connection = Depends(get_db)):
-    return await create_profile(profile, db)
+async def create_profile_api(profile: Profile, response: Response, db: sqlite3.Connection = Depends(get_db)):
+    return await create_profile(profile, response, db)
 
 @app.get("/api/profiles/{user_id}", response_model=ProfileResponse)
-async def get_profile_api(user_id: int, db: sqlite3.Connection = Depends(get_db)):
-    return await get_profile(user_id, db)
+async def get_profile_api(user_id: int, request: Request, response: Response, db: sqlite3.Connection = Depends(get_db)):
+    return await get_profile(user_id, request, response, db)
 
 # Weight endpoints with /api/ prefix to match the frontend
 @app.post("/api/weights", response_model=WeightResponse)
-async def create_weight_api(weight: Weight, db: sqlite3.Connection = Depends(get_db)):
-    return await create_weight(weight, db)
+async def create_weight_api(weight: Weight, response: Response, db: sqlite3.Connection = Depends(get_db)):
+    return await create_weight(weight, response, db)
+
+@app.post("/api/weights/bulk", response_model=BulkWeightResponse)
+async def create_weights_bulk_api(request: Request, db: sqlite3.Connection = Depends(get_db)):
+    return await create_weights_bulk(request, db)
 
-@app.get("/api/weights/{user_id}", response_model=List[WeightResponse])
-async def get_weights_api(user_id: int, db: sqlite3.Connection = Depends(get_db)):
-    return await get_weights(user_id, db)
+@app.get("/api/weights/{user_id}", response_model=List[WeightFieldsResponse], response_model_exclude_unset=True)
+async def get_weights_api(
+    user_id: int,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=WEIGHTS_MAX_LIMIT),
+    before: Optional[str] = Query(None, description="Keyset cursor '<date>,<id>' from X-Next-Before"),
+    since: Optional[str] = Query(None, description="Only weights on or after this date"),
+    until: Optional[str] = Query(None, description="Only weights before this date"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    return await get_weights(user_id, request, response, limit, before, since, until, fields, db)
+
+@app.get("/api/weights/{user_id}/series", response_model=WeightSeriesResponse)
+async def get_weight_series_api(
+    user_id: int,
+    request: Request,
+    response: Response,
+    points: int = Query(200, ge=2, le=SERIES_MAX_POINTS, description="Maximum number of points"),
+    bucket: Optional[str] = Query(None, pattern="^(day|week|month)$", description="Aggregate per day, week or month"),
+    since: Optional[str] = Query(None, description="Only weights on or after this date"),
+    until: Optional[str] = Query(None, description="Only weights before this date"),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    return await get_weight_series(user_id, request, response, points, bucket, since, until, db)
 
 @app.get("/api/weights/{user_id}/latest", response_model=WeightResponse)
-async def get_latest_weight_api(user_id: int, db: sqlite3.Connection = Depends(get_db)):
-    return await get_latest_weight(user_id, db)
\ No newline at end of file
+async def get_latest_weight_api(user_id: int, request: Request, response: Response, db: sqlite3.Connection = Depends(get_db)):
+    return await get_latest_weight(user_id, request, response, db)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Expose the metrics in the Prometheus text format"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# Read cache statistics
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return user_cache.stats()
+
+@app.get("/api/cache/stats")
+async def get_cache_stats_api():
+    return await get_cache_stats()
+
+# Connection pool statistics
+@app.get("/pool/stats")
+async def get_pool_stats():
+    return db_pool.stats()
+
+@app.get("/api/pool/stats")
+async def get_pool_stats_api():
+    return await get_pool_stats()
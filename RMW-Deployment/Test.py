@@ -0,0 +1,227 @@
+import pytest
+import os
+import time
+from fastapi.testclient import TestClient
+import redeploy
+
+FAKE_DOCKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_docker.sh")
+
+@pytest.fixture
+def fake_docker(tmp_path, monkeypatch):
+    """Vervangt de Docker CLI door fake_docker.sh, dat alleen de aanroepen logt."""
+    log = tmp_path / "docker.log"
+    log.write_text("")
+    monkeypatch.setattr(redeploy, "DOCKER_CLI", FAKE_DOCKER)
+    monkeypatch.setenv("FAKE_DOCKER_LOG", str(log))
+    monkeypatch.setenv("FAKE_DOCKER_DELAY", "0")
+    return log
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, fake_docker):
+    """Test client met een eigen jobs database en API key."""
+    monkeypatch.setattr(redeploy, "DEPLOY_API_KEY", "geheim")
+    monkeypatch.setattr(redeploy, "job_store", redeploy.JobStore(str(tmp_path / "jobs" / "jobs.db")))
+    monkeypatch.setattr(redeploy, "jobs", redeploy.OrderedDict())
+    monkeypatch.setattr(redeploy, "service_locks", {})
+    with TestClient(redeploy.app) as client:
+        yield client
+
+def wait_for(client, job_id, timeout=10):
+    """Wacht tot een job klaar is en geeft de status terug."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}", params={"api_key": "geheim"}).json()
+        if job["status"] in ("succeeded", "failed", "interrupted"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} is niet klaar binnen {timeout} seconden")
+
+def test_redeploy_requires_api_key(client):
+    """Test dat een verkeerde API key en een onbekende service worden geweigerd."""
+    assert client.post("/redeploy", params={"api_key": "fout", "service": "frontend"}).status_code == 401
+    assert client.post("/redeploy", params={"api_key": "geheim", "service": "onbekend"}).status_code == 400
+    assert client.get("/jobs/abc", params={"api_key": "geheim"}).status_code == 404
+
+def test_redeploy_runs_in_background(client, monkeypatch):
+    """Test dat een deploy als job op de achtergrond loopt terwijl de service blijft antwoorden."""
+    monkeypatch.setenv("FAKE_DOCKER_DELAY", "0.5")
+    start = time.time()
+    response = client.post("/redeploy", params={"api_key": "geheim", "service": "frontend"})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert client.get("/health").json() == {"status": "ok"}
+    assert time.time() - start < 0.5
+    assert client.get(f"/jobs/{job_id}", params={"api_key": "geheim"}).json()["status"] in ("queued", "running")
+
+    job = wait_for(client, job_id)
+    assert job["status"] == "succeeded"
+    assert "docker pull steelduck1/rmw-frontend:latest" in job["output"]
+    assert "service update --with-registry-auth --image steelduck1/rmw-frontend:latest rmw_rmw_frontend" in job["output"]
+    assert job["output"].endswith("Redeployment triggered for service: frontend")
+    assert client.get("/jobs", params={"api_key": "geheim"}).json()[0]["job_id"] == job_id
+
+def test_redeploys_run_concurrently_per_service(client, monkeypatch, fake_docker):
+    """Test dat verschillende services gelijktijdig deployen en dezelfde service na elkaar."""
+    monkeypatch.setenv("FAKE_DOCKER_DELAY", "0.3")
+    submit = lambda service: client.post("/redeploy", params={"api_key": "geheim", "service": service}).json()["job_id"]
+    first, second, backend = submit("frontend"), submit("frontend"), submit("backend")
+    jobs = {job_id: wait_for(client, job_id) for job_id in (first, second, backend)}
+    assert all(job["status"] == "succeeded" for job in jobs.values())
+
+    # Twee deploys van frontend overlappen niet, backend loopt gelijk op met de eerste
+    assert jobs[second]["started_at"] >= jobs[first]["finished_at"]
+    assert jobs[backend]["started_at"] < jobs[first]["finished_at"]
+    lines = fake_docker.read_text().splitlines()
+    assert sum("rmw-frontend" in line for line in lines) == 8
+
+def test_failed_redeploy_and_streamed_output(client, monkeypatch):
+    """Test dat een falend commando de job laat mislukken en dat de output gestreamd wordt."""
+    monkeypatch.setenv("FAKE_DOCKER_FAIL", "service update")
+    job_id = client.post("/redeploy", params={"api_key": "geheim", "service": "backend"}).json()["job_id"]
+
+    # De stream volgt de job tot die klaar is
+    with client.stream("GET", f"/jobs/{job_id}/output", params={"api_key": "geheim"}) as response:
+        output = "".join(response.iter_text())
+    assert "==> Pulling latest image for backend" in output
+    assert "Error response from daemon" in output
+    assert output.rstrip().endswith("[failed] Updating service rmw_rmw_backend failed with exit code 1")
+
+    job = wait_for(client, job_id)
+    assert job["error"] == "Updating service rmw_rmw_backend failed with exit code 1"
+
+    # Met wait=true geeft een mislukte deploy een 500, een geslaagde het oude antwoord
+    response = client.post("/redeploy", params={"api_key": "geheim", "service": "backend", "wait": True})
+    assert response.status_code == 500 and "Deployment failed" in response.json()["detail"]
+    monkeypatch.delenv("FAKE_DOCKER_FAIL")
+    response = client.post("/redeploy", params={"api_key": "geheim", "service": "backend", "wait": True})
+    assert response.json()["message"] == "Redeployment triggered for service: backend"
+
+def test_jobs_survive_restart(client, monkeypatch):
+    """Test dat jobs bewaard blijven en dat een job die liep tijdens het stoppen als interrupted terugkomt."""
+    done = client.post("/redeploy", params={"api_key": "geheim", "service": "database", "wait": True}).json()["job_id"]
+    monkeypatch.setenv("FAKE_DOCKER_DELAY", "5")
+    running = client.post("/redeploy", params={"api_key": "geheim", "service": "frontend"}).json()["job_id"]
+    time.sleep(0.2)
+
+    # Een herstart: de jobs komen uit SQLite
+    client.__exit__(None, None, None)
+    redeploy.jobs.clear()
+    with TestClient(redeploy.app) as restarted:
+        finished = restarted.get(f"/jobs/{done}", params={"api_key": "geheim"}).json()
+        assert finished["status"] == "succeeded"
+        assert "docker pull steelduck1/rmw-database:latest" in finished["output"]
+        interrupted = restarted.get(f"/jobs/{running}", params={"api_key": "geheim"}).json()
+        assert interrupted["status"] == "interrupted"
+        assert interrupted["finished_at"] is not None
+
+def test_self_deploy_does_not_wait_for_itself():
+    """Test dat de deployment service zijn eigen update niet afwacht, want die stopt deze container."""
+    update = lambda service: redeploy.deploy_steps(service)[-1][1]
+    assert "--detach" in update("deployment")
+    assert "--detach" not in update("frontend")
+
+def test_output_is_written_in_batches(client, monkeypatch):
+    """Test dat de output van een job in een paar transacties wordt opgeslagen in plaats van één per regel."""
+    monkeypatch.setenv("FAKE_DOCKER_LINES", "200")
+    commits = []
+    redeploy.job_store.conn.set_trace_callback(lambda statement: commits.append(statement) if statement == "COMMIT" else None)
+    job = wait_for(client, client.post("/redeploy", params={"api_key": "geheim", "service": "backend"}).json()["job_id"])
+    redeploy.job_store.conn.set_trace_callback(None)
+    
+    assert job["status"] == "succeeded"
+    lines = job["output"].split("\n")
+    assert len(lines) > 400
+    assert len(commits) < 10
+    stored = [line for (line,) in redeploy.job_store.conn.execute(
+        "SELECT line FROM job_output WHERE job_id = ? ORDER BY seq", (job["job_id"],)
+    )]
+    assert stored == lines
+
+def test_release_order():
+    """Test dat een release de afhankelijkheden volgt en cycli en onbekende services weigert."""
+    order = redeploy.release_order(["frontend", "backend", "database", "cadvisor"], redeploy.RELEASE_DEPENDENCIES)
+    assert order.index("database") < order.index("backend") < order.index("frontend")
+    # Afhankelijkheden buiten de release draaien al
+    assert redeploy.release_order(["frontend"], redeploy.RELEASE_DEPENDENCIES) == ["frontend"]
+    with pytest.raises(ValueError, match="cycle"):
+        redeploy.release_order(["frontend", "backend"], {"frontend": ["backend"], "backend": ["frontend"]})
+    with pytest.raises(ValueError, match="Unknown"):
+        redeploy.release_order(["frontend", "bestaat-niet"], {})
+
+def deploy_windows(log):
+    """Begin en eind van elke "service update" per service uit het log van de nep Docker CLI."""
+    names = {config["service_name"]: service for service, config in redeploy.SERVICE_CONFIG.items()}
+    windows = {}
+    for line in log.read_text().splitlines():
+        timestamp, event, command = line.split(" ", 2)
+        if command.startswith("service update"):
+            service = next(names[word] for word in command.split() if word in names)
+            windows.setdefault(service, {})[event] = float(timestamp)
+    return windows
+
+def test_release_runs_in_dependency_order(client, monkeypatch, fake_docker):
+    """Test dat een release onafhankelijke services gelijktijdig deployt, binnen de limiet en in volgorde."""
+    monkeypatch.setenv("FAKE_DOCKER_DELAY", "0.3")
+    response = client.post("/release", params={"api_key": "geheim"}, json={
+        "services": ["frontend", "backend", "database", "prometheus", "grafana", "cadvisor"],
+        "max_parallel": 2
+    })
+    assert response.status_code == 202
+    release = wait_for(client, response.json()["job_id"])
+    assert release["status"] == "succeeded"
+    assert all(service["status"] == "succeeded" for service in release["services"].values())
+    assert release["services"]["frontend"]["depends_on"] == ["backend", "database"]
+    
+    windows = deploy_windows(fake_docker)
+    assert windows["backend"]["start"] >= windows["database"]["end"]
+    assert windows["frontend"]["start"] >= windows["backend"]["end"]
+    assert windows["grafana"]["start"] >= windows["prometheus"]["end"]
+    
+    # Nooit meer dan twee deploys tegelijk, maar wel gelijktijdig
+    events = sorted((time, 1 if event == "start" else -1) for window in windows.values() for event, time in window.items())
+    running, peak = 0, 0
+    for _, change in events:
+        running += change
+        peak = max(peak, running)
+    assert peak == 2
+    
+    # De child jobs staan ook in /jobs
+    child = release["services"]["database"]["job_id"]
+    assert client.get(f"/jobs/{child}", params={"api_key": "geheim"}).json()["service"] == "database"
+
+def test_release_aborts_on_failure(client, monkeypatch):
+    """Test dat een release na een fout geen nieuwe services meer start."""
+    monkeypatch.setenv("FAKE_DOCKER_FAIL", "rmw-database")
+    response = client.post("/release", params={"api_key": "geheim", "wait": True}, json={
+        "services": ["database", "backend", "frontend", "cadvisor"],
+        "depends_on": {"backend": ["database"], "frontend": ["backend"]},
+        "max_parallel": 2
+    })
+    assert response.status_code == 500
+    release = response.json()
+    assert release["status"] == "failed"
+    assert release["error"] == "Release aborted, failed: database"
+    services = release["services"]
+    assert services["database"]["status"] == "failed"
+    assert services["cadvisor"]["status"] == "succeeded"
+    assert services["backend"] == {"depends_on": ["database"], "job_id": None, "status": "skipped"}
+    assert services["frontend"]["status"] == "skipped"
+    assert "backend: skipped" in release["output"]
+    
+    assert client.post("/release", params={"api_key": "geheim"}, json={
+        "services": ["frontend", "backend"], "depends_on": {"frontend": ["backend"], "backend": ["frontend"]}
+    }).status_code == 400
+
+def test_release_max_parallel(client):
+    """Test dat max_parallel 0 of negatief een 400 geeft, en dat de limiet anders gebruikt of begrensd wordt."""
+    for max_parallel in (0, -1):
+        response = client.post("/release", params={"api_key": "geheim"}, json={"services": ["cadvisor"], "max_parallel": max_parallel})
+        assert response.status_code == 400
+        assert "max_parallel" in response.json()["detail"]
+    
+    for requested, used in ((None, redeploy.RELEASE_MAX_PARALLEL), (1, 1), (redeploy.RELEASE_MAX_PARALLEL + 5, redeploy.RELEASE_MAX_PARALLEL)):
+        body = {"services": ["cadvisor"]} if requested is None else {"services": ["cadvisor"], "max_parallel": requested}
+        response = client.post("/release", params={"api_key": "geheim"}, json=body)
+        assert response.status_code == 202
+        assert response.json()["max_parallel"] == used
+        wait_for(client, response.json()["job_id"])
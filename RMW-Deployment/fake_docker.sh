@@ -0,0 +1,18 @@
+#!/bin/sh
+# Stand-in for the Docker CLI, for tests and for trying the redeploy service
+# without a swarm:
+#
+#     DOCKER_CLI=./fake_docker.sh uvicorn redeploy:app --port 8080
+#
+# Every call is printed and, with timestamps, appended to FAKE_DOCKER_LOG.
+# A call takes FAKE_DOCKER_DELAY seconds and fails with exit code 1 when
+# its arguments contain FAKE_DOCKER_FAIL. FAKE_DOCKER_LINES extra lines of
+# progress output are printed, like docker pull does.
+echo "docker $*"
+for n in $(seq 1 "${FAKE_DOCKER_LINES:-0}"); do echo "progress $n"; done
+echo "$(date +%s.%N) start $*" >> "${FAKE_DOCKER_LOG:-/dev/null}"
+sleep "${FAKE_DOCKER_DELAY:-0}"
+echo "$(date +%s.%N) end $*" >> "${FAKE_DOCKER_LOG:-/dev/null}"
+if [ -n "$FAKE_DOCKER_FAIL" ]; then
+    case "$*" in *"$FAKE_DOCKER_FAIL"*) echo "Error response from daemon: $*" >&2; exit 1 ;; esac
+fi
@@ -0,0 +1,354 @@
+"""
+Load test: drive a realistic request mix against the RMW frontend
+
+Starts the Database, Backend and Frontend services locally with uvicorn (or
+targets a running stack with --frontend-url), seeds the database with users,
+profiles and weight histories, and then runs --concurrency virtual users for
+--duration seconds. Every virtual user logs in once and then picks requests
+from the --mix of /login, /dashboard, /entry and /api/calculate.
+
+Throughput, latency percentiles and error rates per request type are written
+as JSON to stdout (or --output). With --baseline the run is compared with an
+earlier result and the exit code is 1 when throughput drops or p95 latency
+grows by more than --max-regression:
+
+    python loadtest.py --users 50 --concurrency 32 --duration 60 --output run.json
+    python loadtest.py --concurrency 32 --duration 60 --baseline run.json
+
+Seeding writes to the database, so against a running stack it only happens
+with --seed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = "login=1,dashboard=6,entry=2,calculate=1"
+SPORTS = ["Football", "Basketball", "Tennis", "Swimming", "Golf"]
+ACTIVITY_LEVELS = ["sedentary", "light", "moderate", "active", "very active"]
+PASSWORD = "loadtest"
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_service(module, app_dir, port, cwd, env):
+    """Start one service with uvicorn and return the process"""
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--app-dir", app_dir,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+
+def wait_until_ready(url, process, timeout=30):
+    """Poll the service until it answers, failing early when the process died"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited: {process.stderr.read().decode(errors='replace')}")
+        try:
+            if httpx.get(f"{url}/docs", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+def start_stack(workdir):
+    """
+    Start Database, Backend and Frontend on free local ports
+
+    The database runs in `workdir` so its SQLite file and schema copy stay
+    out of the repository.
+
+    Returns:
+        Tuple of (frontend URL, database URL, list of processes)
+    """
+    ports = {name: free_port() for name in ("database", "backend", "frontend")}
+    urls = {name: f"http://127.0.0.1:{port}" for name, port in ports.items()}
+    processes = []
+    try:
+        database = start_service("main", os.path.join(ROOT, "RMW-Database"), ports["database"], workdir,
+                                 {"DB_PATH": os.path.join(workdir, "RMW.db")})
+        processes.append(database)
+        backend = start_service("main", os.path.join(ROOT, "RMW-Backend"), ports["backend"], workdir,
+                                {"LOG_LEVEL": "WARNING"})
+        processes.append(backend)
+        frontend_dir = os.path.join(ROOT, "RMW-Frontend")
+        frontend = start_service("rmw_api_frontend", frontend_dir, ports["frontend"], frontend_dir,
+                                 {"DATABASE_API_URL": urls["database"], "ORIGINAL_API_URL": urls["backend"],
+                                  "SESSION_SECRET": secrets.token_urlsafe(32)})
+        processes.append(frontend)
+        for name, process in zip(("database", "backend", "frontend"), processes):
+            wait_until_ready(urls[name], process)
+    except Exception:
+        stop_stack(processes)
+        raise
+    return urls["frontend"], urls["database"], processes
+
+def stop_stack(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+async def seed(database_url, users, weights_per_user, seed_value):
+    """
+    Create users with a profile and a weight history through the Database API
+
+    Returns:
+        List of (username, profile) tuples for the virtual users
+    """
+    rng = random.Random(seed_value)
+    run_id = f"{int(time.time())}_{rng.randrange(10 ** 6)}"
+    accounts = []
+    async with httpx.AsyncClient(base_url=database_url, timeout=60) as client:
+        for index in range(users):
+            username = f"loadtest_{run_id}_{index}"
+            response = await client.post("/api/users", json={"username": username, "password": PASSWORD})
+            response.raise_for_status()
+            user_id = response.json()["id"]
+            profile = {
+                "user_id": user_id,
+                "gender": rng.choice(["male", "female"]),
+                "height": rng.randint(155, 200),
+                "age": rng.randint(18, 75),
+                "activity_level": rng.choice(ACTIVITY_LEVELS)
+            }
+            (await client.post("/api/profiles", json=profile)).raise_for_status()
+
+            weight = rng.uniform(60, 120)
+            goal_weight = round(weight + rng.choice([-1, 1]) * rng.uniform(3, 15), 1)
+            history = []
+            for day in range(weights_per_user):
+                weight += rng.gauss(-0.05, 0.3)
+                history.append({
+                    "user_id": user_id,
+                    "weight": round(weight, 1),
+                    "goal_weight": goal_weight,
+                    "date": time.strftime("%Y-%m-%d 08:00:00", time.gmtime(time.time() - (weights_per_user - day) * 86400))
+                })
+            if history:
+                (await client.post("/api/weights/bulk", json=history)).raise_for_status()
+            accounts.append((username, {**profile, "weight": round(weight, 1), "goal_weight": goal_weight}))
+    return accounts
+
+def parse_mix(text):
+    """Parse 'login=1,dashboard=6' into a {request type: weight} dict"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown request type '{name}', use one of: {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+async def do_login(client, account, rng):
+    response = await client.post("/login", data={"username": account[0], "password": PASSWORD})
+    # A successful login redirects to the dashboard, a failed one renders the form again
+    return response.status_code == 303, response.status_code
+
+async def do_dashboard(client, account, rng):
+    response = await client.get("/dashboard")
+    return response.status_code == 200, response.status_code
+
+async def do_entry(client, account, rng):
+    profile = account[1]
+    response = await client.post("/entry", data={
+        "weight": round(profile["weight"] + rng.uniform(-0.5, 0.5), 1),
+        "goal_weight": profile["goal_weight"],
+        "gender": profile["gender"],
+        "height": profile["height"],
+        "age": profile["age"],
+        "activity_level": profile["activity_level"],
+        "sport": rng.sample(SPORTS, rng.randint(2, 3)),
+        "aantal_minuten_sporten": rng.choice([15, 30, 45, 60]),
+        "deficit_surplus": rng.choice([250, 500, 1000])
+    })
+    return response.status_code == 200 and "Selecteer minimaal" not in response.text, response.status_code
+
+async def do_calculate(client, account, rng):
+    profile = account[1]
+    response = await client.post("/api/calculate", json={
+        "gender": profile["gender"],
+        "weight": round(profile["weight"] + rng.uniform(-2, 2), 1),
+        "height": profile["height"],
+        "age": profile["age"],
+        "activity_level": profile["activity_level"],
+        "sport": rng.sample(SPORTS, rng.randint(1, 3)),
+        "aantal_minuten_sporten": rng.choice([15, 30, 45, 60]),
+        "gewenst_gewicht": profile["goal_weight"],
+        "deficit_surplus": rng.choice([250, 500, 1000])
+    })
+    return response.status_code == 200, response.status_code
+
+SCENARIOS = {"login": do_login, "dashboard": do_dashboard, "entry": do_entry, "calculate": do_calculate}
+
+async def virtual_user(frontend_url, account, mix, deadline, warmup_until, samples, seed_value):
+    """Log in once, then send requests from the mix until the deadline"""
+    rng = random.Random(seed_value)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    async with httpx.AsyncClient(base_url=frontend_url, timeout=30, follow_redirects=False) as client:
+        await do_login(client, account, rng)
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            start = time.monotonic()
+            try:
+                ok, status = await SCENARIOS[name](client, account, rng)
+            except httpx.HTTPError as e:
+                ok, status = False, type(e).__name__
+            if start >= warmup_until:
+                samples.append((name, time.monotonic() - start, ok, status))
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def summarize(samples, seconds):
+    """Throughput, latency percentiles in milliseconds and error rate of a list of samples"""
+    latencies = sorted(latency for _, latency, _, _ in samples)
+    errors = [status for _, _, ok, status in samples if not ok]
+    statuses = {}
+    for status in errors:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / seconds, 2) if seconds else 0,
+        "error_rate": round(len(errors) / len(samples), 4) if samples else 0,
+        "errors": statuses,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 0.50)),
+            "p90": ms(percentile(latencies, 0.90)),
+            "p95": ms(percentile(latencies, 0.95)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "max": ms(latencies[-1] if latencies else None)
+        }
+    }
+
+def compare(result, baseline, max_regression):
+    """
+    List the regressions of result against baseline
+
+    Throughput may not drop and p95 latency may not grow by more than
+    max_regression (a fraction), overall and per request type.
+    """
+    regressions = []
+    pairs = [("total", result["total"], baseline.get("total", {}))]
+    pairs += [(name, summary, baseline.get("scenarios", {}).get(name, {})) for name, summary in result["scenarios"].items()]
+    for name, current, before in pairs:
+        if before.get("throughput_rps") and current["throughput_rps"] < before["throughput_rps"] * (1 - max_regression):
+            regressions.append(f"{name}: throughput {current['throughput_rps']} < {before['throughput_rps']} req/s")
+        before_p95 = before.get("latency_ms", {}).get("p95")
+        current_p95 = current["latency_ms"]["p95"]
+        if before_p95 and current_p95 and current_p95 > before_p95 * (1 + max_regression):
+            regressions.append(f"{name}: p95 {current_p95} > {before_p95} ms")
+    return regressions
+
+async def run_load(frontend_url, accounts, mix, concurrency, duration, warmup, seed_value):
+    samples = []
+    start = time.monotonic()
+    warmup_until = start + warmup
+    deadline = warmup_until + duration
+    await asyncio.gather(*(
+        virtual_user(frontend_url, accounts[index % len(accounts)], mix, deadline, warmup_until, samples, seed_value + index)
+        for index in range(concurrency)
+    ))
+    measured = max(time.monotonic() - warmup_until, 1e-9)
+    return samples, measured
+
+def main(args):
+    processes = []
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            if args.frontend_url:
+                frontend_url, database_url = args.frontend_url, args.database_url
+            else:
+                frontend_url, database_url, processes = start_stack(workdir)
+
+            if args.frontend_url and not args.seed:
+                accounts = [(username, {
+                    "gender": "male", "height": 180, "age": 35, "activity_level": "moderate",
+                    "weight": 85.0, "goal_weight": 78.0
+                }) for username in args.accounts.split(",")]
+            else:
+                accounts = asyncio.run(seed(database_url, args.users, args.weights_per_user, args.random_seed))
+
+            samples, seconds = asyncio.run(run_load(
+                frontend_url, accounts, args.mix, args.concurrency, args.duration, args.warmup, args.random_seed
+            ))
+        finally:
+            stop_stack(processes)
+
+    result = {
+        "config": {
+            "target": args.frontend_url or "local",
+            "users": len(accounts),
+            "weights_per_user": args.weights_per_user,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "mix": args.mix,
+            "seed": args.random_seed
+        },
+        "total": summarize(samples, seconds),
+        "scenarios": {
+            name: summarize([sample for sample in samples if sample[0] == name], seconds)
+            for name in args.mix
+        }
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.max_regression)
+        result["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    return exit_code
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frontend-url", help="target a running frontend instead of starting the services")
+    parser.add_argument("--database-url", help="Database API used for --seed against a running stack")
+    parser.add_argument("--seed", action="store_true", help="seed users into a running stack")
+    parser.add_argument("--accounts", default="test", help="comma separated existing usernames when not seeding")
+    parser.add_argument("--users", type=int, default=50, help="seeded users")
+    parser.add_argument("--weights-per-user", type=int, default=365)
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users sending requests in parallel")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of load before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help=f"request weights (default {DEFAULT_MIX})")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    parser.add_argument("--baseline", help="earlier JSON result to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed throughput drop / p95 growth")
+    args = parser.parse_args()
+    if args.seed and not args.database_url:
+        parser.error("--seed against a running stack needs --database-url")
+
+    sys.exit(main(args))
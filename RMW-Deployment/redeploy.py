@@ -1,13 +1,64 @@
 from fastapi import FastAPI, HTTPException, Query
-import subprocess
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import atexit
+import contextlib
+import logging
+import logging.handlers
+import queue
+import signal
+import sqlite3
+import sys
+import uuid
 import os
 import time
 
 app = FastAPI()
 
+logger = logging.getLogger("rmw.deployment")
+
+def configure_logging(level=os.environ.get("LOG_LEVEL", "INFO").upper(), stream=sys.stdout):
+    """Write the service log from a background thread, so logging job output never blocks the event loop"""
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, output)
+    
+    logger.handlers.clear()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+    
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+log_listener = configure_logging()
+
 # Get API key from the environment
 DEPLOY_API_KEY = os.environ.get("DEPLOY_API_KEY")
 
+# Docker CLI used for every deploy command; tests point this at a fake
+DOCKER_CLI = os.environ.get("DOCKER_CLI", "docker")
+# Deploy jobs and their output are kept in SQLite so they survive a restart of this service
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", "jobs/jobs.db")
+# Number of finished jobs kept in memory and on disk
+JOB_HISTORY = int(os.environ.get("JOB_HISTORY", "200"))
+# Seconds job output is collected before it is written to SQLite in one transaction
+JOB_OUTPUT_FLUSH_INTERVAL = float(os.environ.get("JOB_OUTPUT_FLUSH_INTERVAL", "0.5"))
+# Seconds to wait for "docker stack rm monitoring" to finish before redeploying the stack
+STACK_REMOVE_WAIT = float(os.environ.get("STACK_REMOVE_WAIT", "15"))
+# Repository with the monitoring configuration
+REPO_DIR = "/root/ReachMyWeight"
+# Rolling update settings of "docker service update"
+UPDATE_PARALLELISM = int(os.environ.get("UPDATE_PARALLELISM", "1"))
+UPDATE_DELAY = os.environ.get("UPDATE_DELAY", "10s")
+# Services a release deploys at the same time, at most
+RELEASE_MAX_PARALLEL = int(os.environ.get("RELEASE_MAX_PARALLEL", "3"))
+
 # Service configuration mapping
 SERVICE_CONFIG = {
     "frontend": {
@@ -52,99 +103,549 @@ SERVICE_CONFIG = {
     }
 }
 
+def deploy_steps(service: str) -> List[Tuple[str, str]]:
+    """The (description, shell command) steps that redeploy a service, run in order"""
+    config = SERVICE_CONFIG[service]
+    
+    # Special handling for full monitoring redeployment
+    if service == "monitoring-full":
+        return [
+            ("Removing existing monitoring stack", f"{DOCKER_CLI} stack rm monitoring"),
+            ("Waiting for monitoring stack to be fully removed", f"sleep {STACK_REMOVE_WAIT:g}"),
+            (
+                "Cleaning up all monitoring volumes",
+                f"for vol in $({DOCKER_CLI} volume ls --format \"{{{{.Name}}}}\" | grep -E 'monitoring_|prometheus_data|grafana_data'); "
+                f"do {DOCKER_CLI} volume rm $vol || true; done"
+            ),
+            # Clone the repository if not present, or update if it exists
+            (
+                "Getting latest monitoring configurations",
+                f"if [ -d \"{REPO_DIR}\" ]; then cd {REPO_DIR} && git pull; "
+                f"else git clone https://github.com/BergGoat/ReachMyWeight.git {REPO_DIR}; fi"
+            ),
+            ("Ensuring network exists", f"{DOCKER_CLI} network create --driver overlay rmw-network || true"),
+            (
+                "Updating network configuration if needed",
+                f"cd {REPO_DIR} && if grep -q 'monitor-net' RMW-Monitoring/docker-stack.yml; "
+                f"then sed -i 's/monitor-net/rmw-network/g' RMW-Monitoring/docker-stack.yml; fi"
+            ),
+            ("Deploying fresh monitoring stack", f"cd {REPO_DIR} && {DOCKER_CLI} stack deploy -c RMW-Monitoring/docker-stack.yml monitoring"),
+        ]
+    
+    # This service can't wait for its own update: the update stops this container.
+    # --detach returns once swarm accepted it, so the job finishes before that.
+    detach = " --detach" if service == "deployment" else ""
+    return [
+        (f"Pulling latest image for {service}", f"{DOCKER_CLI} pull {config['image']}"),
+        (
+            f"Updating service {config['service_name']}",
+            f"{DOCKER_CLI} service update --with-registry-auth{detach} "
+            f"--image {config['image']} {config['service_name']} "
+            f"--update-parallelism {UPDATE_PARALLELISM} --update-delay {UPDATE_DELAY} --update-order start-first"
+        ),
+    ]
+
+# Default release order: a service is deployed after the services it depends on
+RELEASE_DEPENDENCIES = {
+    "backend": ["database"],
+    "frontend": ["backend", "database"],
+    "grafana": ["prometheus"],
+}
+
+def release_order(services: List[str], depends_on: Dict[str, List[str]]) -> List[str]:
+    """
+    Order the services of a release so every service comes after its dependencies
+    
+    Dependencies on services outside the release are ignored; those are
+    already running.
+    
+    Raises:
+        ValueError: For an unknown service or a dependency cycle
+    """
+    unknown = [service for service in services if service not in SERVICE_CONFIG]
+    if unknown or not services:
+        raise ValueError(f"Unknown or missing services: {', '.join(unknown)}. Must be one of: {', '.join(SERVICE_CONFIG)}")
+    selected = list(dict.fromkeys(services))
+    waiting_on = {service: {dep for dep in depends_on.get(service, []) if dep in selected and dep != service} for service in selected}
+    order = []
+    while waiting_on:
+        ready = [service for service in selected if service in waiting_on and not waiting_on[service]]
+        if not ready:
+            raise ValueError(f"Dependency cycle between: {', '.join(sorted(waiting_on))}")
+        for service in ready:
+            del waiting_on[service]
+            order.append(service)
+        for deps in waiting_on.values():
+            deps.difference_update(ready)
+    return order
+
+def success_message(service: str) -> str:
+    if service == "monitoring-full":
+        return "Complete monitoring stack redeployment successful"
+    return f"Redeployment triggered for service: {service}"
+
+class Job:
+    """One deploy of one service, with its status and the output of its commands"""
+    def __init__(self, service: str, job_id: str = None, status: str = "queued", created_at: float = None,
+                 started_at: float = None, finished_at: float = None, error: str = None, lines: List[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.service = service
+        self.status = status
+        self.created_at = created_at or time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.error = error
+        self.lines = lines or []
+        self.done = asyncio.Event()
+        self.updated = asyncio.Event()
+        if self.finished:
+            self.done.set()
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed", "interrupted")
+    
+    def notify(self):
+        # Wake everyone following the job and start a new round
+        updated, self.updated = self.updated, asyncio.Event()
+        updated.set()
+    
+    def log(self, line: str):
+        logger.info("[%s %s] %s", self.service, self.id[:8], line)
+        self.lines.append(line)
+        job_store.append_line(self, line)
+        self.notify()
+    
+    def set_status(self, status: str, error: str = None):
+        self.status = status
+        if status == "running":
+            self.started_at = time.time()
+        if self.finished:
+            self.finished_at = time.time()
+            self.error = error
+            self.done.set()
+        job_store.save(self)
+        self.notify()
+    
+    def as_dict(self, output: bool = True) -> Dict:
+        data = {
+            "job_id": self.id,
+            "service": self.service,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+        if output:
+            data["output"] = "\n".join(self.lines)
+        return data
+
+class Release(Job):
+    """A job that deploys several services as child jobs, in dependency order"""
+    def __init__(self, order: List[str], depends_on: Dict[str, List[str]], max_parallel: int):
+        super().__init__("release")
+        self.order = order
+        self.depends_on = {service: [dep for dep in depends_on.get(service, []) if dep in order] for service in order}
+        self.max_parallel = max_parallel
+        self.children: Dict[str, Job] = {}
+    
+    def as_dict(self, output: bool = True) -> Dict:
+        data = super().as_dict(output)
+        data["max_parallel"] = self.max_parallel
+        data["services"] = {
+            service: {
+                "depends_on": self.depends_on[service],
+                "job_id": self.children[service].id if service in self.children else None,
+                "status": self.children[service].status if service in self.children else "pending" if not self.finished else "skipped"
+            }
+            for service in self.order
+        }
+        return data
+
+class JobStore:
+    """
+    SQLite persistence for jobs and their output lines
+    
+    Output lines are buffered and written in one transaction per
+    JOB_OUTPUT_FLUSH_INTERVAL, and with every status change, instead of one
+    commit per line on the event loop.
+    """
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        self.conn = None
+        self.pending: List[Tuple[str, int, str]] = []
+        self.flush_handle = None
+    
+    def open(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                service TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS job_output (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                line TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            );
+        """)
+    
+    def close(self):
+        if self.conn is not None:
+            self.flush()
+            self.conn.close()
+            self.conn = None
+    
+    def save(self, job: Job):
+        if self.conn is None:
+            return
+        with self.conn:
+            # The job's output so far goes in the same transaction as its new status
+            self._write_pending()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, service, status, created_at, started_at, finished_at, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.service, job.status, job.created_at, job.started_at, job.finished_at, job.error)
+            )
+    
+    def append_line(self, job: Job, line: str):
+        """Buffer an output line until the next flush"""
+        if self.conn is None:
+            return
+        self.pending.append((job.id, len(job.lines), line))
+        if self.flush_handle is None:
+            try:
+                self.flush_handle = asyncio.get_running_loop().call_later(JOB_OUTPUT_FLUSH_INTERVAL, self.flush)
+            except RuntimeError:
+                self.flush()
+    
+    def flush(self):
+        """Write the buffered output lines in one transaction"""
+        if self.conn is None:
+            return
+        with self.conn:
+            self._write_pending()
+    
+    def _write_pending(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.pending:
+            pending, self.pending = self.pending, []
+            self.conn.executemany("INSERT INTO job_output (job_id, seq, line) VALUES (?, ?, ?)", pending)
+    
+    def delete(self, job_ids: List[str]):
+        if self.conn is None or not job_ids:
+            return
+        with self.conn:
+            self.conn.executemany("DELETE FROM job_output WHERE job_id = ?", ((job_id,) for job_id in job_ids))
+            self.conn.executemany("DELETE FROM jobs WHERE id = ?", ((job_id,) for job_id in job_ids))
+    
+    def load(self, limit: int) -> List[Job]:
+        """
+        The most recent jobs, oldest first
+        
+        Jobs that were queued or running when the service stopped cannot be
+        resumed, so they are marked interrupted.
+        """
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'interrupted', finished_at = ?, error = 'Service restarted during the deploy' "
+                "WHERE status IN ('queued', 'running')",
+                (time.time(),)
+            )
+        rows = self.conn.execute(
+            "SELECT id, service, status, created_at, started_at, finished_at, error FROM jobs "
+            "ORDER BY created_at DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        jobs = []
+        for job_id, service, status, created_at, started_at, finished_at, error in reversed(rows):
+            lines = [line for (line,) in self.conn.execute(
+                "SELECT line FROM job_output WHERE job_id = ? ORDER BY seq", (job_id,)
+            )]
+            jobs.append(Job(service, job_id, status, created_at, started_at, finished_at, error, lines))
+        return jobs
+
+job_store = JobStore()
+# Known jobs by ID, oldest first
+jobs: "OrderedDict[str, Job]" = OrderedDict()
+# Running job tasks, referenced so they are not garbage collected
+job_tasks = set()
+service_locks: Dict[str, asyncio.Lock] = {}
+
+def lock_key(service: str) -> str:
+    # The monitoring services are all part of one stack that monitoring-full removes
+    return "monitoring" if SERVICE_CONFIG[service]["service_name"].startswith("monitoring") else service
+
+def service_lock(service: str) -> asyncio.Lock:
+    """Deploys of the same service (or stack) run one after another"""
+    key = lock_key(service)
+    if key not in service_locks:
+        service_locks[key] = asyncio.Lock()
+    return service_locks[key]
+
+def remember(job: Job):
+    """Add a job and forget the oldest finished jobs beyond JOB_HISTORY"""
+    jobs[job.id] = job
+    expired = []
+    for old in list(jobs.values()):
+        if len(jobs) - len(expired) <= JOB_HISTORY:
+            break
+        if old.finished:
+            expired.append(old.id)
+    for job_id in expired:
+        del jobs[job_id]
+    job_store.delete(expired)
+
+async def run_command(job: Job, command: str) -> int:
+    """Run a shell command, logging its combined output line by line, and return its exit code"""
+    # A session of its own, so the whole command tree can be stopped at once
+    process = await asyncio.create_subprocess_shell(
+        command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, start_new_session=True
+    )
+    try:
+        async for line in process.stdout:
+            job.log(line.decode(errors="replace").rstrip("\r\n"))
+        return await process.wait()
+    except asyncio.CancelledError:
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGKILL)
+        await process.wait()
+        raise
+
+async def run_job(job: Job):
+    """Run the deploy steps of a job once no other deploy of its service is running"""
+    try:
+        async with service_lock(job.service):
+            job.set_status("running")
+            for description, command in deploy_steps(job.service):
+                job.log(f"==> {description}")
+                returncode = await run_command(job, command)
+                if returncode != 0:
+                    job.set_status("failed", f"{description} failed with exit code {returncode}")
+                    return
+            job.log(success_message(job.service))
+            job.set_status("succeeded")
+    except asyncio.CancelledError:
+        job.set_status("interrupted", "Service stopped during the deploy")
+        raise
+    except Exception as e:
+        job.set_status("failed", str(e))
+
+def submit_job(service: str) -> Job:
+    """Queue a deploy of a service in the background"""
+    job = Job(service)
+    remember(job)
+    job_store.save(job)
+    task = asyncio.ensure_future(run_job(job))
+    job_tasks.add(task)
+    task.add_done_callback(job_tasks.discard)
+    return job
+
+async def run_release(release: Release):
+    """
+    Deploy the services of a release, each as soon as its dependencies succeeded
+    
+    At most max_parallel services deploy at once. After the first failure no
+    new services are started; the ones already deploying are allowed to
+    finish, and the rest are skipped.
+    """
+    remaining = list(release.order)
+    deploying: Dict[asyncio.Future, Job] = {}
+    failed = []
+    try:
+        release.set_status("running")
+        while remaining or deploying:
+            if not failed:
+                for service in list(remaining):
+                    if len(deploying) >= release.max_parallel:
+                        break
+                    if all(dep in release.children and release.children[dep].status == "succeeded" for dep in release.depends_on[service]):
+                        remaining.remove(service)
+                        job = submit_job(service)
+                        release.children[service] = job
+                        release.log(f"==> Deploying {service} (job {job.id})")
+                        deploying[asyncio.ensure_future(job.done.wait())] = job
+            if not deploying:
+                break
+            done, _ = await asyncio.wait(deploying, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in done:
+                job = deploying.pop(waiter)
+                release.log(f"{job.service}: {job.status}" + (f" ({job.error})" if job.error else ""))
+                if job.status != "succeeded":
+                    failed.append(job.service)
+        
+        for service in remaining:
+            release.log(f"{service}: skipped")
+        if failed:
+            release.set_status("failed", f"Release aborted, failed: {', '.join(failed)}")
+        else:
+            release.log(f"Release of {', '.join(release.order)} successful")
+            release.set_status("succeeded")
+    except asyncio.CancelledError:
+        for waiter in deploying:
+            waiter.cancel()
+        release.set_status("interrupted", "Service stopped during the release")
+        raise
+
+def submit_release(order: List[str], depends_on: Dict[str, List[str]], max_parallel: int) -> Release:
+    """Start a release in the background"""
+    release = Release(order, depends_on, max_parallel)
+    remember(release)
+    job_store.save(release)
+    release.log(f"Release plan: {', '.join(order)} with at most {max_parallel} at once")
+    task = asyncio.ensure_future(run_release(release))
+    job_tasks.add(task)
+    task.add_done_callback(job_tasks.discard)
+    return release
+
+def check_api_key(api_key: str):
+    if not DEPLOY_API_KEY or api_key != DEPLOY_API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+def get_job(job_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.on_event("startup")
+async def startup_event():
+    job_store.open()
+    for job in job_store.load(JOB_HISTORY):
+        jobs[job.id] = job
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Running deploys are stopped and recorded as interrupted
+    for task in list(job_tasks):
+        task.cancel()
+    await asyncio.gather(*job_tasks, return_exceptions=True)
+    job_store.close()
+
 @app.post("/redeploy")
 async def redeploy(
     api_key: str,
-    service: str = Query(None, description="Specific service to update (frontend, backend, database, deployment, prometheus, grafana, node-exporter, alertmanager, cadvisor)")
+    service: str = Query(None, description="Specific service to update (frontend, backend, database, deployment, prometheus, grafana, node-exporter, alertmanager, cadvisor)"),
+    wait: bool = Query(False, description="Wait for the deploy to finish and return its output")
 ):
-    if not DEPLOY_API_KEY or api_key != DEPLOY_API_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+    """
+    Queue a redeploy as a background job
+    
+    Returns 202 with the job ID right away; follow the job at /jobs/{job_id}
+    and /jobs/{job_id}/output. With wait=true the request returns when the
+    deploy is done, with its output, or 500 when it failed.
+    """
+    check_api_key(api_key)
     
     if not service or service not in SERVICE_CONFIG:
         services_list = ", ".join(SERVICE_CONFIG.keys())
         raise HTTPException(status_code=400, detail=f"Invalid or missing service parameter. Must be one of: {services_list}")
     
-    config = SERVICE_CONFIG[service]
+    job = submit_job(service)
     
+    if wait:
+        await job.done.wait()
+        if job.status != "succeeded":
+            raise HTTPException(status_code=500, detail=f"Deployment failed: {job.error}\n" + "\n".join(job.lines[-20:]))
+        return {"message": success_message(service), "job_id": job.id, "output": "\n".join(job.lines)}
+    
+    return JSONResponse(status_code=202, content={
+        "message": f"Redeployment queued for service: {service}",
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "output_url": f"/jobs/{job.id}/output"
+    })
+
+class ReleaseRequest(BaseModel):
+    services: List[str]
+    # Service -> services it must wait for; RELEASE_DEPENDENCIES when left out
+    depends_on: Optional[Dict[str, List[str]]] = None
+    max_parallel: Optional[int] = None
+
+@app.post("/release")
+async def release(
+    request: ReleaseRequest,
+    api_key: str,
+    wait: bool = Query(False, description="Wait for the release to finish")
+):
+    """
+    Deploy several services in dependency order, independent ones concurrently
+    
+    Returns 202 with the release's job ID; /jobs/{job_id} shows the status of
+    every service and /jobs/{job_id}/output streams the release log. The
+    release stops starting new services after the first failure.
+    """
+    check_api_key(api_key)
+    depends_on = RELEASE_DEPENDENCIES if request.depends_on is None else request.depends_on
     try:
-        # Pull the latest image
-        print(f"Pulling latest image for {service}...")
-        
-        # Special handling for full monitoring redeployment
-        if service == "monitoring-full":
-            print("Using special handler for complete monitoring stack redeployment...")
-            
-            # 1. Remove the existing stack
-            print("Removing existing monitoring stack...")
-            remove_cmd = "docker stack rm monitoring"
-            subprocess.run(remove_cmd, shell=True, check=True)
-            
-            # 2. Wait for stack to be fully removed
-            print("Waiting for monitoring stack to be fully removed...")
-            time.sleep(15)
-            
-            # 3. Clean up all related volumes
-            print("Cleaning up all monitoring volumes...")
-            clean_cmd = "for vol in $(docker volume ls --format \"{{.Name}}\" | grep -E 'monitoring_|prometheus_data|grafana_data'); do docker volume rm $vol || true; done"
-            subprocess.run(clean_cmd, shell=True, check=True)
-            
-            # 4. Clone the repo to get updated monitoring configs
-            print("Getting latest monitoring configurations...")
-            
-            # Use a fixed path where we know the repository exists
-            repo_dir = "/root/ReachMyWeight"
-            
-            # Clone the repository if not present, or update if it exists
-            clone_cmd = f"""
-            if [ -d "{repo_dir}" ]; then
-                cd {repo_dir} && git pull
-            else
-                git clone https://github.com/BergGoat/ReachMyWeight.git {repo_dir}
-            fi
-            """
-            subprocess.run(clone_cmd, shell=True, check=True)
-            
-            # 5. Create network if needed
-            print("Ensuring network exists...")
-            net_cmd = "docker network create --driver overlay rmw-network || true"
-            subprocess.run(net_cmd, shell=True, check=True)
-            
-            # 6. Update network name if needed
-            print("Updating network configuration if needed...")
-            sed_cmd = f"cd {repo_dir} && if grep -q 'monitor-net' RMW-Monitoring/docker-stack.yml; then sed -i 's/monitor-net/rmw-network/g' RMW-Monitoring/docker-stack.yml; fi"
-            subprocess.run(sed_cmd, shell=True, check=True)
-            
-            # 7. Deploy the monitoring stack
-            print("Deploying fresh monitoring stack...")
-            deploy_cmd = f"cd {repo_dir} && docker stack deploy -c RMW-Monitoring/docker-stack.yml monitoring"
-            result = subprocess.run(deploy_cmd, shell=True, check=True, capture_output=True, text=True)
-            
-            return {"message": "Complete monitoring stack redeployment successful", "output": result.stdout}
-        
-        # For all other services, continue with normal flow
-        pull_command = f"docker pull {config['image']}"
-        if service != "monitoring-full":  # Skip for monitoring-full since it doesn't have a real image
-            subprocess.run(pull_command, shell=True, check=True)
-        
-        # Update the service with the new image
-        print(f"Updating service {config['service_name']}...")
-        update_command = (
-            f"docker service update --with-registry-auth "
-            f"--image {config['image']} {config['service_name']} "
-            f"--update-parallelism 1 --update-delay 10s --update-order start-first"
-        )
-        result = subprocess.run(
-            update_command,
-            shell=True,
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        
-        return {"message": f"Redeployment triggered for service: {service}", "output": result.stdout}
-    except subprocess.CalledProcessError as e:
-        error_message = e.stderr if hasattr(e, 'stderr') and e.stderr else str(e)
-        raise HTTPException(status_code=500, detail=f"Deployment failed: {error_message}")
+        order = release_order(request.services, depends_on)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.max_parallel is not None and request.max_parallel < 1:
+        raise HTTPException(status_code=400, detail="max_parallel must be at least 1")
+    max_parallel = min(RELEASE_MAX_PARALLEL if request.max_parallel is None else request.max_parallel, RELEASE_MAX_PARALLEL)
+    
+    release = submit_release(order, depends_on, max_parallel)
+    
+    if wait:
+        await release.done.wait()
+        status_code = 200 if release.status == "succeeded" else 500
+        return JSONResponse(status_code=status_code, content=release.as_dict())
+    
+    return JSONResponse(status_code=202, content={
+        "message": f"Release queued for services: {', '.join(order)}",
+        "job_id": release.id,
+        "order": order,
+        "max_parallel": max_parallel,
+        "status_url": f"/jobs/{release.id}",
+        "output_url": f"/jobs/{release.id}/output"
+    })
+
+@app.get("/jobs")
+async def list_jobs(api_key: str, service: Optional[str] = None, limit: int = Query(20, ge=1, le=200)):
+    """Most recent jobs first, without their output"""
+    check_api_key(api_key)
+    selected = [job for job in reversed(jobs.values()) if service is None or job.service == service]
+    return [job.as_dict(output=False) for job in selected[:limit]]
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, api_key: str):
+    check_api_key(api_key)
+    return get_job(job_id).as_dict()
+
+@app.get("/jobs/{job_id}/output")
+async def job_output(job_id: str, api_key: str):
+    """Stream the job's output as plain text, following it until the job finishes"""
+    check_api_key(api_key)
+    job = get_job(job_id)
+    
+    async def follow():
+        sent = 0
+        while True:
+            # Take the event before reading, so a line logged in between still wakes us
+            updated = job.updated
+            while sent < len(job.lines):
+                yield job.lines[sent] + "\n"
+                sent += 1
+            if job.finished:
+                yield f"[{job.status}]" + (f" {job.error}" if job.error else "") + "\n"
+                return
+            await updated.wait()
+    
+    return StreamingResponse(follow(), media_type="text/plain")
 
 @app.get("/health")
 async def health_check():
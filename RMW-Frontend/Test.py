@@ -0,0 +1,307 @@
+import pytest
+import asyncio
+import os
+import httpx
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("SESSION_SECRET", "test-geheim")
+os.environ.setdefault("ORIGINAL_API_URL", "http://backend")
+os.environ.setdefault("DATABASE_API_URL", "http://database")
+
+import rmw_api_frontend as frontend
+
+ENTRY = {"user_id": 1, "weight": 80.5, "goal_weight": 75}
+FORM = {
+    "weight": "84.0", "goal_weight": "78.0", "gender": "male", "height": "180", "age": "35",
+    "activity_level": "moderate", "sport": ["Swimming", "Football"], "aantal_minuten_sporten": "30"
+}
+
+@pytest.fixture
+def database_calls(monkeypatch):
+    """Vervangt de Database API door een nep upstream en geeft de lijst met ontvangen verzoeken terug."""
+    calls = []
+    # Metingen van gebruiker 1, oudste eerst
+    weights = [{"id": 7, **ENTRY, "date": "2024-05-01 08:00:00"}]
+    
+    def handle(request: httpx.Request):
+        calls.append(request)
+        if request.url.path == "/api/login":
+            body = frontend.loads_json(request.content)
+            if body["password"] != "test123":
+                return httpx.Response(401, json={"detail": "Invalid username or password"})
+            return httpx.Response(200, json={"id": 1, "username": body["username"]})
+        if request.method == "POST" and request.url.path == "/api/weights":
+            weights.append({"id": 7 + len(weights), "date": f"2024-05-{1 + len(weights):02d} 08:00:00", **frontend.loads_json(request.content)})
+            return httpx.Response(200, json=weights[-1], headers={"ETag": '"1.3"'})
+        if request.method == "GET" and request.url.path == "/api/weights/1":
+            if request.headers.get("If-None-Match") == '"1.3"':
+                return httpx.Response(304, headers={"ETag": '"1.3"'})
+            return httpx.Response(200, json=weights[::-1], headers={"ETag": '"1.3"'})
+        if request.method == "GET" and request.url.path == "/api/users/1/bundle":
+            points = [{key: weight[key] for key in ("date", "weight", "goal_weight")} for weight in weights]
+            return httpx.Response(200, json={
+                "user": {"id": 1, "username": "testuser"}, "profile": None, "latest_weight": weights[-1],
+                "weights": points[::-1], "series": {"points": points}
+            })
+        return httpx.Response(404, json={"detail": "Not found"})
+    
+    monkeypatch.setitem(frontend.upstream_clients, "database", httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+    return calls
+
+@pytest.fixture
+def original_api(monkeypatch):
+    """Vervangt de originele API door een nep upstream; "mode" kiest een antwoord, een fout of een timeout."""
+    state = {"mode": "ok", "calls": []}
+    
+    async def handle(request: httpx.Request):
+        state["calls"].append(request)
+        if state["mode"] == "error":
+            return httpx.Response(500, json={"detail": "Internal Server Error"})
+        if state["mode"] == "slow":
+            await asyncio.sleep(1)
+        return httpx.Response(200, json={"days_to_goal": 42.0, "BMR": 1800.0, "TDEE": 2500.0, "results": [
+            {"calorie_adjustment": 500, "time_to_reach_goal": 40.0, "TDEE": 2500.0, "goal": 2000.0}
+        ]})
+    
+    monkeypatch.setattr(frontend, "ORIGINAL_API_TIMEOUT", 0.1)
+    monkeypatch.setitem(frontend.upstream_clients, "original", httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+    return state
+
+@pytest.fixture
+def test_client(database_calls):
+    """Test client zonder startup, zodat de nep upstream niet vervangen wordt."""
+    frontend.verified_claims.cache_clear()
+    return TestClient(frontend.app)
+
+def session_cookie(user_id=1, username="testuser", ttl=None):
+    return {frontend.SESSION_COOKIE: frontend.create_session_token(user_id, username, ttl)}
+
+# Tracing
+def test_trace_propagation(test_client, database_calls, monkeypatch):
+    """Test dat de trace van de aanroeper via traceparent naar de Database API gaat, met de upstream span als ouder."""
+    exported = []
+    
+    class RecordingExporter(frontend.SpanExporter):
+        def export(self, trace):
+            exported.append(trace)
+    
+    monkeypatch.setattr(frontend, "span_exporter", RecordingExporter())
+    test_client.cookies.update(session_cookie(user_id=1))
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    
+    response = test_client.get("/api/weights/1", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+    assert response.status_code == 200
+    assert response.headers["X-Request-ID"] == trace_id
+    assert "database;dur=" in response.headers["Server-Timing"]
+    assert "total;dur=" in response.headers["Server-Timing"]
+    
+    upstream = database_calls[-1].headers
+    assert upstream["X-Request-ID"] == trace_id
+    _, upstream_trace_id, upstream_parent_id, _ = upstream["traceparent"].split("-")
+    assert upstream_trace_id == trace_id
+    spans = {record["name"]: record for record in exported[-1].spans}
+    assert upstream_parent_id == spans["database"]["span_id"]
+    assert spans["database"]["parent_id"] == spans["total"]["span_id"]
+    assert spans["total"]["parent_id"] == parent_id
+    
+    # Zonder traceparent begint een nieuwe trace, die ook doorgegeven wordt
+    response = test_client.get("/api/weights/1")
+    new_trace_id = response.headers["X-Request-ID"]
+    assert new_trace_id != trace_id
+    assert database_calls[-1].headers["traceparent"].split("-")[1] == new_trace_id
+    assert frontend.trace_headers() == {}
+
+# Upstream clients
+def test_upstream_clients_lifespan(monkeypatch):
+    """Test dat startup één client per upstream opent, verzoeken die hergebruiken en shutdown ze sluit."""
+    created = []
+    
+    def create_client(timeout):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, json={"id": 1, "username": "testuser"})
+        ), timeout=timeout)
+        created.append(client)
+        return client
+    
+    monkeypatch.setattr(frontend, "upstream_clients", {})
+    monkeypatch.setattr(frontend, "create_upstream_client", create_client)
+    with TestClient(frontend.app) as client:
+        assert set(frontend.upstream_clients) == {"original", "database"}
+        assert len(created) == 2
+        database = frontend.upstream_clients["database"]
+        assert database.timeout.read == frontend.DATABASE_API_TIMEOUT
+        
+        for _ in range(3):
+            response = client.post("/login", data={"username": "testuser", "password": "test123"}, follow_redirects=False)
+            assert response.status_code == 303
+        assert len(created) == 2
+        assert frontend.upstream_clients["database"] is database
+    
+    assert frontend.upstream_clients == {}
+    assert all(client.is_closed for client in created)
+
+# Sessie tokens
+def test_session_token_roundtrip():
+    """Test dat een ondertekende token dezelfde claims teruggeeft."""
+    token = frontend.create_session_token(42, "testuser", ttl=60)
+    claims = frontend.verified_claims(token)
+    assert (claims["uid"], claims["usr"]) == (42, "testuser")
+    assert 0 < claims["exp"] - frontend.time.time() <= 60
+
+def test_tampered_session_tokens(monkeypatch):
+    """Test dat een aangepaste, verkeerd ondertekende of kapotte token niet geaccepteerd wordt."""
+    token = frontend.create_session_token(42, "testuser")
+    payload, signature = token.split(".")
+    
+    # Andere claims met de oude handtekening
+    other_payload = frontend.create_session_token(1, "testuser").split(".")[0]
+    assert frontend.verified_claims(f"{other_payload}.{signature}") is None
+    # Een aangepaste handtekening
+    assert frontend.verified_claims(f"{payload}.{'B' if signature[0] == 'A' else 'A'}{signature[1:]}") is None
+    for broken in ("", "geen-token", f"{payload}.", f".{signature}"):
+        assert frontend.verified_claims(broken) is None
+    
+    # Een token met een ander geheim, bijv. van een andere omgeving
+    monkeypatch.setattr(frontend, "SESSION_SECRET", "ander-geheim")
+    foreign = frontend.create_session_token(42, "testuser")
+    monkeypatch.undo()
+    assert frontend.verified_claims(foreign) is None
+    
+    # Geldig ondertekend maar geen geldige claims
+    garbage = frontend.b64encode(b'{"uid": "abc"}')
+    assert frontend.verified_claims(f"{garbage}.{frontend.session_signature(garbage)}") is None
+
+def test_login_sets_session_cookie(test_client):
+    """Test dat inloggen een ondertekende sessie cookie zet en een fout wachtwoord niet."""
+    response = test_client.post("/login", data={"username": "testuser", "password": "test123"}, follow_redirects=False)
+    assert response.status_code == 303
+    assert response.headers["location"] == "/dashboard"
+    claims = frontend.verified_claims(response.cookies[frontend.SESSION_COOKIE])
+    assert (claims["uid"], claims["usr"]) == (1, "testuser")
+    
+    failed = test_client.post("/login", data={"username": "testuser", "password": "fout"}, follow_redirects=False)
+    assert failed.status_code == 200
+    assert frontend.SESSION_COOKIE not in failed.cookies
+
+def test_pages_require_session(test_client, database_calls):
+    """Test dat de pagina's zonder geldige sessie naar de login gaan zonder de Database API aan te roepen."""
+    expired = session_cookie(ttl=-1)
+    tampered = {frontend.SESSION_COOKIE: session_cookie()[frontend.SESSION_COOKIE] + "x"}
+    for cookies in ({}, expired, tampered):
+        test_client.cookies.clear()
+        test_client.cookies.update(cookies)
+        for method, path in (("GET", "/dashboard"), ("GET", "/entry"), ("POST", "/entry")):
+            response = test_client.request(method, path, data=FORM if method == "POST" else None, follow_redirects=False)
+            assert response.status_code == 307, (path, cookies)
+            assert response.headers["location"] == "/login"
+    assert database_calls == []
+
+# Dashboard en invoer
+CALCULATION_TEXT = "Hier zie je hoeveel tijd"
+
+def test_dashboard_without_calculation(test_client, database_calls, original_api):
+    """Test dat het dashboard de metingen toont als de berekening faalt of te lang duurt, in plaats van een 500."""
+    test_client.cookies.update(session_cookie(user_id=1))
+    for mode in ("ok", "error", "slow"):
+        original_api["mode"] = mode
+        response = test_client.get("/dashboard")
+        assert response.status_code == 200, mode
+        assert "80.5" in response.text
+        assert (CALCULATION_TEXT in response.text) == (mode == "ok"), mode
+    assert len(original_api["calls"]) == 3
+    assert {request.url.path for request in database_calls} == {"/api/users/1/bundle"}
+
+def test_dashboard_database_timeout(test_client, original_api, monkeypatch):
+    """Test dat een te trage Database API een 504 geeft en de berekening dan niet gestart wordt."""
+    async def slow_bundle(user_id):
+        await asyncio.sleep(1)
+    
+    monkeypatch.setattr(frontend, "DATABASE_API_TIMEOUT", 0.1)
+    monkeypatch.setattr(frontend, "db_get_dashboard_bundle", slow_bundle)
+    test_client.cookies.update(session_cookie(user_id=1))
+    response = test_client.get("/dashboard")
+    assert response.status_code == 504
+    assert original_api["calls"] == []
+
+def test_entry_shows_new_weight(test_client, database_calls, original_api):
+    """Test dat de nieuwe meting in de opnieuw geladen bundel staat, ook als de berekening faalt of te lang duurt."""
+    test_client.cookies.update(session_cookie(user_id=1))
+    for number, mode in enumerate(("ok", "error", "slow")):
+        original_api["mode"] = mode
+        database_calls.clear()
+        response = test_client.post("/entry", data={**FORM, "weight": f"8{number}.2"})
+        assert response.status_code == 200, mode
+        assert f"8{number}.2" in response.text
+        assert (CALCULATION_TEXT in response.text) == (mode == "ok"), mode
+        # Eerst de insert, dan de bundel waar de nieuwe meting al in zit
+        assert [request.url.path for request in database_calls] == ["/api/weights", "/api/users/1/bundle"]
+        assert frontend.loads_json(original_api["calls"][-1].content)["sport"] == ["Swimming", "Football"]
+
+# Gewichten API
+def test_add_weight_requires_session(test_client, database_calls):
+    """Test dat POST /api/weights een 401 geeft zonder geldige sessie en dan de Database API niet aanroept."""
+    response = test_client.post("/api/weights", json=ENTRY)
+    assert response.status_code == 401
+    
+    test_client.cookies.update(session_cookie(ttl=-1))
+    assert test_client.post("/api/weights", json=ENTRY).status_code == 401
+    
+    test_client.cookies.update({frontend.SESSION_COOKIE: "geen-token"})
+    assert test_client.post("/api/weights", json=ENTRY).status_code == 401
+    assert database_calls == []
+
+def test_add_weight_for_other_user(test_client, database_calls):
+    """Test dat een sessie geen gewicht voor een andere gebruiker mag toevoegen."""
+    test_client.cookies.update(session_cookie(user_id=2))
+    response = test_client.post("/api/weights", json=ENTRY)
+    assert response.status_code == 403
+    assert database_calls == []
+
+def test_get_weights_requires_session(test_client, database_calls):
+    """Test dat GET /api/weights alleen de metingen van de ingelogde gebruiker teruggeeft."""
+    assert test_client.get("/api/weights/1").status_code == 401
+    
+    test_client.cookies.update(session_cookie(ttl=-1))
+    assert test_client.get("/api/weights/1").status_code == 401
+    
+    test_client.cookies.update(session_cookie(user_id=2))
+    assert test_client.get("/api/weights/1").status_code == 403
+    assert database_calls == []
+    
+    test_client.cookies.update(session_cookie(user_id=1))
+    response = test_client.get("/api/weights/1")
+    assert response.status_code == 200
+    assert response.json()[0]["weight"] == 80.5
+    assert [request.url.path for request in database_calls] == ["/api/weights/1"]
+
+def test_get_weights_not_modified(test_client, database_calls):
+    """Test dat If-None-Match naar de Database API gaat en een 304 met de ETag terugkomt."""
+    test_client.cookies.update(session_cookie(user_id=1))
+    response = test_client.get("/api/weights/1", params={"limit": 5})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"1.3"'
+    assert "If-None-Match" not in database_calls[0].headers
+    
+    response = test_client.get("/api/weights/1", params={"limit": 5}, headers={"If-None-Match": '"1.3"'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == '"1.3"'
+    assert database_calls[1].headers["If-None-Match"] == '"1.3"'
+    assert database_calls[1].url.params["limit"] == "5"
+    
+    # Een oude ETag geeft gewoon de nieuwe metingen
+    response = test_client.get("/api/weights/1", headers={"If-None-Match": '"1.2"'})
+    assert response.status_code == 200
+    assert response.json()[0]["weight"] == 80.5
+
+def test_add_weight_with_session(test_client, database_calls):
+    """Test dat een geldige sessie van dezelfde gebruiker het gewicht toevoegt en de nieuwe ETag doorgeeft."""
+    test_client.cookies.update(session_cookie(user_id=1))
+    response = test_client.post("/api/weights", json=ENTRY)
+    assert response.status_code == 200, response.text
+    assert response.json()["weight"] == 80.5
+    assert response.headers["ETag"] == '"1.3"'
+    assert [request.url.path for request in database_calls] == ["/api/weights"]
+
+if __name__ == "__main__":
+    pytest.main()
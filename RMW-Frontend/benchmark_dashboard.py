@@ -0,0 +1,145 @@
+"""
+Benchmark: latency of GET /dashboard and POST /entry against stub upstreams
+
+Runs the frontend in-process with its upstream clients pointed at stub
+Database and Backend apps that answer after a fixed delay. With sequential
+upstream calls the page latency is the sum of all calls; with the concurrent
+fan-out it is the longest dependency chain. Results are printed as JSON.
+
+    python benchmark_dashboard.py --db-delay 0.02 --backend-delay 0.05
+
+Run it against an older checkout of rmw_api_frontend.py to get the "before" numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+
+os.environ.setdefault("DATABASE_API_URL", "http://database")
+os.environ.setdefault("ORIGINAL_API_URL", "http://backend")
+os.environ.setdefault("SESSION_EPHEMERAL_SECRET", "true")
+
+import rmw_api_frontend as frontend
+
+FORM = {
+    "weight": "84.0",
+    "goal_weight": "78.0",
+    "gender": "male",
+    "height": "180",
+    "age": "35",
+    "activity_level": "moderate",
+    "sport": ["Swimming", "Football"],
+    "aantal_minuten_sporten": "30",
+    "deficit_surplus": "500"
+}
+
+def stub_database(delay):
+    """Database API stub that answers every call after `delay` seconds"""
+    stub = FastAPI()
+    entries = [
+        {"date": f"2024-01-{day:02d} 08:00:00", "weight": 90.0 - day * 0.2, "goal_weight": 78.0}
+        for day in range(28, 0, -1)
+    ]
+
+    @stub.get("/api/users/{user_id}")
+    async def user(user_id: int):
+        await asyncio.sleep(delay)
+        return {"id": user_id, "username": "bench"}
+
+    @stub.get("/api/profiles/{user_id}")
+    async def profile(user_id: int):
+        await asyncio.sleep(delay)
+        return {"user_id": user_id, "gender": "male", "height": 180, "age": 35, "activity_level": "moderate"}
+
+    @stub.get("/api/weights/{user_id}")
+    async def weights(user_id: int):
+        await asyncio.sleep(delay)
+        return entries
+
+    @stub.get("/api/weights/{user_id}/series")
+    async def series(user_id: int):
+        await asyncio.sleep(delay)
+        return {"user_id": user_id, "points": [{"date": e["date"], "weight": e["weight"]} for e in reversed(entries)]}
+
+    @stub.get("/api/users/{user_id}/bundle")
+    async def bundle(user_id: int):
+        await asyncio.sleep(delay)
+        return {
+            "user": {"id": user_id, "username": "bench"},
+            "profile": {"id": 1, "user_id": user_id, "gender": "male", "height": 180, "age": 35, "activity_level": "moderate"},
+            "latest_weight": {"id": 28, "user_id": user_id, **entries[0]},
+            "weights": entries,
+            "series": {"user_id": user_id, "bucket": "day", "points": [{"date": e["date"], "weight": e["weight"]} for e in reversed(entries)]}
+        }
+
+    @stub.post("/api/weights")
+    async def add_weight(entry: dict):
+        await asyncio.sleep(delay)
+        return {"id": 1, "date": "2024-01-29 08:00:00", **entry}
+
+    return stub
+
+def stub_backend(delay):
+    """Backend API stub whose /calculate answers after `delay` seconds"""
+    stub = FastAPI()
+
+    @stub.post("/calculate")
+    async def calculate(data: dict):
+        await asyncio.sleep(delay)
+        return {
+            "BMR": 1800, "TDEE": 2700, "days_to_goal": 84,
+            "results": [
+                {"calorie_adjustment": adjustment, "time_to_reach_goal": 42000 / adjustment, "TDEE": 2700,
+                 "goal": 2700 - adjustment}
+                for adjustment in (250, 500, 1000)
+            ]
+        }
+
+    return stub
+
+async def measure(client, method, url, samples, **kwargs):
+    """Time `samples` sequential requests and return latency percentiles in milliseconds"""
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1)
+    }
+
+async def run(db_delay, backend_delay, samples):
+    frontend.upstream_clients["database"] = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_database(db_delay)))
+    frontend.upstream_clients["original"] = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_backend(backend_delay)))
+    transport = httpx.ASGITransport(app=frontend.app)
+    cookies = {frontend.SESSION_COOKIE: frontend.create_session_token(1, "bench")}
+    async with httpx.AsyncClient(transport=transport, base_url="http://frontend", cookies=cookies) as client:
+        await measure(client, "GET", "/dashboard", 3)
+        dashboard = await measure(client, "GET", "/dashboard", samples)
+        entry = await measure(client, "POST", "/entry", samples, data=FORM)
+    for client in frontend.upstream_clients.values():
+        await client.aclose()
+    return dashboard, entry
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db-delay", type=float, default=0.02, help="seconds per Database API call")
+    parser.add_argument("--backend-delay", type=float, default=0.05, help="seconds per Backend API call")
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    dashboard, entry = asyncio.run(run(args.db_delay, args.backend_delay, args.samples))
+    print(json.dumps({
+        "db_delay_ms": args.db_delay * 1000,
+        "backend_delay_ms": args.backend_delay * 1000,
+        "dashboard": dashboard,
+        "entry": entry
+    }, indent=2))
@@ -5,17 +5,37 @@ Deze API bevat de frontend webapplicatie voor de gewichtstracker
 en maakt verbinding met de bestaande API voor berekeningen.
 """
 
-from fastapi import FastAPI, Request, Form, Depends, HTTPException, status
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Request, Form, Depends, HTTPException, Query, status
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 import os
+import re
+import hmac
+import json
+import base64
+import logging
+import hashlib
+import time
+import queue
+import asyncio
+import secrets
+import threading
+import contextlib
+import contextvars
+import urllib.request
 import httpx
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge, Histogram, generate_latest
 from typing import List, Optional, Dict, Any, Callable
 from datetime import date
 import functools
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Initialiseer de FastAPI applicatie
 app = FastAPI(
     title="Gewichtstracker App",
@@ -23,19 +43,436 @@ app = FastAPI(
     version="1.0"
 )
 
+logger = logging.getLogger("rmw.frontend")
+
 # Controleer of de benodigde mappen bestaan, zo niet, maak ze aan
 os.makedirs("templates", exist_ok=True)
 os.makedirs("static", exist_ok=True)
 os.makedirs("static/css", exist_ok=True)
 
+# JSON: orjson als het geïnstalleerd is en JSON_ENCODER=orjson, anders de standaardbibliotheek
+JSON_ENCODER = os.environ.get("JSON_ENCODER", "orjson").lower()
+
+def dumps_json(content):
+    """Zet gewone JSON types (dict, list, str, int, float, bool, None) om naar bytes"""
+    if orjson is not None and JSON_ENCODER == "orjson":
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def loads_json(body):
+    """Lees een JSON body van een upstream service"""
+    if orjson is not None and JSON_ENCODER == "orjson":
+        return orjson.loads(body)
+    return json.loads(body)
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse die met dumps_json rendert; de inhoud moet al uit gewone JSON types bestaan"""
+    def render(self, content):
+        return dumps_json(content)
+
+# Tracing: requests continue the trace of the caller (W3C traceparent or
+# X-Request-ID) and their spans go to a pluggable exporter. This code is the
+# same in RMW-Backend, RMW-Database and RMW-Frontend; change all three together.
+SERVICE_NAME = "rmw-frontend"
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "http://otel-collector:4318/v1/traces")
+# Most spans listed in the Server-Timing header
+SERVER_TIMING_MAX_ENTRIES = 32
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+current_span = contextvars.ContextVar("current_span", default=None)
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+class Trace:
+    """Spans of one request in this service"""
+    def __init__(self, trace_id=None, parent_id=None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.parent_id = parent_id
+        self.spans = []
+
+def trace_from_headers(headers):
+    """Continue the trace from a traceparent or X-Request-ID header, or start a new one"""
+    match = TRACEPARENT_PATTERN.match(headers.get("traceparent", ""))
+    if match:
+        return Trace(match.group(1), match.group(2))
+    request_id = headers.get("x-request-id", "").lower()
+    return Trace(request_id if re.fullmatch(r"[0-9a-f]{32}", request_id) else None)
+
+@contextlib.contextmanager
+def span(name, description="", kind="internal", **attributes):
+    """
+    Record the duration of a block as a span of the current request
+    
+    Args:
+        name: Short name, also the metric name in Server-Timing (e.g. "sql")
+        description: Details such as the route or statement
+        kind: OTLP span kind, "internal", "server" or "client"
+        **attributes: Extra attributes for the exporter
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = current_span.get()
+    record = {
+        "name": name,
+        "description": description,
+        "span_id": secrets.token_hex(8),
+        "parent_id": parent["span_id"] if parent else trace.parent_id,
+        "kind": kind,
+        "start_ns": time.time_ns(),
+        "attributes": attributes
+    }
+    token = current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration"] = time.perf_counter() - start
+        current_span.reset(token)
+        trace.spans.append(record)
+
+def server_timing(trace):
+    """Build the Server-Timing header from the spans, the request span is "total" """
+    entries = []
+    for record in trace.spans[-SERVER_TIMING_MAX_ENTRIES:]:
+        entry = f"{record['name']};dur={record['duration'] * 1000:.1f}"
+        if record["description"]:
+            entry += ';desc="' + record["description"].replace('"', "'") + '"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+def otlp_payload(trace):
+    """Convert the spans of a trace to an OTLP/HTTP JSON export request"""
+    spans = []
+    for record in trace.spans:
+        attributes = {"description": record["description"], **record["attributes"]}
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": record["span_id"],
+            "parentSpanId": record["parent_id"] or "",
+            "name": f"{record['name']} {record['description']}".strip(),
+            "kind": SPAN_KINDS[record["kind"]],
+            "startTimeUnixNano": str(record["start_ns"]),
+            "endTimeUnixNano": str(record["start_ns"] + int(record["duration"] * 1e9)),
+            "attributes": [{"key": key, "value": {"stringValue": str(value)}} for key, value in attributes.items()]
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": spans}]
+    }]}
+
+class SpanExporter:
+    """Base exporter that receives the trace of every finished request and drops it"""
+    def export(self, trace):
+        pass
+
+class FileSpanExporter(SpanExporter):
+    """Append every trace as an OTLP JSON line to a file, for local testing"""
+    def __init__(self, path):
+        self.path = path
+    
+    def export(self, trace):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(otlp_payload(trace)) + "\n")
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """Send traces to an OTLP/HTTP endpoint such as an OpenTelemetry Collector"""
+    def __init__(self, endpoint, timeout=5):
+        self.endpoint = endpoint
+        self.timeout = timeout
+    
+    def export(self, trace):
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(otlp_payload(trace)).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        urllib.request.urlopen(request, timeout=self.timeout).close()
+
+class BackgroundSpanExporter(SpanExporter):
+    """Hand traces to another exporter on a background thread so requests never wait on export I/O"""
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self.queue = queue.SimpleQueue()
+        threading.Thread(target=self._run, name="span-exporter", daemon=True).start()
+    
+    def export(self, trace):
+        self.queue.put(trace)
+    
+    def _run(self):
+        while True:
+            trace = self.queue.get()
+            try:
+                self.exporter.export(trace)
+            except Exception as e:
+                logger.warning("Error exporting spans: %s", e)
+
+def create_span_exporter(kind=TRACE_EXPORTER):
+    """Create the exporter selected by TRACE_EXPORTER: "none", "file" or "otlp" """
+    if kind == "file":
+        return BackgroundSpanExporter(FileSpanExporter(TRACE_FILE))
+    if kind == "otlp":
+        return BackgroundSpanExporter(OTLPHttpSpanExporter(TRACE_OTLP_ENDPOINT))
+    return SpanExporter()
+
+span_exporter = create_span_exporter()
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Continue the caller's trace and report this service's timing breakdown in Server-Timing"""
+    trace = trace_from_headers(request.headers)
+    token = current_trace.set(trace)
+    try:
+        with span("total", f"{request.method} {request.url.path}", kind="server"):
+            response = await call_next(request)
+    finally:
+        current_trace.reset(token)
+    response.headers["X-Request-ID"] = trace.trace_id
+    response.headers["Server-Timing"] = server_timing(trace)
+    span_exporter.export(trace)
+    return response
+
+# Alleen de frontend roept upstreams aan: die krijgen het trace ID en de huidige span mee
+def trace_headers() -> Dict[str, str]:
+    """Headers die het huidige trace ID en de huidige span doorgeven aan een upstream."""
+    trace = current_trace.get()
+    if trace is None:
+        return {}
+    parent = current_span.get()
+    span_id = parent["span_id"] if parent else secrets.token_hex(8)
+    return {"X-Request-ID": trace.trace_id, "traceparent": f"00-{trace.trace_id}-{span_id}-01"}
+
+class TracedTemplates(Jinja2Templates):
+    """Jinja2Templates die het renderen van elke template als "render" span vastlegt."""
+    def TemplateResponse(self, name: str, *args, **kwargs):
+        with span("render", name):
+            return super().TemplateResponse(name, *args, **kwargs)
+
 # Configureer templates en statische bestanden
-templates = Jinja2Templates(directory="templates")
+templates = TracedTemplates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Prometheus metrics, opgehaald via /metrics
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests currently being handled", ["method"])
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds", "Latency of calls to the Backend and Database APIs",
+    ["upstream", "method", "endpoint", "status"]
+)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Meet de duur van elk verzoek, gelabeld met het route sjabloon in plaats van het pad."""
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    in_progress = REQUESTS_IN_PROGRESS.labels(request.method)
+    in_progress.inc()
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        in_progress.dec()
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(request.method, route.path if route else "other", str(status_code)).observe(
+            time.perf_counter() - start
+        )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Geeft de metrics terug in het Prometheus tekstformaat."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # URL van de bestaande APIs
 ORIGINAL_API_URL = os.environ.get("ORIGINAL_API_URL")
 DATABASE_API_URL = os.environ.get("DATABASE_API_URL")
 
+# Instellingen voor de connection pools naar de upstream APIs
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.environ.get("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_HTTP2 = os.environ.get("UPSTREAM_HTTP2", "false").lower() in ("1", "true", "yes")
+ORIGINAL_API_TIMEOUT = float(os.environ.get("ORIGINAL_API_TIMEOUT", "10"))
+DATABASE_API_TIMEOUT = float(os.environ.get("DATABASE_API_TIMEOUT", "5"))
+
+# Aantal metingen en velden die het dashboard ophaalt en toont
+DASHBOARD_HISTORY_LIMIT = int(os.environ.get("DASHBOARD_HISTORY_LIMIT", "90"))
+DASHBOARD_WEIGHT_FIELDS = "date,weight,goal_weight"
+# Aantal punten en aggregatie van de gewichtsgrafiek op het dashboard
+DASHBOARD_CHART_POINTS = int(os.environ.get("DASHBOARD_CHART_POINTS", "120"))
+DASHBOARD_CHART_BUCKET = os.environ.get("DASHBOARD_CHART_BUCKET", "day")
+
+# Headers van de Database API die de proxy routes doorgeven, zodat clients met If-None-Match kunnen hervalideren
+FORWARDED_HEADERS = ("ETag", "X-Next-Before")
+
+# Ondertekende sessies: de cookie bevat user_id, gebruikersnaam en verloopdatum met een HMAC
+# Alle replicas moeten hetzelfde geheim hebben, dus zonder SESSION_SECRET start de app niet.
+# Alleen voor lokale ontwikkeling maakt SESSION_EPHEMERAL_SECRET=true een willekeurig geheim per proces.
+SESSION_SECRET = os.environ.get("SESSION_SECRET", "")
+SESSION_EPHEMERAL_SECRET = os.environ.get("SESSION_EPHEMERAL_SECRET", "false").lower() in ("1", "true", "yes")
+SESSION_COOKIE = "session"
+SESSION_TTL = int(os.environ.get("SESSION_TTL", str(7 * 24 * 3600)))
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "1024"))
+SESSION_COOKIE_SECURE = os.environ.get("SESSION_COOKIE_SECURE", "false").lower() in ("1", "true", "yes")
+if not SESSION_SECRET:
+    if not SESSION_EPHEMERAL_SECRET:
+        raise RuntimeError(
+            "SESSION_SECRET is niet gezet; geef alle replicas hetzelfde geheim, "
+            "of zet SESSION_EPHEMERAL_SECRET=true voor lokale ontwikkeling"
+        )
+    SESSION_SECRET = secrets.token_urlsafe(32)
+    logger.warning("SESSION_SECRET is niet gezet, sessies zijn alleen geldig in dit proces en tot een herstart")
+
+def b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def session_signature(payload: str) -> str:
+    return b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+def create_session_token(user_id: int, username: str, ttl: int = None) -> str:
+    """
+    Maakt een ondertekende sessie token "<claims>.<handtekening>".
+    
+    Args:
+        user_id: ID van de ingelogde gebruiker
+        username: Gebruikersnaam, voor de weergave
+        ttl: Geldigheid in seconden (standaard SESSION_TTL)
+    
+    Returns:
+        De token voor de sessie cookie
+    """
+    claims = {"uid": user_id, "usr": username, "exp": int(time.time()) + (SESSION_TTL if ttl is None else ttl)}
+    payload = b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{session_signature(payload)}"
+
+@functools.lru_cache(maxsize=SESSION_CACHE_SIZE)
+def verified_claims(token: str):
+    """
+    Controleert de handtekening van een token en geeft de claims terug, of None.
+    
+    Het resultaat hangt alleen van de token af en wordt per proces gecached, zodat
+    een terugkerende sessie niet steeds opnieuw wordt gecontroleerd. De
+    verloopdatum wordt bij elk verzoek apart gecontroleerd.
+    """
+    payload, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, session_signature(payload)):
+        return None
+    try:
+        claims = json.loads(b64decode(payload))
+        return {"uid": int(claims["uid"]), "usr": str(claims["usr"]), "exp": int(claims["exp"])}
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def get_session(request: Request) -> Optional[Dict[str, Any]]:
+    """Geeft de claims (uid, usr, exp) van een geldige, niet verlopen sessie cookie terug, anders None."""
+    token = request.cookies.get(SESSION_COOKIE)
+    if not token:
+        return None
+    claims = verified_claims(token)
+    if claims is None or claims["exp"] <= time.time():
+        return None
+    return claims
+
+def require_session(request: Request, user_id: int) -> Dict[str, Any]:
+    """Eist een geldige sessie van de gebruiker met user_id voor de JSON API."""
+    claims = get_session(request)
+    if claims is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Niet ingelogd of sessie verlopen")
+    if claims["uid"] != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Geen toegang tot de gegevens van een andere gebruiker")
+    return claims
+
+# Eén langlevende client per upstream, zodat TCP verbindingen hergebruikt worden
+upstream_timeouts = {
+    "original": ORIGINAL_API_TIMEOUT,
+    "database": DATABASE_API_TIMEOUT,
+}
+upstream_clients: Dict[str, httpx.AsyncClient] = {}
+
+def create_upstream_client(timeout: float) -> httpx.AsyncClient:
+    """
+    Maakt een httpx client met een keep-alive pool voor één upstream.
+    
+    Args:
+        timeout: Timeout in seconden voor verzoeken naar deze upstream
+        
+    Returns:
+        Een nieuwe httpx.AsyncClient
+    """
+    limits = httpx.Limits(
+        max_connections=UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=httpx.Timeout(timeout),
+        http2=UPSTREAM_HTTP2
+    )
+
+def get_upstream_client(name: str) -> httpx.AsyncClient:
+    """Geeft de gedeelde client voor een upstream terug en maakt hem zo nodig aan."""
+    client = upstream_clients.get(name)
+    if client is None or client.is_closed:
+        client = create_upstream_client(upstream_timeouts[name])
+        upstream_clients[name] = client
+    return client
+
+@app.on_event("startup")
+async def startup_event():
+    """Opent de gedeelde clients naar de upstream APIs."""
+    for name in upstream_timeouts:
+        get_upstream_client(name)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Sluit de gedeelde clients en hun open verbindingen."""
+    for client in upstream_clients.values():
+        await client.aclose()
+    upstream_clients.clear()
+
+# Naam van elke upstream in de spans en de Server-Timing header
+UPSTREAM_SPAN_NAMES = {"original": "backend", "database": "database"}
+
+async def send_upstream(name: str, method: str, endpoint: str, **kwargs) -> httpx.Response:
+    """
+    Stuurt een verzoek naar een upstream API via de gedeelde client en meet de duur.
+    
+    Args:
+        name: Naam van de upstream ("original" of "database")
+        method: HTTP methode
+        endpoint: Pad op de upstream, bijv. "/api/users/1"
+        **kwargs: Extra argumenten voor httpx, zoals json, params of headers
+    
+    Returns:
+        De httpx response
+    """
+    base_url = ORIGINAL_API_URL if name == "original" else DATABASE_API_URL
+    # IDs in het pad worden samengevoegd zodat het aantal label waarden beperkt blijft
+    endpoint_label = re.sub(r"/\d+", "/{id}", endpoint)
+    start = time.perf_counter()
+    status_label = "error"
+    try:
+        with span(UPSTREAM_SPAN_NAMES[name], f"{method} {endpoint_label}", kind="client") as record:
+            response = await get_upstream_client(name).request(
+                method, f"{base_url}{endpoint}", headers={**trace_headers(), **kwargs.pop("headers", {})}, **kwargs
+            )
+            status_label = str(response.status_code)
+            if record is not None:
+                record["attributes"]["http.status_code"] = response.status_code
+        return response
+    finally:
+        UPSTREAM_LATENCY.labels(name, method, endpoint_label, status_label).observe(time.perf_counter() - start)
+
 # Functie om met de originele API te communiceren
 async def call_original_api(data: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -47,34 +484,34 @@ async def call_original_api(data: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         De response van de API
     """
-    async with httpx.AsyncClient() as client:
-        try:
-            # More detailed debugging
-            print(f"**** DEBUG ****")
-            print(f"Calling original API at {ORIGINAL_API_URL}/calculate")
-            print(f"Request data: {data}")
-            print(f"Sport types: {data.get('sport', [])}")
-            print(f"Minuten sporten: {data.get('aantal_minuten_sporten', 0)}")
-            print(f"Current weight: {data.get('weight', 0)}, Goal weight: {data.get('gewenst_gewicht', 0)}")
-            print(f"**** END DEBUG ****")
-            
-            response = await client.post(f"{ORIGINAL_API_URL}/calculate", json=data)
-            response.raise_for_status()  # Raise exception voor HTTP errors
-            result = response.json()
-            print(f"Original API response: {result}")
-            return result
-        except httpx.HTTPError as e:
-            print(f"HTTP Error: {e}")
-            # Print the full error response if available
-            if hasattr(e, 'response') and hasattr(e.response, 'text'):
-                print(f"Error response content: {e.response.text}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Kon geen verbinding maken met de originele API: {str(e)}"
-            )
+    try:
+        # More detailed debugging
+        print(f"**** DEBUG ****")
+        print(f"Calling original API at {ORIGINAL_API_URL}/calculate")
+        print(f"Request data: {data}")
+        print(f"Sport types: {data.get('sport', [])}")
+        print(f"Minuten sporten: {data.get('aantal_minuten_sporten', 0)}")
+        print(f"Current weight: {data.get('weight', 0)}, Goal weight: {data.get('gewenst_gewicht', 0)}")
+        print(f"**** END DEBUG ****")
+        
+        response = await send_upstream("original", "POST", "/calculate", json=data)
+        response.raise_for_status()  # Raise exception voor HTTP errors
+        result = loads_json(response.content)
+        print(f"Original API response: {result}")
+        return result
+    except httpx.HTTPError as e:
+        print(f"HTTP Error: {e}")
+        # Print the full error response if available
+        if hasattr(e, 'response') and hasattr(e.response, 'text'):
+            print(f"Error response content: {e.response.text}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Kon geen verbinding maken met de originele API: {str(e)}"
+        )
 
 # Functie om met de database API te communiceren
-async def call_database_api(method: str, endpoint: str, data: Dict[str, Any] = None) -> Dict[str, Any]:
+async def call_database_api(method: str, endpoint: str, data: Dict[str, Any] = None, params: Dict[str, Any] = None,
+                            response_headers: Dict[str, str] = None) -> Dict[str, Any]:
     """
     Roept de database API aan met de opgegeven methode, endpoint en data.
     
@@ -82,43 +519,88 @@ async def call_database_api(method: str, endpoint: str, data: Dict[str, Any] = N
         method: HTTP methode (GET, POST, etc.)
         endpoint: API endpoint (bijv. "/api/users")
         data: Optional data om naar de API te sturen bij POST requests
+        params: Optionele query parameters bij GET requests
+        response_headers: Optionele dictionary die de doorgeefbare headers (ETag) van de response ontvangt
         
     Returns:
         De response van de API
     """
-    async with httpx.AsyncClient() as client:
-        try:
-            print(f"Calling database API at {DATABASE_API_URL}{endpoint} with method {method} and data: {data}")
-            if method.upper() == "GET":
-                response = await client.get(f"{DATABASE_API_URL}{endpoint}")
-            elif method.upper() == "POST":
-                response = await client.post(f"{DATABASE_API_URL}{endpoint}", json=data)
-            else:
-                raise ValueError(f"Ongeldige HTTP methode: {method}")
-                
-            response.raise_for_status()  # Raise exception voor HTTP errors
-            result = response.json()
-            print(f"Database API response: {result}")
-            return result
-        except httpx.HTTPError as e:
-            print(f"Database API Error: {e}")
-            if hasattr(e.response, 'status_code'):
-                status_code = e.response.status_code
-            else:
-                status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-                
-            if hasattr(e.response, 'text'):
-                try:
-                    detail = e.response.json().get('detail', str(e))
-                except:
-                    detail = e.response.text
-            else:
-                detail = str(e)
-                
-            raise HTTPException(
-                status_code=status_code,
-                detail=detail
-            )
+    try:
+        print(f"Calling database API at {DATABASE_API_URL}{endpoint} with method {method} and data: {data}")
+        if method.upper() == "GET":
+            response = await send_upstream("database", "GET", endpoint, params=params)
+        elif method.upper() == "POST":
+            response = await send_upstream("database", "POST", endpoint, json=data)
+        else:
+            raise ValueError(f"Ongeldige HTTP methode: {method}")
+            
+        response.raise_for_status()  # Raise exception voor HTTP errors
+        result = loads_json(response.content)
+        print(f"Database API response: {result}")
+        if response_headers is not None:
+            response_headers.update(forwarded_headers(response))
+        return result
+    except httpx.HTTPError as e:
+        print(f"Database API Error: {e}")
+        raise database_error(e)
+
+def forwarded_headers(response: httpx.Response) -> Dict[str, str]:
+    """De headers van de Database API die ongewijzigd naar de client gaan."""
+    return {name: response.headers[name] for name in FORWARDED_HEADERS if name in response.headers}
+
+def database_error(e: httpx.HTTPError) -> HTTPException:
+    """Zet een fout van de Database API om in een HTTPException met dezelfde status en detail."""
+    if not isinstance(e, httpx.HTTPStatusError):
+        return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    try:
+        detail = e.response.json().get('detail', str(e))
+    except:
+        detail = e.response.text
+    return HTTPException(status_code=e.response.status_code, detail=detail)
+
+# Hulpfuncties om onafhankelijke upstream aanroepen gelijktijdig uit te voeren
+async def run_branch(coro, timeout: float, name: str):
+    """
+    Voert één tak van een fan-out uit met een eigen timeout.
+    
+    Args:
+        coro: De coroutine van de tak
+        timeout: Maximale duur van de hele tak in seconden
+        name: Naam van de tak voor foutmeldingen
+    
+    Returns:
+        Het resultaat van de tak
+    """
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Timeout na {timeout} seconden bij het ophalen van {name}"
+        )
+
+async def optional_branch(coro, timeout: float, name: str):
+    """Voert een tak uit waar de pagina zonder kan; bij een fout of timeout komt None terug."""
+    try:
+        return await run_branch(coro, timeout, name)
+    except Exception as e:
+        print(f"Error fetching {name}: {getattr(e, 'detail', str(e))}")
+        return None
+
+async def gather_branches(*branches):
+    """
+    Wacht gelijktijdig op alle takken, zoals asyncio.gather.
+    
+    Faalt één tak, dan worden de andere geannuleerd in plaats van op de
+    achtergrond door te lopen.
+    """
+    tasks = [asyncio.ensure_future(branch) for branch in branches]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
 
 # Database API operaties
 async def db_check_user(username: str, password: str):
@@ -135,26 +617,51 @@ async def db_check_user(username: str, password: str):
             return None
         raise e
 
-async def db_get_weights(user_id: int):
-    """Haalt gewichtsmetingen op voor een gebruiker via de Database API."""
-    return await call_database_api("GET", f"/api/weights/{user_id}")
+async def db_get_weights(user_id: int, limit: int = None, fields: str = None, before: str = None,
+                         since: str = None, until: str = None):
+    """
+    Haalt gewichtsmetingen op voor een gebruiker via de Database API, nieuwste eerst.
+    
+    Zonder extra argumenten komt de volledige geschiedenis terug. Met limit, before
+    (cursor "<datum>,<id>"), since/until en fields wordt alleen het gevraagde deel opgehaald.
+    """
+    params = {"limit": limit, "fields": fields, "before": before, "since": since, "until": until}
+    params = {key: value for key, value in params.items() if value is not None}
+    return await call_database_api("GET", f"/api/weights/{user_id}", params=params or None)
 
-async def db_get_user_profile(user_id: int):
-    """Haalt profielgegevens op voor een gebruiker via de Database API."""
-    user = await call_database_api("GET", f"/api/users/{user_id}")
+async def db_get_dashboard_bundle(user_id: int):
+    """
+    Haalt gebruiker, profiel, de laatste metingen en de grafiekreeks op in één
+    aanroep naar de Database API.
     
+    Returns:
+        Dictionary met user, profile, latest_weight, weights (nieuwste eerst) en series
+    """
+    params = {"limit": DASHBOARD_HISTORY_LIMIT, "fields": DASHBOARD_WEIGHT_FIELDS, "points": DASHBOARD_CHART_POINTS}
+    if DASHBOARD_CHART_BUCKET:
+        params["bucket"] = DASHBOARD_CHART_BUCKET
+    return await call_database_api("GET", f"/api/users/{user_id}/bundle", params=params)
+
+async def db_get_profile(user_id: int):
+    """Haalt het profiel van een gebruiker op via de Database API, of None als er geen is."""
     try:
-        profile = await call_database_api("GET", f"/api/profiles/{user_id}")
+        return await call_database_api("GET", f"/api/profiles/{user_id}")
     except HTTPException as e:
         if e.status_code == 404:
-            profile = None
-        else:
-            raise e
-    
+            return None
+        raise e
+
+async def db_get_user_profile(user_id: int):
+    """Haalt gebruiker en profielgegevens gelijktijdig op via de Database API."""
+    user, profile = await gather_branches(
+        call_database_api("GET", f"/api/users/{user_id}"),
+        db_get_profile(user_id)
+    )
     return user, profile
 
-async def db_add_weight(user_id: int, weight: float, goal_weight: float, date_str: str = None):
-    """Voegt een nieuwe gewichtsmeting toe via de Database API."""
+async def db_add_weight(user_id: int, weight: float, goal_weight: float, date_str: str = None,
+                        response_headers: Dict[str, str] = None):
+    """Voegt een nieuwe gewichtsmeting toe via de Database API; de nieuwe ETag komt in response_headers."""
     data = {
         "user_id": user_id,
         "weight": weight,
@@ -167,7 +674,7 @@ async def db_add_weight(user_id: int, weight: float, goal_weight: float, date_st
     try:
         # Debug print to check data being sent
         print(f"Sending weight data to DB API: {data}")
-        return await call_database_api("POST", "/api/weights", data)
+        return await call_database_api("POST", "/api/weights", data, response_headers=response_headers)
     except HTTPException as e:
         print(f"Error adding weight: {e.detail}")
         # Return a more informative error
@@ -176,16 +683,6 @@ async def db_add_weight(user_id: int, weight: float, goal_weight: float, date_st
             detail=f"Error adding weight: {e.detail}"
         )
 
-async def db_check_user_exists(user_id: int):
-    """Controleert of een gebruiker bestaat via de Database API."""
-    try:
-        await call_database_api("GET", f"/api/users/{user_id}")
-        return True
-    except HTTPException as e:
-        if e.status_code == 404:
-            return False
-        raise e
-
 # Datamodellen voor de API
 class UserInput(BaseModel):
     """Model voor invoer naar de originele API."""
@@ -214,12 +711,97 @@ class WeightResponse(BaseModel):
     goal_weight: float
     date: str
 
+class GridInput(BaseModel):
+    """Model voor een what-if raster: minuten sport x calorie aanpassing voor elke sport."""
+    gender: str
+    weight: float
+    height: float
+    age: int
+    activity_level: str
+    gewenst_gewicht: float
+    sport: Optional[List[str]] = None
+    minutes_min: int = 0
+    minutes_max: int = 120
+    minutes_step: int = 5
+    adjustment_min: int = 100
+    adjustment_max: int = 1500
+    adjustment_step: int = 50
+
 class CalculationResult(BaseModel):
     """Model voor het resultaat van het tijdberekeningsalgoritme via de API."""
     days_to_goal: float
     current_weight: float
     goal_weight: float
 
+# Hulpfuncties voor de berekeningsresultaten op het dashboard
+def empty_calculation_context() -> Dict[str, Any]:
+    """Geeft de template variabelen voor een dashboard zonder berekening."""
+    return {
+        "calculation_results": None,
+        "light_option": None,
+        "standard_option": None,
+        "intensive_option": None,
+        "light_results": [],
+        "standard_results": [],
+        "intensive_results": []
+    }
+
+def calculation_context(calculation_result: Dict[str, Any], weight: float, goal_weight: float) -> Dict[str, Any]:
+    """
+    Zet het antwoord van de originele API om naar de template variabelen van het dashboard.
+    
+    Args:
+        calculation_result: Response van de originele API
+        weight: Huidig gewicht
+        goal_weight: Streefgewicht
+    
+    Returns:
+        Dictionary met de resultaten per tekortniveau
+    """
+    # Extract the detailed results
+    detailed_results = calculation_result.get("results", [])
+    
+    # Initialize containers for the three deficit levels
+    light_results = [r for r in detailed_results if r.get("calorie_adjustment") == 250]
+    standard_results = [r for r in detailed_results if r.get("calorie_adjustment") == 500]
+    intensive_results = [r for r in detailed_results if r.get("calorie_adjustment") == 1000]
+    
+    # Calculate the average days for each deficit level
+    light_option = {
+        "days": sum(r.get("time_to_reach_goal", 0) for r in light_results) / max(len(light_results), 1),
+        "tdee": light_results[0].get("TDEE", 0) if light_results else 0
+    }
+    
+    standard_option = {
+        "days": sum(r.get("time_to_reach_goal", 0) for r in standard_results) / max(len(standard_results), 1),
+        "tdee": standard_results[0].get("TDEE", 0) if standard_results else 0
+    }
+    
+    intensive_option = {
+        "days": sum(r.get("time_to_reach_goal", 0) for r in intensive_results) / max(len(intensive_results), 1),
+        "tdee": intensive_results[0].get("TDEE", 0) if intensive_results else 0
+    }
+    
+    # Compile complete calculation results
+    calculation_results = {
+        "current_weight": weight,
+        "goal_weight": goal_weight,
+        "days_to_goal": calculation_result.get("days_to_goal", 0),
+        "weight_difference": abs(weight - goal_weight),
+        "bmr": calculation_result.get("BMR", 0),
+        "tdee": calculation_result.get("TDEE", 0)
+    }
+    
+    return {
+        "calculation_results": calculation_results,
+        "light_option": light_option,
+        "standard_option": standard_option,
+        "intensive_option": intensive_option,
+        "light_results": light_results,
+        "standard_results": standard_results,
+        "intensive_results": intensive_results
+    }
+
 #
 # WEB ROUTES (HTML PAGINA'S)
 #
@@ -253,114 +835,58 @@ async def login(
         )
     
     response = RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
-    response.set_cookie(key="username", value=username)
-    response.set_cookie(key="user_id", value=str(user["id"]))
+    response.set_cookie(
+        key=SESSION_COOKIE, value=create_session_token(user["id"], username), max_age=SESSION_TTL,
+        httponly=True, samesite="lax", secure=SESSION_COOKIE_SECURE
+    )
     return response
 
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
     """Rendert het dashboard met gewichtsgegevens."""
-    username = request.cookies.get("username")
-    user_id = request.cookies.get("user_id")
-    
-    if not username or not user_id:
+    session = get_session(request)
+    if session is None:
         return RedirectResponse(url="/login")
+    username, user_id = session["usr"], session["uid"]
     
-    # Get weight entries
-    entries = await db_get_weights(int(user_id))
+    # Metingen, grafiekreeks en profiel komen in één database aanroep
+    bundle = await run_branch(db_get_dashboard_bundle(user_id), DATABASE_API_TIMEOUT, "dashboard")
+    entries = bundle["weights"]
+    profile = bundle["profile"]
     
-    # Get the last weight entry to display calculation options
-    if entries and len(entries) > 0:
-        latest_entry = entries[0]  # Assuming entries are sorted by date desc
+    # The chart falls back to the entries without a series
+    series = bundle["series"]["points"] if entries and bundle.get("series") else None
+    
+    # The calculation needs the latest entry
+    calculation = empty_calculation_context()
+    if entries:
+        latest_entry = entries[0]  # Entries are sorted by date desc
         
-        # Get user profile
-        try:
-            user, profile = await db_get_user_profile(int(user_id))
-            
-            gender = profile["gender"] if profile and "gender" in profile else "male"
-            height = profile["height"] if profile and "height" in profile else 170
-            age = profile["age"] if profile and "age" in profile else 30
-            activity_level = profile["activity_level"] if profile and "activity_level" in profile else "moderate"
-            
-            # Default sports
-            sports = ["Swimming", "Football"]
-            
-            # Create calculation request for the latest entry
-            calc_data = {
-                "gender": gender,
-                "weight": latest_entry["weight"],
-                "height": height,
-                "age": age,
-                "activity_level": activity_level,
-                "sport": sports,
-                "aantal_minuten_sporten": 30,  # Default value
-                "gewenst_gewicht": latest_entry["goal_weight"],
-                "deficit_surplus": 500  # Default value
-            }
-            
-            # Call API for calculation
-            try:
-                calculation_result = await call_original_api(calc_data)
-                
-                # Extract the detailed results
-                detailed_results = calculation_result.get("results", [])
-                
-                # Initialize containers for the three deficit levels
-                light_results = [r for r in detailed_results if r.get("calorie_adjustment") == 250]
-                standard_results = [r for r in detailed_results if r.get("calorie_adjustment") == 500]
-                intensive_results = [r for r in detailed_results if r.get("calorie_adjustment") == 1000]
-                
-                # Calculate the average days for each deficit level
-                light_option = {
-                    "days": sum(r.get("time_to_reach_goal", 0) for r in light_results) / max(len(light_results), 1),
-                    "tdee": light_results[0].get("TDEE", 0) if light_results else 0
-                }
-                
-                standard_option = {
-                    "days": sum(r.get("time_to_reach_goal", 0) for r in standard_results) / max(len(standard_results), 1),
-                    "tdee": standard_results[0].get("TDEE", 0) if standard_results else 0
-                }
-                
-                intensive_option = {
-                    "days": sum(r.get("time_to_reach_goal", 0) for r in intensive_results) / max(len(intensive_results), 1),
-                    "tdee": intensive_results[0].get("TDEE", 0) if intensive_results else 0
-                }
-                
-                # Compile complete calculation results
-                calculation_results = {
-                    "current_weight": latest_entry["weight"],
-                    "goal_weight": latest_entry["goal_weight"],
-                    "days_to_goal": calculation_result.get("days_to_goal", 0),
-                    "weight_difference": abs(latest_entry["weight"] - latest_entry["goal_weight"]),
-                    "bmr": calculation_result.get("BMR", 0),
-                    "tdee": calculation_result.get("TDEE", 0)
-                }
-            except Exception as e:
-                print(f"Error calculating time to goal for dashboard: {str(e)}")
-                calculation_results = None
-                light_option = None
-                standard_option = None
-                intensive_option = None
-                light_results = []
-                standard_results = []
-                intensive_results = []
-        except Exception as e:
-            print(f"Error getting user profile for dashboard: {str(e)}")
-            calculation_results = None
-            light_option = None
-            standard_option = None
-            intensive_option = None
-            light_results = []
-            standard_results = []
-            intensive_results = []
-    else:
-        calculation_results = None
-        light_option = None
-        standard_option = None
-        intensive_option = None
-        light_results = []
-        standard_results = []
-        intensive_results = []
+        gender = profile["gender"] if profile and "gender" in profile else "male"
+        height = profile["height"] if profile and "height" in profile else 170
+        age = profile["age"] if profile and "age" in profile else 30
+        activity_level = profile["activity_level"] if profile and "activity_level" in profile else "moderate"
+        
+        # Default sports
+        sports = ["Swimming", "Football"]
+        
+        # Create calculation request for the latest entry
+        calc_data = {
+            "gender": gender,
+            "weight": latest_entry["weight"],
+            "height": height,
+            "age": age,
+            "activity_level": activity_level,
+            "sport": sports,
+            "aantal_minuten_sporten": 30,  # Default value
+            "gewenst_gewicht": latest_entry["goal_weight"],
+            "deficit_surplus": 500  # Default value
+        }
+        
+        # Call API for calculation
+        calculation_result = await optional_branch(call_original_api(calc_data), ORIGINAL_API_TIMEOUT, "calculation")
+        if calculation_result is not None:
+            calculation = calculation_context(calculation_result, latest_entry["weight"], latest_entry["goal_weight"])
     
     return templates.TemplateResponse(
         "dashboard.html", 
@@ -368,28 +894,22 @@ async def dashboard(request: Request):
             "request": request, 
             "username": username, 
             "entries": entries,
-            "calculation_results": calculation_results,
-            "light_option": light_option,
-            "standard_option": standard_option,
-            "intensive_option": intensive_option,
-            "light_results": light_results,
-            "standard_results": standard_results,
-            "intensive_results": intensive_results
+            "series": series,
+            **calculation
         }
     )
 
 @app.get("/entry", response_class=HTMLResponse)
 async def entry_page(request: Request, error: str = None):
     """Rendert de pagina voor gewichtsinvoer."""
-    username = request.cookies.get("username")
-    user_id = request.cookies.get("user_id")
-    
-    if not username or not user_id:
+    session = get_session(request)
+    if session is None:
         return RedirectResponse(url="/login")
+    username, user_id = session["usr"], session["uid"]
     
     # Haal gebruikersgegevens op
     try:
-        user, profile = await db_get_user_profile(int(user_id))
+        user, profile = await db_get_user_profile(user_id)
         
         gender = profile["gender"] if profile and "gender" in profile else "male"
         height = profile["height"] if profile and "height" in profile else 170
@@ -429,11 +949,10 @@ async def handle_entry(
     deficit_surplus: int = Form(500)  # Default to 500 calorie deficit
 ):
     """Verwerkt het formulier voor gewichtsinvoer."""
-    username = request.cookies.get("username")
-    user_id = request.cookies.get("user_id")
-    
-    if not username or not user_id:
+    session = get_session(request)
+    if session is None:
         return RedirectResponse(url="/login")
+    username, user_id = session["usr"], session["uid"]
     
     # Check if at least 2 sports are selected
     if len(sport) < 2:
@@ -451,13 +970,32 @@ async def handle_entry(
         )
     
     # Print debug info
-    print(f"User ID from cookie: {user_id}")
+    print(f"User ID from session: {user_id}")
     print(f"Selected sports: {sport}")
     
-    # Ensure user exists
+    # Calculate time to goal using all sports at once
+    calc_data = {
+        "gender": gender,
+        "weight": weight,
+        "height": height,
+        "age": age,
+        "activity_level": activity_level,
+        "sport": sport,  # Include all selected sports
+        "aantal_minuten_sporten": aantal_minuten_sporten,
+        "gewenst_gewicht": goal_weight,
+        "deficit_surplus": deficit_surplus
+    }
+    
+    # De berekening hangt alleen van het formulier af en loopt gelijk op met de database aanroepen.
+    # De ondertekende sessie bewijst dat de gebruiker bestaat, dus er is geen aparte controle meer nodig
+    calculation_task = asyncio.ensure_future(
+        optional_branch(call_original_api(calc_data), ORIGINAL_API_TIMEOUT, "calculation")
+    )
     try:
-        user_exists = await db_check_user_exists(int(user_id))
-        if not user_exists:
+        # Sla gegevens op
+        try:
+            await run_branch(db_add_weight(user_id, weight, goal_weight), DATABASE_API_TIMEOUT, "weight")
+        except HTTPException as e:
             return templates.TemplateResponse(
                 "entry.html",
                 {
@@ -467,105 +1005,24 @@ async def handle_entry(
                     "height": height,
                     "age": age,
                     "activity_level": activity_level,
-                    "error": f"User with ID {user_id} not found in database"
+                    "error": f"Error adding weight: {e.detail}"
                 }
             )
-    except Exception as e:
-        print(f"Error checking user: {str(e)}")
-        return templates.TemplateResponse(
-            "entry.html",
-            {
-                "request": request,
-                "username": username,
-                "gender": gender,
-                "height": height,
-                "age": age,
-                "activity_level": activity_level,
-                "error": f"Error checking user: {str(e)}"
-            }
-        )
+        
+        # Haal gewichtsgeschiedenis en grafiekreeks op, inclusief de nieuwe meting
+        bundle = await run_branch(db_get_dashboard_bundle(user_id), DATABASE_API_TIMEOUT, "dashboard")
+        calculation_result = await calculation_task
+    finally:
+        # Stops the calculation when the page is returned early
+        calculation_task.cancel()
     
-    # Sla gegevens op
-    try:
-        await db_add_weight(int(user_id), weight, goal_weight)
-    except HTTPException as e:
-        return templates.TemplateResponse(
-            "entry.html",
-            {
-                "request": request,
-                "username": username,
-                "gender": gender,
-                "height": height,
-                "age": age,
-                "activity_level": activity_level,
-                "error": f"Error adding weight: {e.detail}"
-            }
-        )
+    entries = bundle["weights"]
+    # The chart falls back to the entries without a series
+    series = bundle["series"]["points"] if entries and bundle.get("series") else None
     
-    # Calculate time to goal using all sports at once
-    try:
-        # Create calculation request
-        calc_data = {
-            "gender": gender,
-            "weight": weight,
-            "height": height,
-            "age": age,
-            "activity_level": activity_level,
-            "sport": sport,  # Include all selected sports
-            "aantal_minuten_sporten": aantal_minuten_sporten,
-            "gewenst_gewicht": goal_weight,
-            "deficit_surplus": deficit_surplus
-        }
-        
-        # Call API for calculation
-        calculation_result = await call_original_api(calc_data)
-        
-        # Extract the detailed results
-        detailed_results = calculation_result.get("results", [])
-        
-        # Initialize containers for the three deficit levels
-        light_results = [r for r in detailed_results if r.get("calorie_adjustment") == 250]
-        standard_results = [r for r in detailed_results if r.get("calorie_adjustment") == 500]
-        intensive_results = [r for r in detailed_results if r.get("calorie_adjustment") == 1000]
-        
-        # Calculate the average days for each deficit level
-        light_option = {
-            "days": sum(r.get("time_to_reach_goal", 0) for r in light_results) / max(len(light_results), 1),
-            "tdee": light_results[0].get("TDEE", 0) if light_results else 0
-        }
-        
-        standard_option = {
-            "days": sum(r.get("time_to_reach_goal", 0) for r in standard_results) / max(len(standard_results), 1),
-            "tdee": standard_results[0].get("TDEE", 0) if standard_results else 0
-        }
-        
-        intensive_option = {
-            "days": sum(r.get("time_to_reach_goal", 0) for r in intensive_results) / max(len(intensive_results), 1),
-            "tdee": intensive_results[0].get("TDEE", 0) if intensive_results else 0
-        }
-        
-        # Compile complete calculation results
-        calculation_results = {
-            "current_weight": weight,
-            "goal_weight": goal_weight,
-            "days_to_goal": calculation_result.get("days_to_goal", 0),
-            "weight_difference": abs(weight - goal_weight),
-            "bmr": calculation_result.get("BMR", 0),
-            "tdee": calculation_result.get("TDEE", 0)
-        }
-        
-    except Exception as e:
-        print(f"Error calculating time to goal: {str(e)}")
-        calculation_results = None
-        light_option = None
-        standard_option = None
-        intensive_option = None
-        light_results = []
-        standard_results = []
-        intensive_results = []
-    
-    # Haal gewichtsgeschiedenis op
-    entries = await db_get_weights(int(user_id))
+    calculation = empty_calculation_context()
+    if calculation_result is not None:
+        calculation = calculation_context(calculation_result, weight, goal_weight)
     
     return templates.TemplateResponse(
         "dashboard.html", 
@@ -573,22 +1030,16 @@ async def handle_entry(
             "request": request, 
             "username": username, 
             "entries": entries,
-            "calculation_results": calculation_results,
-            "light_option": light_option,
-            "standard_option": standard_option,
-            "intensive_option": intensive_option,
-            "light_results": light_results,
-            "standard_results": standard_results,
-            "intensive_results": intensive_results
+            "series": series,
+            **calculation
         }
     )
 
 @app.get("/logout")
 async def logout():
-    """Verwerkt uitloggen door cookies te verwijderen."""
+    """Verwerkt uitloggen door de sessie cookie te verwijderen."""
     response = RedirectResponse(url="/login")
-    response.delete_cookie(key="username")
-    response.delete_cookie(key="user_id")
+    response.delete_cookie(key=SESSION_COOKIE)
     return response
 
 @app.get("/register", response_class=HTMLResponse)
@@ -675,48 +1126,87 @@ async def api_docs(request: Request):
     )
 
 @app.get("/api/weights/{user_id}", response_model=List[Dict[str, Any]])
-async def get_weights(user_id: int):
+async def get_weights(
+    user_id: int,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1),
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    fields: Optional[str] = None
+):
     """
     API endpoint voor het ophalen van gewichtsmetingen.
     
+    Vereist de sessie cookie van dezelfde gebruiker. Stuurt If-None-Match door naar de Database API. Is er voor de gebruiker
+    sinds die ETag niets veranderd, dan volgt een 304 zonder body.
+    
     Args:
         user_id: ID van de gebruiker
+        request: Het inkomende verzoek, voor de sessie cookie en de If-None-Match header
+        limit: Maximaal aantal metingen
+        before: Cursor "<datum>,<id>" van de laatste meting van de vorige pagina
+        since: Alleen metingen vanaf deze datum
+        until: Alleen metingen voor deze datum
+        fields: Komma gescheiden velden die terugkomen
         
     Returns:
-        Een lijst met gewichtsmetingen voor de gebruiker
+        Een lijst met gewichtsmetingen voor de gebruiker, met ETag en X-Next-Before
     """
-    entries = await db_get_weights(user_id)
+    require_session(request, user_id)
     
-    # Als er geen metingen zijn, geef een lege lijst terug
-    if not entries:
-        return []
+    params = {"limit": limit, "fields": fields, "before": before, "since": since, "until": until}
+    params = {key: value for key, value in params.items() if value is not None}
+    headers = {}
+    if "if-none-match" in request.headers:
+        headers["If-None-Match"] = request.headers["if-none-match"]
+    try:
+        response = await send_upstream("database", "GET", f"/api/weights/{user_id}", params=params or None, headers=headers)
+        if response.status_code != status.HTTP_304_NOT_MODIFIED:
+            response.raise_for_status()
+    except httpx.HTTPError as e:
+        raise database_error(e)
     
-    return entries
+    if response.status_code == status.HTTP_304_NOT_MODIFIED:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=forwarded_headers(response))
+    # De database service heeft de metingen al gevalideerd en gerenderd, dus de body gaat ongewijzigd door
+    return Response(content=response.content, media_type="application/json", headers=forwarded_headers(response))
 
 @app.post("/api/weights", response_model=Dict[str, Any])
-async def add_weight(entry: WeightEntry):
+async def add_weight(entry: WeightEntry, request: Request, response: Response):
     """
     API endpoint voor het toevoegen van een gewichtsmeting.
     
+    Vereist de sessie cookie van dezelfde gebruiker.
+    
     Args:
         entry: Data voor de nieuwe gewichtsmeting
+        request: Het inkomende verzoek, voor de sessie cookie
+        response: De response, die de nieuwe ETag van de gebruiker krijgt
         
     Returns:
         De toegevoegde gewichtsmeting
     """
-    # Controleer of de gebruiker bestaat
-    if not await db_check_user_exists(entry.user_id):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, 
-            detail=f"Gebruiker met ID {entry.user_id} bestaat niet"
-        )
+    # De ondertekende sessie bewijst dat de gebruiker bestaat en ingelogd is
+    require_session(request, entry.user_id)
     
     # Voeg gewichtsmeting toe
     try:
         result = await db_add_weight(
-            entry.user_id, entry.weight, entry.goal_weight, entry.date
+            entry.user_id, entry.weight, entry.goal_weight, entry.date, response.headers
         )
         return result
+    except HTTPException as e:
+        if e.status_code == status.HTTP_404_NOT_FOUND:
+            # De gebruiker is verwijderd nadat de sessie is uitgegeven
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, 
+                detail=f"Gebruiker met ID {entry.user_id} bestaat niet"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Kon gewichtsmeting niet toevoegen: {e.detail}"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -741,4 +1231,26 @@ async def calculate(data: UserInput):
         "days_to_goal": result.get("days_to_goal", 0),
         "current_weight": data.weight,
         "goal_weight": data.gewenst_gewicht
-    }
\ No newline at end of file
+    }
+
+@app.post("/api/calculate/grid")
+async def calculate_grid(data: GridInput):
+    """
+    API endpoint voor een what-if raster van dagen tot doel, bruikbaar als heatmap.
+    
+    Args:
+        data: Gebruikersgegevens plus de bereiken voor minuten sport en calorie aanpassing
+    
+    Returns:
+        Assen en een days[sport][aanpassing][minuten] matrix van de backend (null = doel niet haalbaar)
+    """
+    try:
+        response = await send_upstream("original", "POST", "/calculate/grid", json=data.dict())
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Kon geen verbinding maken met de originele API: {str(e)}"
+        )
+    
+    # Het raster ongewijzigd doorgeven, ook een 400 bij ongeldige bereiken
+    return Response(content=response.content, status_code=response.status_code, media_type="application/json")
\ No newline at end of file